@@ -0,0 +1,91 @@
+"""
+Benchmark the vectorized peak SWE engine against the per zone and year loop.
+
+Usage:
+    python benchmarks/peak_swe_benchmark.py [--zones 1000] [--years 40]
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from swed_17.peak_swe import peak_swe_for_pd, peak_swe_for_zone
+
+
+def synthetic_swe(zones: int, years: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Daily SWE with one accumulation and melt season per water year.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(
+        f"{1980 - 1}-10-01", f"{1980 + years}-09-30", freq="D"
+    )
+    day = (dates.dayofyear.to_numpy() + 92) % 365
+    season = np.clip(np.sin(np.pi * day / 270), 0, None)[:, np.newaxis]
+    swe = season * rng.uniform(100, 800, (1, zones))
+    swe += rng.normal(0, 5, swe.shape)
+
+    return pd.DataFrame(
+        np.clip(swe, 0, None),
+        index=dates,
+        columns=[f"ZONE{zone:05d}" for zone in range(zones)],
+    )
+
+
+def loop_peak_swe_for_pd(
+        swe_data: pd.DataFrame, modify_date: bool = True
+) -> pd.DataFrame:
+    """
+    Previous implementation of :meth:`peak_swe_for_pd` for comparison.
+    """
+    year_range = range(
+        (swe_data.index.min().year + 1),
+        swe_data.index.max().year
+    )
+    peak_swe = pd.DataFrame.from_dict({'year': year_range})
+
+    for zone in swe_data.columns.values:
+        peak_swe[zone] = peak_swe_for_zone(
+            swe_data, zone, year_range, modify_date
+        )
+
+    return peak_swe.set_index('year')
+
+
+def timed(function, *args) -> tuple:
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--zones", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=40)
+    arguments = parser.parse_args()
+
+    # The previous implementation inserts one column per zone
+    warnings.simplefilter("ignore", pd.errors.PerformanceWarning)
+
+    swe_data = synthetic_swe(arguments.zones, arguments.years)
+    print(f"Data: {swe_data.shape[0]} days x {swe_data.shape[1]} zones")
+
+    for modify_date in [True, False]:
+        loop, loop_time = timed(loop_peak_swe_for_pd, swe_data, modify_date)
+        vectorized, vectorized_time = timed(
+            peak_swe_for_pd, swe_data, modify_date
+        )
+        pd.testing.assert_frame_equal(loop, vectorized, check_dtype=False)
+
+        print(
+            f"modify_date={modify_date}: "
+            f"loop {loop_time:.2f}s, vectorized {vectorized_time:.2f}s "
+            f"({loop_time / vectorized_time:.0f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
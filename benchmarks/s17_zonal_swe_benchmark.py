@@ -0,0 +1,92 @@
+"""
+Benchmark S17ZonalSWE.as_df against the previous pandas column transform.
+
+Uses a synthetic states_snow17 query result.
+
+Usage:
+    python benchmarks/s17_zonal_swe_benchmark.py [--rows 10000000]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from swed_17.snow17.s17_zonal_swe import S17ZonalSWE
+
+
+def synthetic_states_snow17(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Query result with the columns: segid, opid, cal_yr, mon, zday, swe
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("1980-10-01") + pd.to_timedelta(
+        np.arange(rows) % 16_000, unit="D"
+    )
+    segments = np.array([f"SEG{segment:03d}_F" for segment in range(500)])
+    segment = segments[(np.arange(rows) // 16_000) % len(segments)]
+
+    return pd.DataFrame({
+        "segid": segment,
+        "opid": np.char.add(segment.astype(str), "UF"),
+        "cal_yr": dates.year.to_numpy(),
+        "mon": dates.month.to_numpy(),
+        "zday": dates.day.to_numpy(),
+        "swe": rng.uniform(0, 40, rows),
+    })
+
+
+def previous_as_df(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Previous implementation of :meth:`S17ZonalSWE.as_df` for comparison.
+    """
+    df.columns = S17ZonalSWE.COLUMN_MAPPING
+    df['Date'] = pd.to_datetime(df[['Year', 'Month', 'Day']])
+    df = df.drop(columns=['Year', 'Month', 'Day'])
+    df = df.set_index('Date')
+    df[S17ZonalSWE.SWE_COLUMN] *= S17ZonalSWE.INCH_TO_MM
+    return df.rename(
+        columns={S17ZonalSWE.SWE_COLUMN: S17ZonalSWE.SWE_COLUMN_MM}
+    )
+
+
+def measure(function, data: pd.DataFrame) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(data)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    arguments = parser.parse_args()
+
+    data = synthetic_states_snow17(arguments.rows)
+    print(f"Rows: {len(data)}")
+
+    # The previous transform modifies the given frame
+    previous, previous_time, previous_memory = measure(
+        previous_as_df, data.copy()
+    )
+    current, current_time, current_memory = measure(S17ZonalSWE.as_df, data)
+
+    pd.testing.assert_frame_equal(
+        previous, current, check_dtype=False, check_categorical=False,
+        check_index_type=False,
+    )
+
+    print(
+        f"previous: {previous_time:.2f}s, peak {previous_memory:.0f} MiB\n"
+        f"current:  {current_time:.2f}s, peak {current_memory:.0f} MiB\n"
+        f"speedup:  {previous_time / current_time:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark the zonal_swe view against the previous chained FULL JOIN view.
+
+Runs the Dash app zonal SWE query for all zones of a segment. The previous
+view definition is created as a temporary view for the comparison. Prints
+the query plan summary of EXPLAIN ANALYZE and the latency of each view.
+
+Usage:
+    python benchmarks/zonal_swe_view_benchmark.py CONNECTION_INFO SEGMENT \
+        [--date 2020-10-01] [--repeat 5]
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import psycopg
+
+PREVIOUS_VIEW = """
+CREATE TEMPORARY VIEW zonal_swe_full_join
+AS WITH swe_one AS (
+         SELECT
+            COALESCE(isz.cbrfc_zone_id, ssz.cbrfc_zone_id) AS cbrfc_zone_id,
+            COALESCE(isz.datetime, ssz.datetime) AS date,
+            isz.value AS isnobal_swe,
+            ssz.value AS snodas_swe
+           FROM isnobal_zonal_swe isz
+             FULL JOIN snodas_zonal_swe ssz ON isz.cbrfc_zone_id = ssz.cbrfc_zone_id AND isz.datetime = ssz.datetime
+          WHERE isz.isnobal_version_id = 2 AND EXTRACT(hour FROM isz.datetime) = 0::numeric
+    ),
+    swe_two AS (
+         SELECT
+            COALESCE(sv.cbrfc_zone_id, csz.cbrfc_zone_id) AS cbrfc_zone_id,
+            COALESCE(sv.date, csz.datetime) AS date,
+            sv.isnobal_swe,
+            sv.snodas_swe,
+            csz.value AS cu_boulder_swe
+           FROM swe_one sv
+             FULL JOIN cu_boulder_zonal_swe csz
+                ON sv.cbrfc_zone_id = csz.cbrfc_zone_id AND sv.date = csz.datetime
+    ),
+    swe_three AS (
+         SELECT
+            COALESCE(sv.cbrfc_zone_id, asz.cbrfc_zone_id) AS cbrfc_zone_id,
+            COALESCE(sv.date, asz.datetime) AS date,
+            sv.isnobal_swe,
+            sv.snodas_swe,
+            sv.cu_boulder_swe,
+            asz.value AS aso_swe
+           FROM swe_two sv
+             FULL JOIN aso_zonal_swe asz
+                ON sv.cbrfc_zone_id = asz.cbrfc_zone_id AND sv.date = asz.datetime
+    )
+ SELECT
+    sv.date,
+    cz.zone AS zone_name,
+    sv.isnobal_swe,
+    sv.snodas_swe,
+    uzs.value AS ua_swe,
+    sv.cu_boulder_swe,
+    sv.aso_swe,
+    sv.cbrfc_zone_id
+   FROM swe_three sv
+     FULL JOIN ua_zonal_swe uzs ON sv.cbrfc_zone_id = uzs.cbrfc_zone_id AND sv.date = uzs.datetime
+     LEFT JOIN cbrfc_zones cz ON COALESCE(sv.cbrfc_zone_id, uzs.cbrfc_zone_id) = cz.gid
+"""
+ZONE_IDS_QUERY = "SELECT gid FROM cbrfc_zones WHERE segment = %(segment)s"
+SWE_QUERY = """
+SELECT *
+ FROM {view}
+ WHERE
+    cbrfc_zone_id = ANY(%(zone_ids)s) AND
+    date >= to_date(%(date)s, 'YYYY-MM-DD')
+"""
+VIEWS = {
+    "previous": "zonal_swe_full_join",
+    "current": "public.zonal_swe",
+}
+
+
+def plan_nodes(plan: dict) -> list:
+    """
+    All nodes of a JSON query plan.
+    """
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def explain(cursor: psycopg.Cursor, query: str, params: dict) -> dict:
+    cursor.execute(
+        "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params
+    )
+    result = cursor.fetchone()[0]
+    return (result if isinstance(result, list) else json.loads(result))[0]
+
+
+def measure(
+    cursor: psycopg.Cursor, query: str, params: dict, repeat: int
+) -> tuple:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        rows = len(cursor.fetchall())
+        times.append(time.perf_counter() - start)
+
+    return rows, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("connection_info", help="Database connection string")
+    parser.add_argument("segment", help="Segment with the zones to query")
+    parser.add_argument("--date", default="2020-10-01")
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+
+    with psycopg.connect(arguments.connection_info) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(PREVIOUS_VIEW)
+            cursor.execute(ZONE_IDS_QUERY, dict(segment=arguments.segment))
+            zone_ids = [row[0] for row in cursor.fetchall()]
+            params = dict(zone_ids=zone_ids, date=arguments.date)
+            print(f"Zones: {len(zone_ids)}")
+
+            for name, view in VIEWS.items():
+                query = SWE_QUERY.format(view=view)
+                plan = explain(cursor, query, params)
+                nodes = plan_nodes(plan["Plan"])
+                scans = sorted({
+                    f"{node['Node Type']} on {node['Relation Name']}"
+                    for node in nodes if "Relation Name" in node
+                })
+                rows, latency = measure(
+                    cursor, query, params, arguments.repeat
+                )
+
+                print(
+                    f"{name}: {rows} rows, median {latency * 1000:.1f} ms, "
+                    f"planning {plan['Planning Time']:.1f} ms, "
+                    f"execution {plan['Execution Time']:.1f} ms"
+                )
+                for scan in scans:
+                    print(f"  {scan}")
+
+        connection.rollback()
+
+
+if __name__ == "__main__":
+    main()
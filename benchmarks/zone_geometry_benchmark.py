@@ -0,0 +1,151 @@
+"""
+Benchmark the stored product zone geometries against transforming the zone
+with every query.
+
+Compares the query plans of the previous transform_zone query and the lookup
+in product_zone_geometries, and the latency of the SWE query for one zone and
+date with both. The product has to be registered with register_product_srid.
+The previous path is measured by removing the product from product_srid
+within the benchmark transaction, which is rolled back at the end.
+
+Usage:
+    python benchmarks/zone_geometry_benchmark.py CONNECTION_INFO PRODUCT \
+        ZONE [--date 2020-04-01] [--repeat 5]
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import psycopg
+from psycopg import sql
+
+TRANSFORM_QUERIES = {
+    "previous": sql.SQL("""
+WITH zone_buffer as (
+   SELECT * FROM cbrfc_zone_buffer(%(zone)s)
+),
+raster_srid AS (
+    SELECT ST_SRID({product}.rast) AS epsg FROM {product}
+    ORDER BY {product}.rid LIMIT 1
+)
+SELECT
+    ST_TRANSFORM(cz.geom, raster_srid.epsg),
+    ST_TRANSFORM(zb.buffered_envelope, raster_srid.epsg)
+FROM cbrfc_zones cz, raster_srid, zone_buffer zb
+WHERE cz.zone = %(zone)s
+"""),
+    "current": sql.SQL("""
+SELECT pzg.geom, pzg.transformed_envelope
+FROM product_zone_geometries pzg
+WHERE pzg.product = %(product)s AND pzg.zone = %(zone)s
+"""),
+}
+SWE_QUERY = """
+SELECT * FROM swe_from_product_for_zone_and_date(
+    %(product)s, %(zone)s, %(date)s
+)
+"""
+UNREGISTER_QUERY = "DELETE FROM product_srid WHERE product = %(product)s"
+REFRESH_QUERY = "REFRESH MATERIALIZED VIEW product_zone_geometries"
+
+
+def plan_nodes(plan: dict) -> list:
+    """
+    All nodes of a JSON query plan.
+    """
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def explain(cursor: psycopg.Cursor, query, params: dict) -> dict:
+    cursor.execute(
+        sql.SQL("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ") + query, params
+    )
+    result = cursor.fetchone()[0]
+    return (result if isinstance(result, list) else json.loads(result))[0]
+
+
+def measure(
+    cursor: psycopg.Cursor, query, params: dict, repeat: int
+) -> tuple:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        rows = len(cursor.fetchall())
+        times.append(time.perf_counter() - start)
+
+    return rows, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("connection_info", help="Database connection string")
+    parser.add_argument("product", help="Raster table of the product")
+    parser.add_argument("zone", help="CBRFC zone name")
+    parser.add_argument("--date", default="2020-04-01")
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+
+    params = dict(
+        product=arguments.product, zone=arguments.zone, date=arguments.date
+    )
+
+    with psycopg.connect(arguments.connection_info) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM product_zone_geometries "
+                "WHERE product = %(product)s", params
+            )
+            if cursor.fetchone()[0] == 0:
+                parser.error(
+                    f"Product {arguments.product} is not registered, run "
+                    f"SELECT register_product_srid('{arguments.product}')"
+                )
+
+            for name, query in TRANSFORM_QUERIES.items():
+                query = query.format(
+                    product=sql.Identifier(arguments.product)
+                )
+                plan = explain(cursor, query, params)
+                nodes = plan_nodes(plan["Plan"])
+                scans = sorted({
+                    f"{node['Node Type']} on {node['Relation Name']}"
+                    for node in nodes if "Relation Name" in node
+                })
+
+                print(
+                    f"{name} transform: "
+                    f"planning {plan['Planning Time']:.1f} ms, "
+                    f"execution {plan['Execution Time']:.1f} ms"
+                )
+                for scan in scans:
+                    print(f"  {scan}")
+
+            rows, latency = measure(
+                cursor, SWE_QUERY, params, arguments.repeat
+            )
+            cursor.execute(UNREGISTER_QUERY, params)
+            cursor.execute(REFRESH_QUERY)
+            previous_rows, previous_latency = measure(
+                cursor, SWE_QUERY, params, arguments.repeat
+            )
+
+            print(
+                f"previous query: {previous_rows} rows, "
+                f"median {previous_latency * 1000:.1f} ms"
+            )
+            print(
+                f"current query: {rows} rows, "
+                f"median {latency * 1000:.1f} ms"
+            )
+
+        connection.rollback()
+
+
+if __name__ == "__main__":
+    main()
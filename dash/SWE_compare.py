@@ -4,26 +4,42 @@
 import sys
 
 from nb_paths import HOST_IP
-from config import DATASETS
-from data_load import available_zones, load_and_group
+from config import (
+    DATASETS, START_DATE,
+    SEGMENT_CACHE_SIZE, SEGMENT_CACHE_TTL, SEGMENT_CACHE_DIR, SEGMENT_CACHE_WARMUP,
+    TIMELINE_WEBGL, TIMELINE_MAX_POINTS,
+)
+from data_load import available_zones, load_segment, precomputed_statistics
+from segment_cache import SegmentCache
 from timeline_plot import add_scatter_line
-from data_statistics import generate_statistics, plot_year
+from data_statistics import generate_statistics, plot_year, statistics_by_year
 
 import plotly.graph_objects as go
-from dash import Dash, dcc, html, Input, Output
+from dash import Dash, dcc, html, Input, Output, ctx, no_update
 import dash_bootstrap_components as dbc
 
 # Dash App
 # --------
-zones = available_zones()
-basin_values = [name for name in zones["Segment"].unique()]
-basin_options = [
-    {
-        "label": f"{name[0:4]} - {zones[zones['Segment'] == name].iloc[0]['Description']}",
-        "value": name,
-    }
-    for name in basin_values
-]
+def basin_options() -> list:
+    zones = available_zones()
+
+    return [
+        {
+            "label": f"{name[0:4]} - {zones[zones['Segment'] == name].iloc[0]['Description']}",
+            "value": name,
+        }
+        for name in zones["Segment"].unique()
+    ]
+
+
+segment_data = SegmentCache(
+    lambda segment, date: load_segment(segment, available_zones(), date),
+    START_DATE,
+    maxsize=SEGMENT_CACHE_SIZE,
+    cache_dir=SEGMENT_CACHE_DIR,
+    ttl=SEGMENT_CACHE_TTL,
+)
+segment_data.warm(SEGMENT_CACHE_WARMUP)
 
 app = Dash(__name__, external_stylesheets=[dbc.themes.ZEPHYR])
 server = app.server
@@ -38,7 +54,7 @@ app.layout = dbc.Container(
                         html.P("Select zone"),
                         dcc.Dropdown(
                             id="segment-dropdown",
-                            options=basin_options,
+                            options=[],
                             clearable=False,
                         ),
                     ],
@@ -84,24 +100,69 @@ app.layout = dbc.Container(
 
 
 @app.callback(
-    Output("swe-figure", "figure"), Input("segment-dropdown", "value")
+    Output("segment-dropdown", "options"), Input("segment-dropdown", "id")
+)
+def update_options(_):
+    # Loaded with the page instead of at startup
+    return basin_options()
+
+
+def relayout_x_range(relayout_data: dict) -> tuple | None:
+    """
+    Visible date range after zooming or None for the full range.
+    """
+    if "xaxis.range[0]" in relayout_data:
+        return (
+            relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]
+        )
+    if "xaxis.range" in relayout_data:
+        return tuple(relayout_data["xaxis.range"])
+
+    return None
+
+
+@app.callback(
+    Output("swe-figure", "figure"),
+    Input("segment-dropdown", "value"),
+    Input("swe-figure", "relayoutData"),
 )
-def update_timeline(value):
+def update_timeline(value, relayout_data):
     if value is None:
         return
 
+    x_range = None
+    if ctx.triggered_id == "swe-figure":
+        relayout_data = relayout_data or {}
+        x_range = relayout_x_range(relayout_data)
+        # Only reload when zooming or resetting to the full range
+        if x_range is None and not relayout_data.get("xaxis.autorange"):
+            return no_update
+
     figure = go.Figure(
         layout=go.Layout(
             title=dict(text="Zonal SWE"),
             xaxis=dict(title="Date"),
             yaxis=dict(title="SWE (in)"),
             height=700,
+            # Keep zoom and legend selection when updating the traces
+            uirevision=value,
         ),
     )
+    if x_range is not None:
+        figure.update_xaxes(range=list(x_range))
 
-    for name, df_group in load_and_group(value, zones):
+    for name, df_group in segment_data.get(value).groupby("Zone Name"):
         for dataset in DATASETS:
-            figure.add_trace(add_scatter_line(df_group, dataset, name[6:8]))
+            figure.add_trace(
+                add_scatter_line(
+                    df_group,
+                    dataset,
+                    name[6:8],
+                    webgl=TIMELINE_WEBGL,
+                    max_points=TIMELINE_MAX_POINTS,
+                    x_range=x_range,
+                )
+            )
 
     figure.update_traces(visible=True)
     figure.update_layout(template="plotly_white")
@@ -118,8 +179,14 @@ def update_stats(value):
     if value is None:
         return children
 
-    for name, df_group in load_and_group(value, zones):
-        year_stats[name] = generate_statistics(df_group)
+    statistics = precomputed_statistics(value)
+    if len(statistics) > 0:
+        for name, zone_stats in statistics.groupby("Zone Name", sort=False):
+            year_stats[name] = statistics_by_year(zone_stats)
+    else:
+        # Segment not precomputed yet
+        for name, df_group in segment_data.get(value).groupby("Zone Name"):
+            year_stats[name] = generate_statistics(df_group)
 
     for zone_name, all_years in year_stats.items():
         accordion_years = []
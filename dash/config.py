@@ -4,3 +4,30 @@ START_DATE = "2020-10-01"
 END_YEAR = 2025
 # Current list of products
 DATASETS = ["Snow-17", "iSnobal", "SNODAS", "UArizona", "CU Boulder", "ASO"]
+# Local query cache
+QUERY_CACHE_DIR = "cache/queries"
+# Seconds before cached queries fetch new rows
+QUERY_CACHE_TTL = 6 * 60 * 60
+# Size limit of the query cache on disk
+QUERY_CACHE_MAX_BYTES = 2 * 1024 ** 3
+# Days of cached rows fetched again with a refresh, for late and revised data
+QUERY_CACHE_OVERLAP_DAYS = 60
+# Refreshes before a cached query is fetched in full
+QUERY_CACHE_FULL_REFRESH = 8
+# Segments kept in memory by the Dash app
+SEGMENT_CACHE_SIZE = 32
+# Seconds before a segment in memory is loaded again from the query cache
+SEGMENT_CACHE_TTL = QUERY_CACHE_TTL
+# Segment usage shared between workers, set to None to disable
+SEGMENT_CACHE_DIR = "cache/segments"
+# Most used segments to load at startup
+SEGMENT_CACHE_WARMUP = 5
+# Zones within the model domains, rebuilt when a topo file changes
+ZONE_INDEX_FILE = "cache/zone_index.json"
+# Render the timeline with WebGL
+TIMELINE_WEBGL = True
+# Points per timeline trace, zooming in loads the visible range in full
+TIMELINE_MAX_POINTS = 1000
+# Local zone by day SWE cube from update_swe_cube.py, None queries the
+# database instead
+SWE_CUBE_DIR = None
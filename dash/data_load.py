@@ -1,24 +1,53 @@
+import json
+import os
+import threading
+
 import xarray as xr
 import numpy as np
 import pandas as pd
 
 from pandas.api.typing import DataFrameGroupBy
-from psycopg import sql
+from swed_17 import QueryCache, SWECube
+from swed_17.zone_db.binary_copy import read_binary_copy
 
 from nb_paths import SWE_DB, SNOW17_DB, MODEL_DOMAINS, BASIN_DIR
-from config import START_DATE
+from config import (
+    START_DATE, QUERY_CACHE_DIR, QUERY_CACHE_TTL, QUERY_CACHE_MAX_BYTES,
+    QUERY_CACHE_OVERLAP_DAYS, QUERY_CACHE_FULL_REFRESH, ZONE_INDEX_FILE,
+    SWE_CUBE_DIR,
+)
 
 ZONE_QUERY = """
 SELECT cz.gid, cc.ch5_id, cz.segment, cz.zone, cc.description
  FROM cbrfc_zones cz LEFT JOIN cbrfc_ch5id cc ON cz.ch5_id = cc.id
- WHERE cz.gid in ({});
+ WHERE cz.gid = ANY(%(zone_ids)s)
+"""
+ZONE_NAMES_QUERY = """
+SELECT gid, zone FROM cbrfc_zones WHERE gid = ANY(%(zone_ids)s)
 """
+# Fetched with binary COPY, which requires values for all columns
 SWE_QUERY = """
-SELECT *
+SELECT
+    date,
+    COALESCE(isnobal_swe, 'NaN'),
+    COALESCE(snodas_swe, 'NaN'),
+    COALESCE(ua_swe, 'NaN'),
+    COALESCE(cu_boulder_swe, 'NaN'),
+    COALESCE(aso_swe, 'NaN'),
+    cbrfc_zone_id
  FROM public.zonal_swe
  WHERE
-    cbrfc_zone_id in ({}) AND
-    date >= to_date({}, 'YYYY-MM-DD')
+    cbrfc_zone_id = ANY(%(zone_ids)s) AND
+    date >= to_date(%(date)s, 'YYYY-MM-DD')
+"""
+STATISTICS_TABLE = "swe_yearly_statistics"
+# Statistics table columns for the generate_statistics_frame columns
+STATISTICS_COLUMNS = {"year": "water_year", "a": "dataset_a", "b": "dataset_b"}
+STATISTICS_QUERY = f"""
+SELECT zone_name, {', '.join(STATISTICS_COLUMNS.values())}, stat, value
+ FROM {STATISTICS_TABLE}
+ WHERE segment = %(segment)s
+ ORDER BY zone_name, water_year DESC
 """
 ZONE_NAME = "Zone Name"
 DATA_COLUMNS = [
@@ -31,42 +60,173 @@ DATA_COLUMNS = [
     "ASO",
     "ID",
 ]
+# Column types of the SWE query binary COPY output
+SWE_COPY_TYPES = dict(
+    zip(
+        [column for column in DATA_COLUMNS if column != ZONE_NAME],
+        ["timestamptz", *["float8"] * 5, "int4"],
+    )
+)
+# Data columns of the SWE cube products
+CUBE_COLUMNS = dict(
+    date="Date",
+    cbrfc_zone_id="ID",
+    **dict(zip(SWECube.PRODUCTS, DATA_COLUMNS[2:-1])),
+)
+QUERY_CACHE = QueryCache(
+    QUERY_CACHE_DIR,
+    ttl=QUERY_CACHE_TTL,
+    max_bytes=QUERY_CACHE_MAX_BYTES,
+    overlap_days=QUERY_CACHE_OVERLAP_DAYS,
+    full_refresh=QUERY_CACHE_FULL_REFRESH,
+)
+
+ZONE_COLUMNS = ["ID", "CH5ID", "Segment", ZONE_NAME, "Description"]
+# Zones of the last index check as (topo file modification times, zones)
+_ZONE_INDEX = (None, None)
+_ZONE_INDEX_LOCK = threading.Lock()
+
+SWE_CUBE = SWECube(SWE_CUBE_DIR) if SWE_CUBE_DIR is not None else None
+
+
+def topo_mtimes() -> dict:
+    return {
+        domain: os.stat(BASIN_DIR + f"/{domain}_topo.nc").st_mtime
+        for domain in MODEL_DOMAINS
+    }
+
+
+def available_zones() -> pd.DataFrame:
+    """
+    Zones within the model domains.
+
+    Read from the zone index file, which is rebuilt with :meth:`scan_zones`
+    when a topo file changed since it was written.
+    """
+    global _ZONE_INDEX
+
+    mtimes = topo_mtimes()
+
+    with _ZONE_INDEX_LOCK:
+        if _ZONE_INDEX[0] == mtimes:
+            return _ZONE_INDEX[1]
+
+        zones = read_zone_index(mtimes)
+        if zones is None:
+            zones = scan_zones()
+            write_zone_index(zones, mtimes)
+
+        _ZONE_INDEX = (mtimes, zones)
+
+    return zones
+
+
+def read_zone_index(mtimes: dict) -> pd.DataFrame | None:
+    try:
+        with open(ZONE_INDEX_FILE) as index_file:
+            index = json.load(index_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if index["mtimes"] != mtimes:
+        return None
+
+    return pd.DataFrame(index["zones"], columns=ZONE_COLUMNS).set_index("ID")
+
+
+def write_zone_index(zones: pd.DataFrame, mtimes: dict) -> None:
+    os.makedirs(os.path.dirname(ZONE_INDEX_FILE) or ".", exist_ok=True)
+    temporary = f"{ZONE_INDEX_FILE}.{os.getpid()}.tmp"
+
+    with open(temporary, "w") as index_file:
+        json.dump(
+            dict(
+                mtimes=mtimes,
+                zones=zones.reset_index().to_dict(orient="records"),
+            ),
+            index_file,
+        )
+    os.replace(temporary, ZONE_INDEX_FILE)
 
-def available_zones():
+
+def scan_zones() -> pd.DataFrame:
     zone_ids = []
 
     for domain in MODEL_DOMAINS:
-        domain = xr.open_dataset(BASIN_DIR + f"/{domain}_topo.nc")
-        zone_ids = np.append(zone_ids, np.unique(domain.cbrfc_zone.values))
+        with xr.open_dataset(BASIN_DIR + f"/{domain}_topo.nc") as topo:
+            zone_ids = np.append(zone_ids, np.unique(topo.cbrfc_zone.values))
 
-    zone_query = sql.SQL(ZONE_QUERY).format(
-        sql.SQL(",").join(map(sql.Literal, zone_ids))
-    )
+    zone_ids = [int(zone_id) for zone_id in zone_ids if np.isfinite(zone_id)]
 
-    with SWE_DB.query(zone_query) as results:
+    with SWE_DB.query(
+        ZONE_QUERY, dict(zone_ids=zone_ids), prepare=True
+    ) as results:
         zones = pd.DataFrame(
             results.fetchall(),
-            columns=["ID", "CH5ID", "Segment", ZONE_NAME, "Description"],
+            columns=ZONE_COLUMNS,
         ).set_index("ID")
 
     return zones
 
 
-def swe_for_zone(zone_ids: list, date: str):
-    zone_query = sql.SQL(SWE_QUERY).format(
-        sql.SQL(",").join(map(sql.Literal, zone_ids)), date
+def swe_for_zone(zone_ids: list, date: str, cached: bool = True):
+    zone_ids = [int(zone_id) for zone_id in zone_ids]
+
+    if not cached:
+        return query_swe_for_zone(zone_ids, date)
+
+    if SWE_CUBE is not None:
+        return cube_swe_for_zone(zone_ids, date)
+
+    def fetch_newer(since: pd.Timestamp) -> pd.DataFrame:
+        if since is None:
+            return query_swe_for_zone(zone_ids, date)
+        swe = query_swe_for_zone(zone_ids, since.strftime("%Y-%m-%d"))
+        return swe[swe["Date"] > since]
+
+    return QUERY_CACHE.get(
+        "zonal_swe",
+        dict(zone_ids=zone_ids, date=date),
+        lambda: query_swe_for_zone(zone_ids, date),
+        fetch_newer,
+        date_column="Date",
     )
 
-    with SWE_DB.query(zone_query) as results:
-        swe = pd.DataFrame(
-            results.fetchall(),
-            columns=DATA_COLUMNS,
-        )
+
+def query_swe_for_zone(zone_ids: list, date: str):
+    params = dict(zone_ids=zone_ids, date=date)
+
+    with SWE_DB.query(ZONE_NAMES_QUERY, params, prepare=True) as results:
+        zone_names = dict(results.fetchall())
+
+    values = read_binary_copy(
+        SWE_DB.copy_out(SWE_QUERY, params), SWE_COPY_TYPES
+    )
+    values["Date"] = pd.DatetimeIndex(values["Date"], tz="UTC").as_unit("ns")
+    values["ID"] = values["ID"].astype(np.int64)
+    values[ZONE_NAME] = pd.Series(values["ID"]).map(zone_names).array
+
+    swe = pd.DataFrame(values, columns=DATA_COLUMNS)
     swe[ZONE_NAME] = swe[ZONE_NAME].astype("string")
 
     return swe
 
 
+def cube_swe_for_zone(zone_ids: list, date: str):
+    """
+    Zonal SWE from the local SWE cube, in the layout of
+    :func:`query_swe_for_zone`.
+    """
+    SWE_CUBE.reload()
+    swe = SWE_CUBE.frame(zone_ids, date).rename(columns=CUBE_COLUMNS)
+    swe[DATA_COLUMNS[2:-1]] = swe[DATA_COLUMNS[2:-1]].astype(np.float64)
+    swe[ZONE_NAME] = swe["ID"].map(available_zones()[ZONE_NAME]).astype(
+        "string"
+    )
+
+    return swe[DATA_COLUMNS]
+
+
 def snow_17_swe_for_zone(zone_id: str, date: str):
     df = SNOW17_DB.for_zone_forecasted(zone_id, from_year=date[0:4])
     df.rename(columns={"SWE (mm)": "Snow-17"}, inplace=True)
@@ -77,15 +237,37 @@ def snow_17_swe_for_zone(zone_id: str, date: str):
     return df
 
 
-def load_and_group(value: str, zones: pd.DataFrame) -> DataFrameGroupBy:
+def precomputed_statistics(segment: str) -> pd.DataFrame:
+    """
+    Statistics stored by precompute_statistics.py for all zones of a segment,
+    with the columns of data_statistics.generate_statistics_frame and the
+    zone name.
+    """
+    with SWE_DB.query(STATISTICS_QUERY, dict(segment=segment)) as results:
+        statistics = pd.DataFrame(
+            results.fetchall(),
+            columns=[ZONE_NAME, *STATISTICS_COLUMNS.keys(), "stat", "value"],
+        )
+
+    return statistics
+
+
+def load_segment(
+    value: str,
+    zones: pd.DataFrame,
+    date: str = START_DATE,
+    cached: bool = True,
+) -> pd.DataFrame:
     zone_ids = zones[zones["Segment"] == value].index.values
     segment = value[0:6]
 
-    df = pd.merge(
-        snow_17_swe_for_zone(segment, START_DATE),
-        swe_for_zone(zone_ids, START_DATE),
+    return pd.merge(
+        snow_17_swe_for_zone(segment, date),
+        swe_for_zone(zone_ids, date, cached),
         on=["Date", "Zone Name"],
         how="inner",
     ).set_index("Date")
 
-    return df.groupby("Zone Name")
+
+def load_and_group(value: str, zones: pd.DataFrame) -> DataFrameGroupBy:
+    return load_segment(value, zones).groupby("Zone Name")
@@ -63,9 +63,75 @@ def pairwise_statistics(data_a: Series, data_b: Series) -> dict:
         "rmse": (rmse / MM_IN_INCH).round(2),
     }
 
-def generate_statistics(data: pd.DataFrame) -> dict:
+
+STATISTICS = ["timing_shift", "overlapping", "magnitude", "net", "rmse"]
+
+
+def pairwise_statistics_matrix(values: np.ndarray) -> dict:
     """
-    Calculate statistics broken down by water year
+    Calculate the statistics of :meth:`pairwise_statistics` for all pairs of
+    the given datasets at once.
+
+    Only the upper triangle pairs are calculated and mirrored to the lower
+    triangle. The diagonal is set to 1 for all statistics.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Daily values with shape (dataset, day)
+
+    Returns
+    -------
+    dict
+        Matrix with shape (dataset, dataset) for each statistic, where the
+        row is the first and the column the second dataset of a pair.
+    """
+    count, days = values.shape
+    x = np.arange(0, days, 1)
+
+    # Normalize (PDF)
+    area = integrate.simpson(values, x=x, axis=-1)
+    norm = values / area[:, np.newaxis]
+    # Centroids (mean time)
+    centroid = integrate.simpson(x * norm, x=x, axis=-1)
+
+    a, b = np.triu_indices(count, k=1)
+    overlapping = integrate.simpson(np.minimum(norm[a], norm[b]), x=x, axis=-1)
+    with np.errstate(invalid="ignore"):
+        rmse = np.sqrt(np.nanmean((values[b] - values[a]) ** 2, axis=-1))
+
+    # Values for (a, b) and the mirrored (b, a) pairs
+    pairs = {
+        "timing_shift": (centroid[a] - centroid[b], centroid[b] - centroid[a]),
+        "overlapping": (overlapping, overlapping),
+        "magnitude": (area[b] / area[a], area[a] / area[b]),
+        "net": (area[b] - area[a], area[a] - area[b]),
+        "rmse": (rmse, rmse),
+    }
+
+    matrices = {}
+    for stat in STATISTICS:
+        upper, lower = pairs[stat]
+        matrix = np.empty((count, count))
+        matrix[a, b] = upper
+        matrix[b, a] = lower
+
+        if stat == "net":
+            matrix = np.trunc(matrix / MM_IN_INCH)
+        elif stat == "rmse":
+            matrix = (matrix / MM_IN_INCH).round(2)
+        else:
+            matrix = matrix.round(2)
+
+        np.fill_diagonal(matrix, 1)
+        matrices[stat] = matrix
+
+    return matrices
+
+
+def generate_statistics_frame(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calculate statistics broken down by water year as tidy dataframe
 
     Parameters
     ----------
@@ -74,11 +140,12 @@ def generate_statistics(data: pd.DataFrame) -> dict:
 
     Returns
     -------
-    dict
-        Dictionary with satistics for each year
+    pd.DataFrame
+        One row per year, statistic and dataset pair with the columns:
+        year, stat, a, b, value
     """
     cols = DATASETS[0:4]
-    year_stats = {}
+    frames = []
 
     for year in range(END_YEAR, int(START_DATE[0:4]), - 1):
         year_data = data[
@@ -88,37 +155,71 @@ def generate_statistics(data: pd.DataFrame) -> dict:
         if len(year_data) < 1:
             continue
 
-        overlapping = pd.DataFrame(index=cols, columns=cols).astype(float)
-        timing_shift = pd.DataFrame(index=cols, columns=cols).astype(float)
-        net_diff = pd.DataFrame(index=cols, columns=cols).astype(float)
-        magnitude_diff = pd.DataFrame(index=cols, columns=cols).astype(float)
-        rmse = pd.DataFrame(index=cols, columns=cols).astype(float)
-
-        for col_a in cols:
-            for col_b in cols:
-                if col_a == col_b:
-                    value = {
-                        "overlapping": 1,
-                        "timing_shift": 1,
-                        "net": 1,
-                        "magnitude": 1,
-                        "rmse": 1,
-                    }
-                else:
-                    value = pairwise_statistics(year_data[col_a], year_data[col_b])
-
-                overlapping.loc[col_a, col_b] = value["overlapping"]
-                timing_shift.loc[col_a, col_b] = value["timing_shift"]
-                net_diff.loc[col_a, col_b] = value["net"]
-                magnitude_diff.loc[col_a, col_b] = value["magnitude"]
-                rmse.loc[col_a, col_b] = value["rmse"]
+        matrices = pairwise_statistics_matrix(
+            year_data[cols].to_numpy(dtype=float).T
+        )
+        a, b = np.meshgrid(cols, cols, indexing="ij")
+
+        for stat, matrix in matrices.items():
+            frames.append(pd.DataFrame({
+                "year": year,
+                "stat": stat,
+                "a": a.ravel(),
+                "b": b.ravel(),
+                "value": matrix.ravel(),
+            }))
+
+    if len(frames) == 0:
+        return pd.DataFrame(columns=["year", "stat", "a", "b", "value"])
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def generate_statistics(data: pd.DataFrame) -> dict:
+    """
+    Calculate statistics broken down by water year
+
+    Uses :meth:`generate_statistics_frame` and pivots each statistic into a
+    dataset by dataset matrix.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Daily SWE data
+
+    Returns
+    -------
+    dict
+        Dictionary with satistics for each year
+    """
+    return statistics_by_year(generate_statistics_frame(data))
+
+
+def statistics_by_year(statistics: pd.DataFrame) -> dict:
+    """
+    Pivot tidy statistics into a matrix for each year and statistic.
+
+    Parameters
+    ----------
+    statistics : pd.DataFrame
+        Statistics from :meth:`generate_statistics_frame`
+
+    Returns
+    -------
+    dict
+        Dictionary with satistics for each year
+    """
+    cols = DATASETS[0:4]
+    year_stats = {}
 
+    for year, year_data in statistics.groupby("year", sort=False):
         year_stats[year] = {
-            "timing_shift": timing_shift,
-            "overlapping": overlapping,
-            "magnitude": magnitude_diff,
-            "net": net_diff,
-            "rmse": rmse,
+            stat: year_data[year_data["stat"] == stat].pivot(
+                index="a", columns="b", values="value"
+            ).reindex(index=cols, columns=cols).rename_axis(
+                index=None, columns=None
+            ).astype(float)
+            for stat in STATISTICS
         }
 
     return year_stats
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+"""
+Precompute the yearly statistics of all zones for the Dash app.
+
+Statistics are only recomputed for zones where the source data changed since
+the last run. Changes are detected with a hash of the row counts, last dates
+and value sums per zone and product, which the databases aggregate without
+transferring the data. Statistics of zones that are no longer available are
+removed.
+
+Usage:
+    python precompute_statistics.py [--segment SEGMENT ...] [--force]
+"""
+
+import argparse
+import hashlib
+
+import pandas as pd
+
+from nb_paths import SWE_DB, SNOW17_DB
+from config import START_DATE
+from data_load import (
+    available_zones, load_segment, STATISTICS_TABLE, STATISTICS_COLUMNS,
+    ZONE_NAME,
+)
+from data_statistics import generate_statistics_frame
+
+SOURCE_TABLE = "swe_yearly_statistics_source"
+SOURCE_QUERY = f"""
+SELECT zone_name, source_hash
+ FROM {SOURCE_TABLE}
+ WHERE segment = %(segment)s
+"""
+DELETE_QUERY = """
+DELETE FROM {table}
+ WHERE segment = %(segment)s AND zone_name = %(zone_name)s
+"""
+REMOVED_ZONES_QUERY = """
+DELETE FROM {table}
+ WHERE (segment, zone_name) NOT IN (
+    SELECT * FROM unnest(%(segments)s::text[], %(zone_names)s::text[])
+ )
+"""
+# Change markers of the zonal SWE products, with the filter of
+# data_load.SWE_QUERY
+SWE_MARKER_QUERY = """
+SELECT
+    cbrfc_zone_id,
+    count(*),
+    max(date),
+    count(isnobal_swe), sum(isnobal_swe::numeric),
+    count(snodas_swe), sum(snodas_swe::numeric),
+    count(ua_swe), sum(ua_swe::numeric),
+    count(cu_boulder_swe), sum(cu_boulder_swe::numeric),
+    count(aso_swe), sum(aso_swe::numeric)
+ FROM public.zonal_swe
+ WHERE
+    cbrfc_zone_id = ANY(%(zone_ids)s) AND
+    date >= to_date(%(date)s, 'YYYY-MM-DD')
+ GROUP BY cbrfc_zone_id
+"""
+# Change markers of the Snow-17 forecast, with the filter of
+# data_load.snow_17_swe_for_zone
+SNOW17_MARKER_QUERY = (
+    "SELECT opid, COUNT(*), MAX(cal_yr * 10000 + mon * 100 + zday), "
+    "SUM(DECIMAL(swe, 15, 4)) "
+    "FROM states_snow17 "
+    "WHERE segid = :segid AND cal_yr >= :cal_yr "
+    "GROUP BY opid"
+)
+
+
+def source_hashes(segment: str, zones: pd.DataFrame) -> dict:
+    """
+    Hash of the change markers of each zone in the segment.
+
+    Only zones with data in both databases are returned, as the statistics
+    are computed from the merged data.
+    """
+    zone_names = zones[zones["Segment"] == segment][ZONE_NAME]
+    params = dict(
+        zone_ids=[int(zone_id) for zone_id in zone_names.index],
+        date=START_DATE,
+    )
+
+    with SWE_DB.query(SWE_MARKER_QUERY, params) as results:
+        swe_markers = {
+            zone_names[row[0]]: row[1:] for row in results.fetchall()
+        }
+
+    snow17_markers = {
+        row[0]: tuple(row[1:])
+        for row in SNOW17_DB.query(
+            SNOW17_MARKER_QUERY,
+            dataframe=False,
+            segid=segment[0:6] + SNOW17_DB.FORECASTED,
+            cal_yr=int(START_DATE[0:4]),
+        )
+    }
+
+    return {
+        zone_name: hashlib.sha1(
+            repr((swe_markers[zone_name], snow17_markers[zone_name])).encode()
+        ).hexdigest()
+        for zone_name in swe_markers.keys() & snow17_markers.keys()
+    }
+
+
+def stored_hashes(segment: str) -> dict:
+    """
+    Source data hash of the last run for each zone in the segment.
+    """
+    with SWE_DB.query(SOURCE_QUERY, dict(segment=segment)) as results:
+        return dict(results.fetchall())
+
+
+def write_zone(
+    segment: str, zone_name: str, statistics: pd.DataFrame, data_hash: str
+) -> None:
+    """
+    Replace the stored statistics of a zone.
+
+    The statistics and the source hash are replaced in one transaction, so
+    readers see either the previous or the new statistics of the zone and a
+    failed write leaves the previous ones.
+    """
+    params = dict(segment=segment, zone_name=zone_name)
+
+    statistics = statistics.rename(columns=STATISTICS_COLUMNS)
+    statistics.insert(0, "zone_name", zone_name)
+    statistics.insert(0, "segment", segment)
+
+    with SWE_DB.transaction() as cursor:
+        for table in [SOURCE_TABLE, STATISTICS_TABLE]:
+            cursor.execute(DELETE_QUERY.format(table=table), params)
+
+        SWE_DB.write(statistics, STATISTICS_TABLE, cursor=cursor)
+        SWE_DB.write(
+            pd.DataFrame([dict(params, source_hash=data_hash)]),
+            SOURCE_TABLE,
+            cursor=cursor,
+        )
+
+
+def update_segment(
+    segment: str, zones: pd.DataFrame, force: bool = False
+) -> list:
+    """
+    Recompute the statistics of all zones in the segment with changed data.
+
+    Only the data of changed zones is loaded.
+
+    Parameters
+    ----------
+    segment : str
+        Segment as used in the Dash app segment selection
+    zones : pd.DataFrame
+        Available zones
+    force : bool
+        Recompute all zones regardless of changes
+
+    Returns
+    -------
+    list
+        Names of the updated zones
+    """
+    hashes = {} if force else stored_hashes(segment)
+    changed = {
+        zone_name: data_hash
+        for zone_name, data_hash in source_hashes(segment, zones).items()
+        if hashes.get(zone_name) != data_hash
+    }
+
+    if not changed:
+        return []
+
+    changed_zones = zones[zones[ZONE_NAME].isin(changed.keys())]
+    # Cached queries might not have the latest changes yet
+    data_by_zone = load_segment(segment, changed_zones, cached=False).groupby(
+        ZONE_NAME
+    )
+
+    updated = []
+    for zone_name, data in data_by_zone:
+        write_zone(
+            segment,
+            zone_name,
+            generate_statistics_frame(data),
+            changed[zone_name],
+        )
+        updated.append(zone_name)
+
+    return updated
+
+
+def remove_zones(zones: pd.DataFrame) -> None:
+    """
+    Delete the statistics of zones that are no longer available.
+    """
+    if zones.empty:
+        return
+
+    params = dict(
+        segments=list(zones["Segment"]),
+        zone_names=list(zones[ZONE_NAME]),
+    )
+
+    with SWE_DB.transaction() as cursor:
+        for table in [SOURCE_TABLE, STATISTICS_TABLE]:
+            cursor.execute(REMOVED_ZONES_QUERY.format(table=table), params)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute yearly statistics for the Dash app"
+    )
+    parser.add_argument(
+        "--segment", nargs="+", help="Segments to update (Default: All)"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Recompute unchanged zones"
+    )
+    arguments = parser.parse_args()
+
+    zones = available_zones()
+    segments = arguments.segment or zones["Segment"].unique()
+
+    remove_zones(zones)
+
+    for segment in segments:
+        updated = update_segment(segment, zones, arguments.force)
+        print(f"{segment}: Updated {len(updated)} zones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SegmentCache:
+    """
+    Process wide least recently used cache of the merged data per segment.
+
+    Shared by all callbacks, so a segment selection loads the data once.
+    Concurrent requests for the same segment wait for the first one to load
+    instead of loading it again, while other segments load concurrently.
+    The data is only kept in memory; the queries the load function runs are
+    cached on disk with the size bound of their query cache. With a cache
+    directory, the segment usage is recorded to warm the most used segments
+    after a restart.
+    """
+
+    USAGE_FILE = "usage.json"
+    LOCK_FILE = "usage.json.lock"
+
+    def __init__(
+        self,
+        load: Callable[[str, str], pd.DataFrame],
+        start_date: str,
+        maxsize: int = 32,
+        cache_dir: str = None,
+        ttl: float = None,
+    ):
+        """
+        Parameters
+        ----------
+        load : Callable
+            Load the data for a segment and start date
+        start_date : str
+            First date to load
+        maxsize : int
+            Number of segments to keep in memory
+        cache_dir : str, optional
+            Directory for the segment usage
+        ttl : float, optional
+            Seconds before a segment is loaded again. (Default: Never)
+        """
+        self._load = load
+        self.start_date = start_date
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._usage_file = None
+        if cache_dir is not None:
+            self._usage_file = Path(cache_dir) / self.USAGE_FILE
+
+        self._data = OrderedDict()
+        self._pending = {}
+        try:
+            self._usage = self._read_usage()
+        except OSError as error:
+            LOGGER.warning("Reading the segment usage failed: %s", error)
+            self._usage = Counter()
+        # Requests since the last write to the usage file
+        self._new_usage = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, segment: str) -> pd.DataFrame:
+        """
+        Data for the segment, loaded when not cached.
+        """
+        with self._lock:
+            self._usage[segment] += 1
+            self._new_usage[segment] += 1
+
+        return self._get(segment)
+
+    def _get(self, segment: str) -> pd.DataFrame:
+        key = (segment, self.start_date)
+
+        with self._lock:
+            if key in self._data and not self._is_stale(key):
+                self._data.move_to_end(key)
+                return self._data[key][1]
+
+            future = self._pending.get(key)
+            loading = future is None
+            if loading:
+                future = Future()
+                self._pending[key] = future
+
+        if not loading:
+            return future.result()
+
+        try:
+            data = self._load(segment, self.start_date)
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(data)
+            with self._lock:
+                self._data[key] = (time.monotonic(), data)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            self._write_usage()
+
+        return data
+
+    def most_used(self, count: int) -> list:
+        """
+        Most requested segments, starting with the most used.
+        """
+        with self._lock:
+            return [segment for segment, _ in self._usage.most_common(count)]
+
+    def warm(self, count: int) -> threading.Thread:
+        """
+        Load the most used segments in a background thread.
+
+        Parameters
+        ----------
+        count : int
+            Number of segments to load
+
+        Returns
+        -------
+        threading.Thread
+            Started daemon thread
+        """
+        segments = self.most_used(count)
+
+        def load():
+            for segment in segments:
+                try:
+                    self._get(segment)
+                except Exception as error:
+                    LOGGER.warning(
+                        "Warming segment %s failed: %s", segment, error
+                    )
+
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+
+        return thread
+
+    def _is_stale(self, key: tuple) -> bool:
+        return self.ttl is not None and \
+            time.monotonic() - self._data[key][0] > self.ttl
+
+    def _read_usage(self) -> Counter:
+        if self._usage_file is None:
+            return Counter()
+
+        try:
+            with open(self._usage_file) as usage_file:
+                return Counter(json.load(usage_file))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return Counter()
+
+    def _write_usage(self) -> None:
+        """
+        Add the requests since the last write to the counts on disk.
+
+        The file is locked between reading and replacing it, so counts of
+        other worker processes are not overwritten.
+        """
+        if self._usage_file is None:
+            return
+
+        with self._lock:
+            new_usage, self._new_usage = self._new_usage, Counter()
+
+        try:
+            usage = self._merge_usage(new_usage)
+        except OSError as error:
+            # Usage is best effort, keep the counts for the next write
+            with self._lock:
+                self._new_usage.update(new_usage)
+            LOGGER.warning("Writing the segment usage failed: %s", error)
+            return
+
+        with self._lock:
+            self._usage = usage + self._new_usage
+
+    def _merge_usage(self, new_usage: Counter) -> Counter:
+        self._usage_file.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = self._usage_file.with_name(self.LOCK_FILE)
+        temporary = self._usage_file.with_name(
+            f"{self.USAGE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+
+        with open(lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                usage = self._read_usage() + new_usage
+                with open(temporary, "w") as usage_file:
+                    json.dump(usage, usage_file)
+                os.replace(temporary, self._usage_file)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        return usage
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
@@ -9,9 +10,88 @@ COLORS = {
     'OF': 'seagreen',
 }
 MM_IN_INCH = 25.4
+# WebGL traces only support named dash styles
+GL_DASH = {
+    "iSnobal": "dash",
+    "SNODAS": "longdash",
+    "UArizona": "dashdot",
+    "CU Boulder": "dot",
+}
+
+
+def min_max_downsample(
+    x: np.ndarray, y: np.ndarray, points: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce a line to about the given number of points, keeping the minimum
+    and maximum of each bucket of consecutive values.
+
+    The first missing value of each gap is kept as well, which preserves the
+    gaps of the line.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Sorted x values
+    y : np.ndarray
+        Y values
+    points : int
+        Number of points to keep at most
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Downsampled x and y values
+    """
+    count = len(y)
+    if count <= points:
+        return x, y
+
+    buckets = max(points // 2, 1)
+    size = -(-count // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:count] = y
+    padded = padded.reshape(buckets, size)
+
+    missing = np.isnan(padded)
+    starts = np.arange(buckets) * size
+    minimum = starts + np.where(missing, np.inf, padded).argmin(axis=1)
+    maximum = starts + np.where(missing, -np.inf, padded).argmax(axis=1)
+    gaps = np.isnan(y)
+    gaps = np.flatnonzero(gaps[1:] & ~gaps[:-1]) + 1
+
+    keep = np.unique(np.concatenate([[0, count - 1], minimum, maximum, gaps]))
+    keep = keep[keep < count]
 
+    return x[keep], y[keep]
 
-def add_scatter_line(df_group: pd.DataFrame, product: str, zone_index: str):
+
+def add_scatter_line(
+    df_group: pd.DataFrame,
+    product: str,
+    zone_index: str,
+    webgl: bool = False,
+    max_points: int = None,
+    x_range: tuple = None,
+):
+    """
+    Trace of a product for one zone.
+
+    Parameters
+    ----------
+    df_group : pd.DataFrame
+        Zone data with the dates as index
+    product : str
+        Product column
+    zone_index : str
+        Zone within the segment (UF, MF, LF, OF)
+    webgl : bool
+        Render with WebGL
+    max_points : int, optional
+        Downsample lines to this many points. (Default: All points)
+    x_range : tuple, optional
+        Only include dates within (start, end)
+    """
     style_opts = {}
     if product == "iSnobal":
         style_opts = {
@@ -63,10 +143,33 @@ def add_scatter_line(df_group: pd.DataFrame, product: str, zone_index: str):
             },
         }
 
-    return go.Scatter(
-        x=df_group.index.tolist(),
-        y=(df_group[product] / MM_IN_INCH),
-        name=f"{product} {zone_index}",
-        **style_opts,
+    dates = df_group.index
+    if dates.tz is not None:
+        dates = dates.tz_convert(None)
+
+    x = dates.to_numpy()
+    y = df_group[product].to_numpy(dtype=float) / MM_IN_INCH
+
+    if x_range is not None:
+        start, end = (np.datetime64(value, "ns") for value in x_range)
+        visible = (x >= start) & (x <= end)
+        x, y = x[visible], y[visible]
+
+    if style_opts["mode"] == "markers":
+        # Only sparse observations
+        x, y = x[~np.isnan(y)], y[~np.isnan(y)]
+    elif max_points is not None:
+        x, y = min_max_downsample(x, y, max_points)
+
+    if not webgl:
+        return go.Scatter(
+            x=x, y=y, name=f"{product} {zone_index}", **style_opts
+        )
+
+    if product in GL_DASH:
+        style_opts["line"]["dash"] = GL_DASH[product]
+
+    return go.Scattergl(
+        x=x, y=y, name=f"{product} {zone_index}", **style_opts
     )
 
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Create or update the local SWE cube the Dash app reads with SWE_CUBE_DIR.
+
+A new cube is exported when none exists or with --rebuild, which is also
+required to add new zones. Otherwise only the days after the last day of the
+cube are appended.
+
+Usage:
+    python update_swe_cube.py [--path PATH] [--overlap DAYS] [--rebuild]
+"""
+
+import argparse
+import os
+
+from swed_17 import SWECube
+
+from nb_paths import SWE_DB
+from config import START_DATE, SWE_CUBE_DIR
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Create or update the local SWE cube"
+    )
+    parser.add_argument(
+        "--path", default=SWE_CUBE_DIR or "cache/swe_cube",
+        help="Cube directory (Default: SWE_CUBE_DIR)"
+    )
+    parser.add_argument(
+        "--overlap", type=int, default=7,
+        help="Last days of the cube to fetch again"
+    )
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Export a new cube"
+    )
+    arguments = parser.parse_args()
+
+    if arguments.rebuild or not os.path.exists(
+        os.path.join(arguments.path, SWECube.INDEX_FILE)
+    ):
+        cube = SWECube.export(arguments.path, SWE_DB, START_DATE)
+        print(
+            f"Exported {len(cube.zone_ids)} zones with {cube.days} days "
+            f"to {arguments.path}"
+        )
+        return
+
+    cube = SWECube(arguments.path)
+    added = cube.append(SWE_DB, overlap=arguments.overlap)
+    print(f"Added {added} days, last day {cube.dates[-1]:%Y-%m-%d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,17 +13,60 @@ AS $function$
     FROM cbrfc_zone;
 $function$;
 
+-- Function to get the native SRID of a product
+-- Uses the registered SRID from product_srid (013-product_zone_geometries.sql)
+-- when that script was run and the SRID of the first raster otherwise.
+DROP FUNCTION IF EXISTS public.product_srid_for;
+CREATE OR REPLACE FUNCTION public.product_srid_for(product TEXT)
+  RETURNS INT
+  LANGUAGE plpgsql
+  STABLE
+AS $function$
+DECLARE
+    product_epsg INT;
+BEGIN
+    IF to_regclass('public.product_srid') IS NOT NULL THEN
+        SELECT ps.srid INTO product_epsg
+        FROM product_srid ps
+        WHERE ps.product = $1;
+    END IF;
+
+    IF product_epsg IS NULL THEN
+        EXECUTE FORMAT(
+            'SELECT ST_SRID(r.rast) FROM %1$I AS r ORDER BY r.rid LIMIT 1',
+            product
+        ) INTO product_epsg;
+    END IF;
+
+    RETURN product_epsg;
+END
+$function$
+;
+
 -- Function to transform CBRFC zone to target SRID
 -- Returns the zone geometry in product SRID and a buffered envelope for querying
 -- Query steps:
---  1. Get SRID of target raster to clip from (raster_srid)
---  2. Get target CBRFC zone and transform to SRID from target raster
+--  1. Get the stored geometries of registered products from
+--     product_zone_geometries, when 013-product_zone_geometries.sql was run
+--  2. Otherwise, get SRID of target raster to clip from (raster_srid)
+--     and transform target CBRFC zone to it
 DROP FUNCTION IF EXISTS public.transform_zone;
 CREATE OR REPLACE FUNCTION public.transform_zone(product TEXT, zone_name TEXT)
   RETURNS TABLE (geom geometry, transformed_envelope geometry)
   LANGUAGE plpgsql
 AS $function$
 BEGIN
+    IF to_regclass('public.product_zone_geometries') IS NOT NULL THEN
+        RETURN QUERY
+            SELECT pzg.geom, pzg.transformed_envelope
+            FROM product_zone_geometries pzg
+            WHERE pzg.product = $1 AND pzg.zone = $2;
+
+        IF FOUND THEN
+            RETURN;
+        END IF;
+    END IF;
+
     RETURN QUERY EXECUTE FORMAT(
         'WITH zone_buffer as (
            SELECT * FROM cbrfc_zone_buffer($1)
@@ -12,6 +12,7 @@ $function$
 
 -- Find SWE values for given station.
 -- Transforms the station location to the native SRID of the dataset
+-- (product_srid_for)
 DROP FUNCTION IF EXISTS public.cu_boulder_swe_at_station;
 CREATE OR REPLACE FUNCTION public.cu_boulder_swe_at_station(target_station_name text)
 RETURNS TABLE(swe_date date, raw_pixel_value double precision) AS $$
@@ -19,13 +20,13 @@ BEGIN
     RETURN QUERY EXECUTE format('
         WITH transformed_sites AS (
             SELECT
-                ST_Transform(ss.geometry, ST_SRID(r.rast)) AS target_geom
+                ST_Transform(
+                    ss.geometry, product_srid_for(''cu_boulder'')
+                ) AS target_geom
             FROM
-                snotel_sites AS ss,
-                cu_boulder AS r
+                snotel_sites AS ss
             WHERE
                 ss.station_name = %L
-            LIMIT 0
         )
         SELECT
             swe_raster.swe_date,
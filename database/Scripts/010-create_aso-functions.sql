@@ -12,6 +12,7 @@ $function$
 
 -- Find SWE values for given station.
 -- Transforms the station location to the native SRID of the dataset
+-- (product_srid_for)
 DROP FUNCTION IF EXISTS public.aso_swe_at_station;
 CREATE OR REPLACE FUNCTION public.aso_swe_at_station(target_station_name text)
 RETURNS TABLE(swe_date date, raw_pixel_value double precision) AS $$
@@ -19,13 +20,13 @@ BEGIN
     RETURN QUERY EXECUTE format('
         WITH transformed_sites AS (
             SELECT
-                ST_Transform(ss.geometry, ST_SRID(r.rast)) AS target_geom
+                ST_Transform(
+                    ss.geometry, product_srid_for(''aso_swe_13n'')
+                ) AS target_geom
             FROM
-                snotel_sites AS ss,
-                aso_swe_13n AS r
+                snotel_sites AS ss
             WHERE
                 ss.station_name = %L
-            LIMIT 1
         )
         SELECT
             swe_raster.swe_date,
@@ -50,13 +51,13 @@ BEGIN
     RETURN QUERY EXECUTE format('
         WITH transformed_sites AS (
             SELECT
-                ST_Transform(ss.geometry, ST_SRID(r.rast)) AS target_geom
+                ST_Transform(
+                    ss.geometry, product_srid_for(''aso_depth_13n'')
+                ) AS target_geom
             FROM
-                snotel_sites AS ss,
-                aso_depth_13n AS r
+                snotel_sites AS ss
             WHERE
                 ss.station_name = %L
-            LIMIT 1
         )
         SELECT
             swe_raster.swe_date,
@@ -0,0 +1,152 @@
+-- Precomputed intersection of CBRFC zones with the pixels of a product grid.
+--
+-- Products store one set of tiles per date on the same grid. The tiles of
+-- the first date are the grid template, and the tiles of every other date
+-- are matched to them by their upper left corner.
+--
+-- Build once per product grid with:
+--   SELECT build_zone_pixel_weights('snodas');
+-- Then get the SWE of all zones for a date with:
+--   SELECT * FROM swe_from_product_for_date('snodas', '2023-04-01');
+
+-- Tiles of the product grid template
+DROP TABLE IF EXISTS product_grid_tiles CASCADE;
+CREATE TABLE product_grid_tiles (
+    product TEXT NOT NULL,
+    rid INT NOT NULL,
+    upper_left_x DOUBLE PRECISION NOT NULL,
+    upper_left_y DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY(product, rid)
+);
+CREATE INDEX product_grid_tiles_upper_left ON product_grid_tiles
+    USING btree (product, upper_left_x, upper_left_y);
+
+-- Share of each template tile pixel within a zone. The pixel index is the
+-- row major position within the tile, starting at 1.
+DROP TABLE IF EXISTS zone_pixel_weights;
+CREATE TABLE zone_pixel_weights (
+    product TEXT NOT NULL,
+    zone_gid INT NOT NULL,
+    rid INT NOT NULL,
+    pixel_index INT NOT NULL,
+    weight DOUBLE PRECISION NOT NULL,
+    FOREIGN KEY (product, rid) REFERENCES product_grid_tiles(product, rid) ON DELETE CASCADE,
+    FOREIGN KEY (zone_gid) REFERENCES cbrfc_zones(gid) ON DELETE CASCADE,
+    PRIMARY KEY(product, zone_gid, rid, pixel_index)
+);
+CREATE INDEX zone_pixel_weights_tile ON zone_pixel_weights
+    USING btree (product, rid, pixel_index);
+
+-- Function to (re)build the grid template and zone weights of a product
+-- Query steps:
+--  1. Store the tiles of the first date as grid template
+--  2. Transform all zones once to the product SRID (product_zones)
+--  3. Get the pixel polygons of the template tiles for each intersecting zone
+--  4. Store the area share of each pixel within the zone
+DROP FUNCTION IF EXISTS public.build_zone_pixel_weights;
+CREATE OR REPLACE FUNCTION public.build_zone_pixel_weights(product TEXT)
+  RETURNS INT
+  LANGUAGE plpgsql
+AS $function$
+DECLARE
+    weight_count INT;
+BEGIN
+    DELETE FROM product_grid_tiles pgt WHERE pgt.product = $1;
+
+    EXECUTE FORMAT(
+        'INSERT INTO product_grid_tiles
+        SELECT $1, r.rid, ST_UpperLeftX(r.rast), ST_UpperLeftY(r.rast)
+        FROM %1$I AS r
+        WHERE r.swe_date = (SELECT MIN(swe_date) FROM %1$I)',
+        product
+    ) USING product;
+
+    EXECUTE FORMAT(
+        'WITH raster_srid AS (
+            SELECT ST_SRID(r.rast) AS epsg FROM %1$I AS r ORDER BY r.rid LIMIT 1
+        ),
+        product_zones AS (
+            SELECT cz.gid, ST_TRANSFORM(cz.geom, raster_srid.epsg) AS geom
+            FROM cbrfc_zones cz, raster_srid
+        ),
+        zone_pixels AS (
+            SELECT
+                pz.gid,
+                r.rid,
+                pz.geom AS zone_geom,
+                ST_Width(r.rast) AS tile_width,
+                (ST_PixelAsPolygons(r.rast, 1, false)).*
+            FROM %1$I AS r
+            JOIN product_grid_tiles pgt ON pgt.product = $1 AND pgt.rid = r.rid
+            JOIN product_zones pz ON ST_Intersects(r.rast::geometry, pz.geom)
+        )
+        INSERT INTO zone_pixel_weights
+        SELECT
+            $1,
+            zp.gid,
+            zp.rid,
+            (zp.y - 1) * zp.tile_width + zp.x,
+            ST_Area(ST_Intersection(zp.geom, zp.zone_geom)) / ST_Area(zp.geom)
+        FROM zone_pixels zp
+        WHERE ST_Intersects(zp.geom, zp.zone_geom)',
+        product
+    ) USING product;
+
+    GET DIAGNOSTICS weight_count = ROW_COUNT;
+    RETURN weight_count;
+END
+$function$
+;
+
+-- Function to query a SWE product for all zones on given date
+-- Reads every tile of the date once and combines its pixel values with the
+-- precomputed zone weights. Coverage is the share of the zone with a value.
+-- Query steps:
+--  1. Match the tiles of the date to the grid template (date_tiles)
+--  2. Unnest the pixel values in row major order (pixel_values)
+--  3. Weighted average for each zone using the stored weights
+DROP FUNCTION IF EXISTS public.swe_from_product_for_date;
+CREATE OR REPLACE FUNCTION public.swe_from_product_for_date(
+    product TEXT, target_date TEXT
+)
+RETURNS TABLE(cbrfc_zone_id INT, swe DOUBLE PRECISION, coverage DOUBLE PRECISION)
+LANGUAGE plpgsql
+AS $function$
+BEGIN
+    RETURN QUERY EXECUTE FORMAT(
+        'WITH date_tiles AS (
+            SELECT pgt.rid, r.rast
+            FROM %1$I AS r
+            JOIN product_grid_tiles pgt
+                ON pgt.product = $1
+                AND pgt.upper_left_x = ST_UpperLeftX(r.rast)
+                AND pgt.upper_left_y = ST_UpperLeftY(r.rast)
+            WHERE r.swe_date = TO_DATE($2, ''YYYY-MM-DD'')
+        ),
+        pixel_values AS (
+            SELECT dt.rid, pv.val, pv.pixel_index::INT
+            FROM date_tiles dt,
+                unnest(ST_DumpValues(dt.rast, 1)) WITH ORDINALITY AS pv(val, pixel_index)
+        ),
+        zone_weights AS (
+            SELECT zpw.zone_gid, SUM(zpw.weight) AS total_weight
+            FROM zone_pixel_weights zpw
+            WHERE zpw.product = $1
+            GROUP BY zpw.zone_gid
+        )
+        SELECT
+            zpw.zone_gid,
+            SUM(zpw.weight * pv.val) / NULLIF(SUM(zpw.weight) FILTER (WHERE pv.val IS NOT NULL), 0),
+            SUM(zpw.weight) FILTER (WHERE pv.val IS NOT NULL) / zw.total_weight
+        FROM pixel_values pv
+        JOIN zone_pixel_weights zpw
+            ON zpw.product = $1
+            AND zpw.rid = pv.rid
+            AND zpw.pixel_index = pv.pixel_index
+        JOIN zone_weights zw ON zw.zone_gid = zpw.zone_gid
+        GROUP BY zpw.zone_gid, zw.total_weight',
+        product
+    ) USING product, target_date;
+END
+$function$
+;
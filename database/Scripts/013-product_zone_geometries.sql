@@ -0,0 +1,84 @@
+-- CBRFC zone geometries in the native SRID of each product
+--
+-- Avoids transforming a zone and looking up the product SRID with every
+-- query. Register a product once after its first import and again when its
+-- grid changes:
+--   SELECT register_product_srid('snodas');
+-- Changes to cbrfc_zones refresh the geometries with a trigger.
+-- The script can be run again to update the functions, existing product
+-- registrations and geometries are kept.
+
+-- Native SRID of each product raster table
+CREATE TABLE IF NOT EXISTS product_srid (
+    product TEXT PRIMARY KEY,
+    srid INT NOT NULL
+);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS product_zone_geometries AS
+    WITH zone_buffer AS (
+        SELECT
+            cz.gid,
+            cz.zone,
+            cz.geom,
+            st_buffer(st_envelope(cz.geom), 0.05) AS buffered_envelope
+        FROM cbrfc_zones cz
+    )
+    SELECT
+        ps.product,
+        zb.gid,
+        zb.zone,
+        ST_TRANSFORM(zb.geom, ps.srid) AS geom,
+        ST_TRANSFORM(zb.buffered_envelope, ps.srid) AS transformed_envelope
+    FROM product_srid ps, zone_buffer zb;
+
+-- Unique index is required to refresh concurrently
+CREATE UNIQUE INDEX IF NOT EXISTS product_zone_geometries_product_gid
+    ON product_zone_geometries USING btree (product, gid);
+CREATE INDEX IF NOT EXISTS product_zone_geometries_product_zone
+    ON product_zone_geometries USING btree (product, zone);
+CREATE INDEX IF NOT EXISTS product_zone_geometries_geom
+    ON product_zone_geometries USING gist (geom);
+CREATE INDEX IF NOT EXISTS product_zone_geometries_envelope
+    ON product_zone_geometries USING gist (transformed_envelope);
+
+-- Function to store the SRID of a product and refresh the zone geometries
+DROP FUNCTION IF EXISTS public.register_product_srid;
+CREATE OR REPLACE FUNCTION public.register_product_srid(product TEXT)
+  RETURNS INT
+  LANGUAGE plpgsql
+AS $function$
+DECLARE
+    product_epsg INT;
+BEGIN
+    EXECUTE FORMAT(
+        'SELECT ST_SRID(r.rast) FROM %1$I AS r ORDER BY r.rid LIMIT 1',
+        product
+    ) INTO product_epsg;
+
+    INSERT INTO product_srid VALUES ($1, product_epsg)
+    ON CONFLICT ON CONSTRAINT product_srid_pkey
+    DO UPDATE SET srid = EXCLUDED.srid;
+
+    REFRESH MATERIALIZED VIEW CONCURRENTLY product_zone_geometries;
+
+    RETURN product_epsg;
+END
+$function$
+;
+
+-- Refresh the zone geometries when the CBRFC zones change
+DROP FUNCTION IF EXISTS public.refresh_product_zone_geometries CASCADE;
+CREATE OR REPLACE FUNCTION public.refresh_product_zone_geometries()
+  RETURNS TRIGGER
+  LANGUAGE plpgsql
+AS $function$
+BEGIN
+    REFRESH MATERIALIZED VIEW product_zone_geometries;
+    RETURN NULL;
+END
+$function$
+;
+
+CREATE TRIGGER cbrfc_zones_refresh_product_geometries
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON cbrfc_zones
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_product_zone_geometries();
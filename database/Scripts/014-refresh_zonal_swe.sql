@@ -0,0 +1,248 @@
+-- Incremental refresh of the zonal SWE tables from the product rasters
+--
+-- Each registered product stores the last date that was written to its
+-- zonal table. A refresh only computes the zonal SWE of dates after it,
+-- using the zone pixel weights (012-zone_pixel_weights.sql).
+--
+-- Register a product once with its zonal table and factor to mm. Zones are
+-- written when more than 95% of their area has a value, which can be changed
+-- with the min_coverage argument:
+--   SELECT register_zonal_swe_refresh('snodas', 'snodas_zonal_swe');
+--   SELECT register_zonal_swe_refresh('cu_boulder', 'cu_boulder_zonal_swe', 1000);
+--   SELECT register_zonal_swe_refresh('isnobal', 'isnobal_zonal_swe', 1, 2);
+-- Then refresh after an import with:
+--   SELECT refresh_zonal_swe('snodas');
+-- Or all registered products with:
+--   SELECT * FROM refresh_all_zonal_swe();
+
+DROP TABLE IF EXISTS zonal_swe_refresh;
+CREATE TABLE zonal_swe_refresh (
+    product TEXT PRIMARY KEY,
+    zonal_table TEXT NOT NULL,
+    -- Factor to convert the product values to mm
+    scale FLOAT NOT NULL DEFAULT 1,
+    -- Share of a zone that needs a value, as in swe_from_product_for_zone
+    min_coverage FLOAT NOT NULL DEFAULT 0.95,
+    -- Required for isnobal_zonal_swe
+    isnobal_version_id INT REFERENCES isnobal_version(ID) ON DELETE CASCADE,
+    -- High water mark, last date written to the zonal table
+    last_swe_date DATE,
+    refreshed_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Function to register a product for the refresh
+-- The high water mark starts with the last date in the zonal table.
+DROP FUNCTION IF EXISTS public.register_zonal_swe_refresh;
+CREATE OR REPLACE FUNCTION public.register_zonal_swe_refresh(
+    product TEXT,
+    zonal_table TEXT,
+    scale FLOAT DEFAULT 1,
+    isnobal_version_id INT DEFAULT NULL,
+    min_coverage FLOAT DEFAULT 0.95
+)
+  RETURNS DATE
+  LANGUAGE plpgsql
+AS $function$
+DECLARE
+    last_date DATE;
+BEGIN
+    EXECUTE FORMAT(
+        'SELECT MAX(zt.datetime AT TIME ZONE ''UTC'')::DATE
+        FROM %1$I AS zt
+        WHERE zt.metric_type_id = 1 %2$s',
+        zonal_table,
+        CASE WHEN isnobal_version_id IS NOT NULL
+            THEN 'AND zt.isnobal_version_id = $1' ELSE '' END
+    ) INTO last_date USING isnobal_version_id;
+
+    INSERT INTO zonal_swe_refresh (
+        product, zonal_table, scale, min_coverage, isnobal_version_id,
+        last_swe_date
+    )
+    VALUES ($1, $2, $3, $5, $4, last_date)
+    ON CONFLICT ON CONSTRAINT zonal_swe_refresh_pkey
+    DO UPDATE SET
+        zonal_table = EXCLUDED.zonal_table,
+        scale = EXCLUDED.scale,
+        min_coverage = EXCLUDED.min_coverage,
+        isnobal_version_id = EXCLUDED.isnobal_version_id,
+        last_swe_date = EXCLUDED.last_swe_date;
+
+    RETURN last_date;
+END
+$function$
+;
+
+-- Function to refresh the materialized views that depend on a table,
+-- directly or through other views
+-- Views with a unique index are refreshed concurrently, so they can be
+-- read during the refresh.
+DROP FUNCTION IF EXISTS public.refresh_dependent_views;
+CREATE OR REPLACE FUNCTION public.refresh_dependent_views(table_name TEXT)
+  RETURNS SETOF TEXT
+  LANGUAGE plpgsql
+AS $function$
+DECLARE
+    view_record RECORD;
+BEGIN
+    FOR view_record IN
+        WITH RECURSIVE dependents AS (
+            SELECT DISTINCT r.ev_class AS oid
+            FROM pg_depend d
+            JOIN pg_rewrite r ON r.oid = d.objid
+            WHERE d.refobjid = table_name::regclass
+                AND r.ev_class <> table_name::regclass
+            UNION
+            SELECT r.ev_class
+            FROM dependents dp
+            JOIN pg_depend d ON d.refobjid = dp.oid
+            JOIN pg_rewrite r ON r.oid = d.objid
+            WHERE r.ev_class <> dp.oid
+        )
+        SELECT
+            c.oid::regclass AS view_name,
+            EXISTS (
+                SELECT 1 FROM pg_index i
+                WHERE i.indrelid = c.oid AND i.indisunique
+            ) AS has_unique_index
+        FROM dependents dp
+        JOIN pg_class c ON c.oid = dp.oid
+        WHERE c.relkind = 'm'
+    LOOP
+        IF view_record.has_unique_index THEN
+            EXECUTE FORMAT(
+                'REFRESH MATERIALIZED VIEW CONCURRENTLY %s',
+                view_record.view_name
+            );
+        ELSE
+            EXECUTE FORMAT(
+                'REFRESH MATERIALIZED VIEW %s', view_record.view_name
+            );
+        END IF;
+        RETURN NEXT view_record.view_name::TEXT;
+    END LOOP;
+END
+$function$
+;
+
+-- Function to write the zonal SWE of new product dates
+-- Query steps:
+--  1. Lock the product entry, so only one refresh per product runs
+--  2. Get the dates after the high water mark (or since the given date)
+--  3. Replace the zonal SWE of each date with swe_from_product_for_date,
+--     for zones with more than the minimum coverage of the product.
+--     isnobal_zonal_swe has no unique key on date and zone, so existing
+--     rows are deleted instead of using ON CONFLICT.
+--  4. Move the high water mark and refresh the dependent views. A date
+--     without any zone, e.g. without zone pixel weights for the product, stops
+--     the refresh with a warning and keeps it and later dates for the
+--     next refresh.
+DROP FUNCTION IF EXISTS public.refresh_zonal_swe;
+CREATE OR REPLACE FUNCTION public.refresh_zonal_swe(
+    product TEXT, since DATE DEFAULT NULL
+)
+  RETURNS INT
+  LANGUAGE plpgsql
+AS $function$
+DECLARE
+    settings zonal_swe_refresh%ROWTYPE;
+    new_date DATE;
+    zone_rows INT;
+    date_rows INT;
+    total_rows INT := 0;
+BEGIN
+    SELECT * INTO settings
+    FROM zonal_swe_refresh zsr
+    WHERE zsr.product = $1
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Product % is not registered, see register_zonal_swe_refresh', $1;
+    END IF;
+
+    FOR new_date IN EXECUTE FORMAT(
+        'SELECT DISTINCT r.swe_date FROM %1$I AS r
+        WHERE r.swe_date > $1
+        ORDER BY r.swe_date',
+        product
+    ) USING COALESCE(since - 1, settings.last_swe_date, '-infinity'::DATE)
+    LOOP
+        -- Block to undo the delete of a date without new rows
+        BEGIN
+            EXECUTE FORMAT(
+                'DELETE FROM %1$I AS zt
+                WHERE zt.datetime = $1::TIMESTAMP AT TIME ZONE ''UTC''
+                    AND zt.metric_type_id = 1 %2$s',
+                settings.zonal_table,
+                CASE WHEN settings.isnobal_version_id IS NOT NULL
+                    THEN 'AND zt.isnobal_version_id = $2' ELSE '' END
+            ) USING new_date, settings.isnobal_version_id;
+
+            -- Zones below the minimum coverage are not written, but
+            -- count as rows of the product for the date
+            EXECUTE FORMAT(
+                'WITH zone_swe AS (
+                    SELECT * FROM swe_from_product_for_date($2, to_char($1, ''YYYY-MM-DD''))
+                ),
+                inserted AS (
+                    INSERT INTO %1$I (datetime, value, metric_type_id, cbrfc_zone_id%2$s)
+                    SELECT $1::TIMESTAMP AT TIME ZONE ''UTC'', zs.swe * $3, 1, zs.cbrfc_zone_id%3$s
+                    FROM zone_swe zs
+                    WHERE zs.swe IS NOT NULL AND zs.coverage > $5
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM zone_swe), (SELECT COUNT(*) FROM inserted)',
+                settings.zonal_table,
+                CASE WHEN settings.isnobal_version_id IS NOT NULL
+                    THEN ', isnobal_version_id' ELSE '' END,
+                CASE WHEN settings.isnobal_version_id IS NOT NULL
+                    THEN ', $4' ELSE '' END
+            ) INTO zone_rows, date_rows
+            USING new_date, product, settings.scale,
+                settings.isnobal_version_id, settings.min_coverage;
+
+            IF zone_rows = 0 THEN
+                RAISE EXCEPTION USING ERRCODE = 'no_data_found';
+            END IF;
+        EXCEPTION WHEN no_data_found THEN
+            -- Keep the high water mark before this date, so it is retried
+            RAISE WARNING 'No zonal SWE for % on %, stopped the refresh before this date',
+                product, new_date
+                USING HINT = 'Check the zone pixel weights and product grid tiles of the product';
+            EXIT;
+        END;
+
+        total_rows := total_rows + date_rows;
+
+        UPDATE zonal_swe_refresh zsr
+        SET last_swe_date = GREATEST(zsr.last_swe_date, new_date)
+        WHERE zsr.product = $1;
+    END LOOP;
+
+    UPDATE zonal_swe_refresh zsr
+    SET refreshed_at = CURRENT_TIMESTAMP
+    WHERE zsr.product = $1;
+
+    IF total_rows > 0 THEN
+        PERFORM refresh_dependent_views(settings.zonal_table);
+    END IF;
+
+    RETURN total_rows;
+END
+$function$
+;
+
+-- Function to refresh all registered products
+DROP FUNCTION IF EXISTS public.refresh_all_zonal_swe;
+CREATE OR REPLACE FUNCTION public.refresh_all_zonal_swe()
+  RETURNS TABLE (product TEXT, written_rows INT)
+  LANGUAGE plpgsql
+AS $function$
+BEGIN
+    RETURN QUERY
+        SELECT zsr.product, refresh_zonal_swe(zsr.product)
+        FROM zonal_swe_refresh zsr
+        ORDER BY zsr.product;
+END
+$function$
+;
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+"""
+Import many raster files into an existing product table in parallel.
+
+Runs the same raster2pgsql | psql import as import_to_db.sh with a bounded
+number of concurrent imports. Instead of running the post import SQL after
+every file, the files are imported in batches and each batch is followed by
+one update of the file dates and one VACUUM ANALYZE of the table.
+
+Imported files are recorded in a manifest, and files listed in it are
+skipped with the next run to resume an interrupted import.
+
+Files have to follow the YYYYMMDD_ name pattern of the import scripts and
+be converted to the product grid already (e.g. with convert_to_db_tif.sh).
+The table has to exist, see the -c option of the product import scripts.
+
+Usage:
+    python parallel_import.py -t snodas --out-db db_data/2024*_SWE.tif \
+        [--workers 4] [--batch-size 50] [--manifest snodas_manifest.jsonl] \
+        [--refresh-zonal [--query-cache ../../dash/cache/queries]]
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import psycopg
+from psycopg import sql
+
+from swed_17 import QueryCache
+
+DB_CONNECT_OPTIONS = "service=swe_db"
+# Required file name pattern, see import_script_options.sh
+DB_FILE_PATTERN = re.compile(r"^([0-9]{8})_.*")
+
+# raster2pgsql options of import_to_db.sh in append mode, without -M which
+# runs VACUUM ANALYZE after every file.
+RASTER2PGSQL_OPTIONS = [
+    "-a", "-F", "-P", "-Y", "1000", "-l", "2,3", "-t", "auto"
+]
+
+# Set the date of the imported records, see 00x-update_*_records.sql
+UPDATE_DATES_QUERY = """
+UPDATE {table}
+    SET swe_date = to_date(split_part(filename, '_', 1), 'YYYYMMDD')
+    WHERE swe_date IS NULL
+"""
+VACUUM_QUERY = "VACUUM ANALYZE {table}"
+VACUUM_FULL_QUERY = "VACUUM FULL ANALYZE {table}"
+# Zonal SWE of the new dates, see 014-refresh_zonal_swe.sql
+REFRESH_ZONAL_QUERY = "SELECT refresh_zonal_swe(%(table)s)"
+# Cached queries of the Dash app with zonal SWE, see dash/data_load.py
+ZONAL_SWE_QUERIES = ["zonal_swe"]
+
+
+def read_manifest(manifest: Path, table: str) -> set:
+    """
+    Files already imported into the table.
+    """
+    if not manifest.exists():
+        return set()
+
+    with manifest.open() as entries:
+        return {
+            entry["file"] for entry in map(json.loads, entries)
+            if entry["table"] == table
+        }
+
+
+def import_file(
+    file: Path, table: str, connect_options: str, out_db: bool
+) -> dict:
+    """
+    Import one file with raster2pgsql into the table.
+
+    The records of a file are imported within one transaction, so a failed
+    import does not leave partial records.
+
+    Returns
+    -------
+    dict
+        Imported file, table and the import time in seconds
+    """
+    start = time.perf_counter()
+    options = RASTER2PGSQL_OPTIONS + (["-R"] if out_db else [])
+
+    # A file instead of a pipe, which raster2pgsql could fill and block on
+    # while psql is still reading
+    with tempfile.TemporaryFile() as raster2pgsql_error:
+        raster2pgsql = subprocess.Popen(
+            ["raster2pgsql", *options, str(file), table],
+            stdout=subprocess.PIPE,
+            stderr=raster2pgsql_error,
+        )
+        psql = subprocess.run(
+            ["psql", connect_options, "--quiet", "-v", "ON_ERROR_STOP=1"],
+            stdin=raster2pgsql.stdout,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        raster2pgsql.stdout.close()
+        raster2pgsql.wait()
+
+        raster2pgsql_error.seek(0)
+        error = raster2pgsql_error.read().decode()
+
+    if raster2pgsql.returncode != 0:
+        raise RuntimeError(f"raster2pgsql failed for {file}: {error}")
+    if psql.returncode != 0:
+        raise RuntimeError(f"psql failed for {file}: {psql.stderr.decode()}")
+
+    return dict(
+        file=str(file), table=table, seconds=time.perf_counter() - start
+    )
+
+
+def finish_batch(connection: psycopg.Connection, table: str, full: bool):
+    """
+    Set the dates of the imported records and vacuum the table once.
+    """
+    table = sql.Identifier(table)
+    connection.execute(sql.SQL(UPDATE_DATES_QUERY).format(table=table))
+    connection.execute(sql.SQL(
+        VACUUM_FULL_QUERY if full else VACUUM_QUERY
+    ).format(table=table))
+
+
+def import_files(
+    files: list,
+    table: str,
+    manifest: Path,
+    connect_options: str = DB_CONNECT_OPTIONS,
+    out_db: bool = False,
+    workers: int = 4,
+    batch_size: int = 50,
+    vacuum_full: bool = False,
+) -> int:
+    """
+    Import the files in batches with a pool of concurrent imports.
+
+    Parameters
+    ----------
+    files : list
+        Raster files to import
+    table : str
+        Product table to import into
+    manifest : Path
+        File with the imported files, one JSON entry per line
+    connect_options : str
+        psql connection options
+    out_db : bool
+        Import files as out-db rasters
+    workers : int
+        Number of concurrent imports
+    batch_size : int
+        Number of files to import before updating and vacuuming the table
+    vacuum_full : bool
+        Run VACUUM FULL instead of VACUUM after each batch
+
+    Returns
+    -------
+    int
+        Number of failed files
+    """
+    done = read_manifest(manifest, table)
+    files = [
+        file for file in map(Path.resolve, files) if str(file) not in done
+    ]
+    print(f"{table}: {len(files)} files to import, {len(done)} already done")
+
+    failed = 0
+    imported = 0
+    start = time.perf_counter()
+
+    with psycopg.connect(connect_options, autocommit=True) as connection, \
+            ThreadPoolExecutor(max_workers=workers) as executor, \
+            manifest.open("a") as manifest_file:
+
+        for batch_start in range(0, len(files), batch_size):
+            batch = files[batch_start:batch_start + batch_size]
+            batch_time = time.perf_counter()
+            batch_imported = imported
+
+            futures = {
+                executor.submit(
+                    import_file, file, table, connect_options, out_db
+                ): file for file in batch
+            }
+            for future in as_completed(futures):
+                try:
+                    entry = future.result()
+                except RuntimeError as error:
+                    failed += 1
+                    print(error)
+                    continue
+
+                manifest_file.write(json.dumps(entry) + "\n")
+                manifest_file.flush()
+                imported += 1
+
+            finish_batch(connection, table, vacuum_full)
+
+            batch_minutes = (time.perf_counter() - batch_time) / 60
+            total_minutes = (time.perf_counter() - start) / 60
+            print(
+                f"{table}: {imported}/{len(files)} files, "
+                f"batch {(imported - batch_imported) / batch_minutes:.1f} "
+                f"files/min, "
+                f"total {imported / total_minutes:.1f} files/min"
+            )
+
+    if failed:
+        print(f"{table}: {failed} files failed, rerun to retry them")
+
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import raster files in parallel into a product table"
+    )
+    parser.add_argument("files", nargs="+", type=Path, help="Files to import")
+    parser.add_argument("-t", "--table", required=True, help="Product table")
+    parser.add_argument(
+        "--out-db", action="store_true", help="Import as out-db rasters"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Concurrent imports"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=50,
+        help="Files per batch before updating the table"
+    )
+    parser.add_argument(
+        "--manifest", type=Path,
+        help="Imported files for resuming (Default: TABLE_manifest.jsonl)"
+    )
+    parser.add_argument(
+        "--vacuum-full", action="store_true",
+        help="Run VACUUM FULL after each batch"
+    )
+    parser.add_argument(
+        "--refresh-zonal", action="store_true",
+        help="Write the zonal SWE of the new dates after the import"
+    )
+    parser.add_argument(
+        "--query-cache", nargs="+", default=[],
+        help="Query cache directories to clear of zonal SWE after the "
+             "refresh, e.g. dash/cache/queries"
+    )
+    parser.add_argument(
+        "--connect-options", default=DB_CONNECT_OPTIONS,
+        help="psql connection options"
+    )
+    arguments = parser.parse_args()
+
+    invalid = [
+        file for file in arguments.files
+        if not DB_FILE_PATTERN.match(file.name)
+    ]
+    if invalid:
+        parser.error(
+            "Files do not match required pattern YYYYMMDD_: "
+            + ", ".join(map(str, invalid))
+        )
+
+    failed = import_files(
+        arguments.files,
+        arguments.table,
+        arguments.manifest or Path(f"{arguments.table}_manifest.jsonl"),
+        connect_options=arguments.connect_options,
+        out_db=arguments.out_db,
+        workers=arguments.workers,
+        batch_size=arguments.batch_size,
+        vacuum_full=arguments.vacuum_full,
+    )
+
+    if arguments.refresh_zonal:
+        with psycopg.connect(arguments.connect_options) as connection:
+            # Dates without zonal SWE are reported as warnings
+            connection.add_notice_handler(
+                lambda notice: print(
+                    f"{notice.severity}: {notice.message_primary}"
+                )
+            )
+            rows = connection.execute(
+                REFRESH_ZONAL_QUERY, dict(table=arguments.table)
+            ).fetchone()[0]
+        print(f"{arguments.table}: Wrote {rows} zonal SWE rows")
+
+        for cache_dir in arguments.query_cache:
+            for name in ZONAL_SWE_QUERIES:
+                QueryCache(cache_dir).invalidate(name)
+
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -33,3 +33,4 @@ CREATE INDEX isnobal_zonal_swe_datetime ON isnobal_zonal_swe(datetime);
 CREATE INDEX isnobal_zonal_swe_metric ON isnobal_zonal_swe(metric_type_id);
 CREATE INDEX isnobal_version_zonal_swe ON isnobal_zonal_swe(isnobal_version_id);
 CREATE INDEX isnobal_zonal_swe_cbrfc_zone ON isnobal_zonal_swe(cbrfc_zone_id);
+CREATE INDEX isnobal_zonal_swe_cbrfc_zone_datetime ON isnobal_zonal_swe(cbrfc_zone_id, datetime);
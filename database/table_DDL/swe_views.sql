@@ -1,49 +1,37 @@
 -- View to fetch SWE zonal SWE data across available tables
+--
+-- Stacks the product tables into one long set and pivots it with one
+-- aggregate per product. Filters on cbrfc_zone_id and date are pushed down
+-- into each product table, which uses their (datetime, cbrfc_zone_id) keys.
 
 DROP VIEW IF EXISTS public.zonal_swe;
 CREATE OR REPLACE VIEW public.zonal_swe
-AS WITH swe_one AS (
-         SELECT
-            COALESCE(isz.cbrfc_zone_id, ssz.cbrfc_zone_id) AS cbrfc_zone_id,
-            COALESCE(isz.datetime, ssz.datetime) AS date,
-            isz.value AS isnobal_swe,
-            ssz.value AS snodas_swe
-           FROM isnobal_zonal_swe isz
-             FULL JOIN snodas_zonal_swe ssz ON isz.cbrfc_zone_id = ssz.cbrfc_zone_id AND isz.datetime = ssz.datetime
-          WHERE isz.isnobal_version_id = 2 AND EXTRACT(hour FROM isz.datetime) = 0::numeric
-    ),
-    swe_two AS (
-         SELECT
-            COALESCE(sv.cbrfc_zone_id, csz.cbrfc_zone_id) AS cbrfc_zone_id,
-            COALESCE(sv.date, csz.datetime) AS date,
-            sv.isnobal_swe,
-            sv.snodas_swe,
-            csz.value AS cu_boulder_swe
-           FROM swe_one sv
-             FULL JOIN cu_boulder_zonal_swe csz
-                ON sv.cbrfc_zone_id = csz.cbrfc_zone_id AND sv.date = csz.datetime
-    ),
-    swe_three AS (
-         SELECT
-            COALESCE(sv.cbrfc_zone_id, asz.cbrfc_zone_id) AS cbrfc_zone_id,
-            COALESCE(sv.date, asz.datetime) AS date,
-            sv.isnobal_swe,
-            sv.snodas_swe,
-            sv.cu_boulder_swe,
-            asz.value AS aso_swe
-           FROM swe_two sv
-             FULL JOIN aso_zonal_swe asz
-                ON sv.cbrfc_zone_id = asz.cbrfc_zone_id AND sv.date = asz.datetime
+AS WITH product_swe AS (
+         SELECT cbrfc_zone_id, datetime, 'isnobal' AS product, value
+           FROM isnobal_zonal_swe
+          WHERE isnobal_version_id = 2 AND EXTRACT(hour FROM datetime) = 0::numeric
+         UNION ALL
+         SELECT cbrfc_zone_id, datetime, 'snodas' AS product, value
+           FROM snodas_zonal_swe
+         UNION ALL
+         SELECT cbrfc_zone_id, datetime, 'ua' AS product, value
+           FROM ua_zonal_swe
+         UNION ALL
+         SELECT cbrfc_zone_id, datetime, 'cu_boulder' AS product, value
+           FROM cu_boulder_zonal_swe
+         UNION ALL
+         SELECT cbrfc_zone_id, datetime, 'aso' AS product, value
+           FROM aso_zonal_swe
     )
  SELECT
-    sv.date,
+    ps.datetime AS date,
     cz.zone AS zone_name,
-    sv.isnobal_swe,
-    sv.snodas_swe,
-    uzs.value AS ua_swe,
-    sv.cu_boulder_swe,
-    sv.aso_swe,
-    sv.cbrfc_zone_id
-   FROM swe_three sv
-     FULL JOIN ua_zonal_swe uzs ON sv.cbrfc_zone_id = uzs.cbrfc_zone_id AND sv.date = uzs.datetime
-     LEFT JOIN cbrfc_zones cz ON COALESCE(sv.cbrfc_zone_id, uzs.cbrfc_zone_id) = cz.gid;
+    max(ps.value) FILTER (WHERE ps.product = 'isnobal') AS isnobal_swe,
+    max(ps.value) FILTER (WHERE ps.product = 'snodas') AS snodas_swe,
+    max(ps.value) FILTER (WHERE ps.product = 'ua') AS ua_swe,
+    max(ps.value) FILTER (WHERE ps.product = 'cu_boulder') AS cu_boulder_swe,
+    max(ps.value) FILTER (WHERE ps.product = 'aso') AS aso_swe,
+    ps.cbrfc_zone_id
+   FROM product_swe ps
+     LEFT JOIN cbrfc_zones cz ON ps.cbrfc_zone_id = cz.gid
+  GROUP BY ps.datetime, ps.cbrfc_zone_id, cz.zone;
@@ -0,0 +1,23 @@
+-- Precomputed yearly statistics for the Dash "Yearly Statistics" panel.
+-- Populated by dash/precompute_statistics.py
+DROP TABLE IF EXISTS swe_yearly_statistics;
+CREATE TABLE swe_yearly_statistics (
+    segment VARCHAR NOT NULL,
+    zone_name VARCHAR NOT NULL,
+    water_year INT NOT NULL,
+    stat VARCHAR NOT NULL,
+    dataset_a VARCHAR NOT NULL,
+    dataset_b VARCHAR NOT NULL,
+    value FLOAT,
+    PRIMARY KEY(segment, zone_name, water_year, stat, dataset_a, dataset_b)
+);
+
+-- Hash of the source data each zone was last computed from
+DROP TABLE IF EXISTS swe_yearly_statistics_source;
+CREATE TABLE swe_yearly_statistics_source (
+    segment VARCHAR NOT NULL,
+    zone_name VARCHAR NOT NULL,
+    source_hash VARCHAR NOT NULL,
+    computed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY(segment, zone_name)
+);
@@ -3,7 +3,7 @@ import pandas as pd
 import xarray as xr
 
 from swed_17.zone_db import CBRFCZone
-from .zone_raster import ZoneRaster
+from swed_17.zonal_statistics import ZonalStatistics
 
 from .rasterize_zone import cbrfc_zone_mask_as_xr
 
@@ -17,7 +17,7 @@ def swann_data_for_zone(
     daily means.
 
     This uses the database to get the CBRFC zone mask and then applies
-    it to the files as a mask.
+    it to the files as a mask. The decoded mask is cached in the zone_db.
 
     Parameters
     ----------
@@ -33,14 +33,12 @@ def swann_data_for_zone(
     xr.DataArray
         Results as xarray DataArray.
     """
-    zone_mask = zone_db.as_rio(zone_name)
-    swann_xr = swann_files.sel(
-        ZoneRaster.bounding_box(zone_mask)
-    )
+    zone_mask = zone_db.mask(zone_name)
+    swann_xr = swann_files.sel(zone_mask.bounding_box)
 
     # Apply mask as new coordinate
     swann_xr.coords['mask'] = (
-        ('lat', 'lon'), ZoneRaster.data_as_xr(zone_mask)
+        ('lat', 'lon'), zone_mask.data_as_xr()
     )
 
     return swann_xr.where(swann_xr.mask == 1).mean(['lat', 'lon']).compute()
@@ -160,3 +158,40 @@ def swann_swe_for_zones(
             list(target_zones_dict.values())
         ), drop=True
     ).SWE.compute()
+
+
+def swann_zonal_statistics(
+    swann_files,
+    cbrfc_zone_tif,
+    cbrfc_zone_shape,
+    target_zones_dict,
+):
+    """
+    Zonal mean, count and coverage of SWANN SWE for all target zones.
+
+    Same inputs as :meth:`swann_swe_for_zones`, but reduces every zone and
+    day in one pass over the SWANN data with :class:`ZonalStatistics`.
+    """
+    target_ids = list(target_zones_dict.values())
+
+    target_cbrfc_zones = cbrfc_zone_mask_as_xr(
+        cbrfc_zone_tif, cbrfc_zone_shape
+    )
+    target_cbrfc_zones = target_cbrfc_zones.where(
+        target_cbrfc_zones.isin(target_ids),
+        drop=True
+    )
+
+    swann = xr.open_mfdataset(swann_files, parallel=True).sel(
+        target_bounding_box_padded(target_cbrfc_zones)
+    )
+    swann = swann.interp(
+        lat=target_cbrfc_zones.lat.values,
+        lon=target_cbrfc_zones.lon.values,
+        method='nearest'
+    )
+
+    return ZonalStatistics(
+        target_cbrfc_zones.zone.transpose('lat', 'lon').values,
+        zones=target_ids,
+    ).compute(swann.SWE.transpose('time', 'lat', 'lon'))
@@ -1,7 +1,13 @@
+from .connection_pool import ConnectionPool
+from .query_cache import QueryCache
+from .swe_cube import SWECube
 from .zone_compare import ZoneCompare
 from .zone_plotter import ZonePlotter
 
 __all__ = [
+    "ConnectionPool",
+    "QueryCache",
+    "SWECube",
     "ZoneCompare",
     "ZonePlotter",
 ]
@@ -0,0 +1,102 @@
+"""
+Columnar query results as Arrow tables.
+
+Requires pyarrow. Postgres queries additionally require the ADBC Postgres
+driver (adbc-driver-postgresql), which transfers results with binary COPY
+straight into Arrow memory.
+"""
+
+from collections.abc import Iterator
+
+import pandas as pd
+
+from .connection_pool import ConnectionPool
+
+# Number of rows per record batch for DB-API cursors
+BATCH_SIZE = 100_000
+
+
+def fetch_postgres(connection_info: str, query: str):
+    """
+    Run a Postgres query with the ADBC driver and return the result.
+
+    The connection is taken from the ADBC pool of the shared
+    :class:`~swed_17.connection_pool.ConnectionPool`.
+
+    Parameters
+    ----------
+    connection_info : str
+        libpq connection string or URI
+    query : str
+        SQL query with parameters already bound
+
+    Returns
+    -------
+    pyarrow.Table
+        Query result
+    """
+    with ConnectionPool.adbc_connection(connection_info) as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            return cursor.fetch_arrow_table()
+
+
+def cursor_batches(cursor, batch_size: int = BATCH_SIZE) -> Iterator:
+    """
+    Read an executed DB-API cursor as Arrow record batches.
+
+    Rows are transposed into columns per batch, so only one batch of row
+    tuples exists at a time.
+
+    Parameters
+    ----------
+    cursor
+        DB-API cursor with an executed query
+    batch_size : int
+        Number of rows per batch
+
+    Returns
+    -------
+    Iterator[pyarrow.RecordBatch]
+        Query result batches
+    """
+    import pyarrow as pa
+
+    names = [column[0] for column in cursor.description]
+
+    while rows := cursor.fetchmany(batch_size):
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(column) for column in zip(*rows)], names=names
+        )
+
+
+def fetch_cursor(cursor, batch_size: int = BATCH_SIZE):
+    """
+    Read an executed DB-API cursor into one Arrow table.
+
+    See :func:`cursor_batches`.
+
+    Returns
+    -------
+    pyarrow.Table
+        Query result
+    """
+    import pyarrow as pa
+
+    batches = [pa.Table.from_batches([batch]) for batch in cursor_batches(
+        cursor, batch_size
+    )]
+
+    if len(batches) == 0:
+        return pa.table({column[0]: [] for column in cursor.description})
+
+    # Batches with only NULL values in a column have the null type
+    return pa.concat_tables(batches, promote_options="default")
+
+
+def to_pandas(table) -> pd.DataFrame:
+    """
+    Arrow table as dataframe backed by the Arrow memory, without copying
+    the values.
+    """
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
@@ -0,0 +1,291 @@
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+from psycopg import ProgrammingError
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+from sqlalchemy import Connection, Engine, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import PoolProxiedConnection, QueuePool
+
+
+class ConnectionPool:
+    """
+    Process-wide registry of pooled SQLAlchemy engines.
+
+    Engines are created lazily on first use and are keyed by the connection
+    string and engine options. All database classes draw their connections
+    from here instead of creating a new engine or connection per query.
+
+    After a fork, e.g. when starting dask worker processes, the inherited
+    connections are discarded without closing them to not interfere with the
+    parent process. Call :meth:`reset` on the workers to do the same
+    explicitly.
+    """
+
+    POOL_OPTIONS = dict(
+        pool_size=5,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_pre_ping=True,
+    )
+
+    _engines: dict = {}
+    _adbc_pools: dict = {}
+    _stats: dict = {}
+    _lock = threading.Lock()
+    _pid = os.getpid()
+
+    @classmethod
+    def configure(cls, **pool_options) -> None:
+        """
+        Change the pool options for engines created after this call.
+
+        Parameters
+        ----------
+        pool_options : dict
+            Any of the SQLAlchemy pool arguments to :func:`create_engine`,
+            e.g. pool_size, max_overflow or pool_timeout.
+        """
+        cls.POOL_OPTIONS = {**cls.POOL_OPTIONS, **pool_options}
+
+    @classmethod
+    def engine(cls, connection_info: str, **engine_options) -> Engine:
+        """
+        Get the shared engine for the given connection string.
+
+        Parameters
+        ----------
+        connection_info : str
+            SQLAlchemy connection URL
+        engine_options : dict
+            Additional options passed to :func:`create_engine`. Engines with
+            different options are kept separately.
+
+        Returns
+        -------
+        Engine
+            Pooled SQLAlchemy engine
+        """
+        if os.getpid() != cls._pid:
+            cls._after_fork()
+
+        key = (connection_info, tuple(sorted(engine_options.items())))
+
+        with cls._lock:
+            engine = cls._engines.get(key)
+            if engine is None:
+                engine = create_engine(
+                    connection_info, **cls.POOL_OPTIONS, **engine_options
+                )
+                cls._track(engine, cls._stats_key(connection_info))
+                cls._engines[key] = engine
+
+        return engine
+
+    @classmethod
+    @contextmanager
+    def connect(cls, connection_info: str, **engine_options) -> Connection:
+        """
+        Check out a SQLAlchemy connection and return it to the pool on exit.
+
+        Parameters
+        ----------
+        connection_info : str
+            SQLAlchemy connection URL
+        engine_options : dict
+            See :meth:`engine`
+
+        Returns
+        -------
+        Connection
+            Pooled SQLAlchemy connection
+        """
+        engine = cls.engine(connection_info, **engine_options)
+
+        start = time.perf_counter()
+        with engine.connect() as connection:
+            cls._add_wait(connection_info, time.perf_counter() - start)
+            yield connection
+
+    @classmethod
+    @contextmanager
+    def raw_connection(
+        cls, connection_info: str, **engine_options
+    ) -> PoolProxiedConnection:
+        """
+        Check out a DBAPI connection and return it to the pool on exit.
+
+        The driver connection is accessible via the `driver_connection`
+        attribute.
+
+        Parameters
+        ----------
+        connection_info : str
+            SQLAlchemy connection URL
+        engine_options : dict
+            See :meth:`engine`
+
+        Returns
+        -------
+        PoolProxiedConnection
+            Pooled DBAPI connection
+        """
+        engine = cls.engine(connection_info, **engine_options)
+
+        start = time.perf_counter()
+        connection = engine.raw_connection()
+        cls._add_wait(connection_info, time.perf_counter() - start)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    @classmethod
+    @contextmanager
+    def adbc_connection(cls, connection_info: str):
+        """
+        Check out an ADBC Postgres connection and return it to the pool on
+        exit.
+
+        The connections are kept in a separate pool per connection string
+        with the same size options as the engines. Requires the ADBC Postgres
+        driver (adbc-driver-postgresql).
+
+        Parameters
+        ----------
+        connection_info : str
+            libpq connection string or URI
+
+        Returns
+        -------
+        adbc_driver_postgresql.dbapi.Connection
+            Pooled ADBC connection
+        """
+        if os.getpid() != cls._pid:
+            cls._after_fork()
+
+        with cls._lock:
+            pool = cls._adbc_pools.get(connection_info)
+            if pool is None:
+                import adbc_driver_postgresql.dbapi
+
+                pool = QueuePool(
+                    lambda: adbc_driver_postgresql.dbapi.connect(
+                        connection_info
+                    ),
+                    pool_size=cls.POOL_OPTIONS['pool_size'],
+                    max_overflow=cls.POOL_OPTIONS['max_overflow'],
+                    timeout=cls.POOL_OPTIONS['pool_timeout'],
+                )
+                cls._track(pool, cls._stats_key(connection_info))
+                cls._adbc_pools[connection_info] = pool
+
+        start = time.perf_counter()
+        connection = pool.connect()
+        cls._add_wait(connection_info, time.perf_counter() - start)
+        try:
+            yield connection.driver_connection
+        finally:
+            connection.close()
+
+    @classmethod
+    def stats(cls) -> dict:
+        """
+        Pool counters by connection string (with hidden password).
+
+        * checkouts: Total connections handed out
+        * hits: Checkouts that reused an open pooled connection
+        * misses: Checkouts that had to open a new connection
+        * wait_time: Total seconds spent waiting on a connection
+
+        Returns
+        -------
+        dict
+            Counters for each connection string
+        """
+        with cls._lock:
+            return {
+                key: {
+                    **counters,
+                    'hits': counters['checkouts'] - counters['misses'],
+                }
+                for key, counters in cls._stats.items()
+            }
+
+    @classmethod
+    def reset(cls) -> None:
+        """
+        Discard all engines inherited from a parent process.
+
+        Connections are dropped without closing them, leaving them intact for
+        the parent process. New engines are created on next use.
+        """
+        with cls._lock:
+            for engine in cls._engines.values():
+                engine.dispose(close=False)
+            cls._engines = {}
+            cls._adbc_pools = {}
+            cls._stats = {}
+            cls._pid = os.getpid()
+
+    @classmethod
+    def _after_fork(cls) -> None:
+        # The lock could have been held by another thread during the fork
+        cls._lock = threading.Lock()
+        cls.reset()
+
+    @classmethod
+    def dispose(cls) -> None:
+        """
+        Close all pooled connections of this process.
+        """
+        with cls._lock:
+            for engine in cls._engines.values():
+                engine.dispose()
+            for pool in cls._adbc_pools.values():
+                pool.dispose()
+            cls._engines = {}
+            cls._adbc_pools = {}
+
+    @classmethod
+    def _stats_key(cls, connection_info: str) -> str:
+        # libpq strings, e.g. "service=swe_db", are no valid SQLAlchemy URLs
+        try:
+            params = conninfo_to_dict(connection_info)
+        except ProgrammingError:
+            return make_url(connection_info).render_as_string(
+                hide_password=True
+            )
+
+        params.pop('password', None)
+        return make_conninfo(**params)
+
+    @classmethod
+    def _track(cls, engine: Engine | QueuePool, stats_key: str) -> None:
+        counters = cls._stats.setdefault(
+            stats_key, dict(checkouts=0, misses=0, wait_time=0.0)
+        )
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(*args):
+            with cls._lock:
+                counters['misses'] += 1
+
+        @event.listens_for(engine, "checkout")
+        def _on_checkout(*args):
+            with cls._lock:
+                counters['checkouts'] += 1
+
+    @classmethod
+    def _add_wait(cls, connection_info: str, seconds: float) -> None:
+        stats_key = cls._stats_key(connection_info)
+        with cls._lock:
+            counters = cls._stats.get(stats_key)
+            if counters is not None:
+                counters['wait_time'] += seconds
+
+
+os.register_at_fork(after_in_child=ConnectionPool._after_fork)
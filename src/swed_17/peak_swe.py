@@ -3,12 +3,23 @@ Functions to extract and plot peak snow water equivalent date (SWE) from
 pandas Dataframes
 """
 
+import numpy as np
 import pandas as pd
 import holoviews as hv
 import hvplot.pandas    # noqa
 
 from bokeh.models import DatetimeTickFormatter, HoverTool
 
+# Leap year used to compare dates across water years
+UNIFORM_YEAR = 1880
+# First month of a water year
+WATER_YEAR_START_MONTH = 10
+
+PEAK_DATE = 'peak_date'
+PEAK_SWE = 'peak_swe'
+MELT_OUT_DATE = 'melt_out_date'
+ONSET_DATE = 'onset_date'
+
 
 def peak_swe_for_zone(
         swe_data: pd.DataFrame,
@@ -52,14 +63,92 @@ def peak_swe_for_zone(
     return peaks
 
 
-def peak_swe_for_pd(
-        swe_data: pd.DataFrame, modify_date: bool = True
+def water_year(index: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Water year label for each date in the given index.
+
+    A water year starts on October 1st and is labeled with the calendar year
+    it ends in.
+
+    Parameters
+    ----------
+    index : pd.DatetimeIndex
+        Dates to label
+
+    Returns
+    -------
+    np.ndarray
+        Water year for each date
+    """
+    return (
+        index.year + (index.month >= WATER_YEAR_START_MONTH)
+    ).to_numpy(dtype=np.int64)
+
+
+def uniform_year(dates: pd.Series) -> pd.Series:
+    """
+    Change the year of all dates to 1880 while keeping month, day and time.
+
+    Missing dates are kept as NaT.
+
+    Parameters
+    ----------
+    dates : pd.Series
+        Dates to modify
+
+    Returns
+    -------
+    pd.Series
+        Dates in the year 1880
+    """
+    day_start = dates.dt.normalize()
+    uniform = pd.to_datetime({
+        'year': UNIFORM_YEAR,
+        'month': dates.dt.month,
+        'day': dates.dt.day,
+    }).dt.as_unit(dates.dt.unit)
+
+    if dates.dt.tz is not None:
+        uniform = uniform.dt.tz_localize(dates.dt.tz)
+
+    return uniform + (dates - day_start)
+
+
+def _first_row(condition: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Row position of the first True value within each block of rows.
+
+    Blocks are defined by their start row position and span to the start of
+    the next block. Blocks without any True value get -1.
+    """
+    rows = condition.shape[0]
+    row_index = np.where(
+        condition, np.arange(rows)[:, np.newaxis], rows
+    )
+    first = np.minimum.reduceat(row_index, starts, axis=0)
+
+    return np.where(first == rows, -1, first)
+
+
+def peak_swe_stats(
+        swe_data: pd.DataFrame,
+        modify_date: bool = True,
+        snow_free: float = 0.0,
 ) -> pd.DataFrame:
     """
-    Get the date of peak SWE for each zone in the Dataframe.
+    Get peak SWE date and value, melt-out date and accumulation onset for
+    each water year and zone in the Dataframe.
+
+    All zones and years are processed in one pass over the data. Each row is
+    labeled with the water year once and the values are reduced per water
+    year block.
 
     Each column is assumed to hold the SWE data and the column label being the
-    zone name
+    zone name. Peak SWE dates match :meth:`peak_swe_for_zone` and are the
+    first occurrence of the maximum within the water year. The melt-out date
+    is the first date after the peak with SWE at or below the snow free value
+    and the onset date is the first date of the water year with SWE above it.
+    Years without data or without a match are set to NaT.
 
     Parameters
     ----------
@@ -68,28 +157,118 @@ def peak_swe_for_pd(
     modify_date : bool
         Wether to create a uniform year in all dates to easier compare the dates
         (Default: True)
+    snow_free : float
+        SWE value at or below which a zone is considered snow free
+        (Default: 0.0)
 
     Returns
     -------
     pd.DataFrame
-        Peak SWE date for each year and zone
+        Statistics with a (year, zone) index
     """
+    if not swe_data.index.is_monotonic_increasing:
+        swe_data = swe_data.sort_index()
 
-    year_range = range(
+    year_range = np.arange(
         (swe_data.index.min().year + 1),
         swe_data.index.max().year
     )
 
-    peak_swe = pd.DataFrame.from_dict({
-        'year': year_range,
-    })
+    water_years = water_year(swe_data.index)
+    in_range = np.isin(water_years, year_range)
+    water_years = water_years[in_range]
+    dates = swe_data.index[in_range]
+    values = swe_data.to_numpy(dtype=np.float64)[in_range]
 
-    for zone in swe_data.columns.values:
-        peak_swe[zone] = peak_swe_for_zone(
-            swe_data, zone, year_range, modify_date
+    years, starts = np.unique(water_years, return_index=True)
+    zones = swe_data.columns
+
+    index = pd.MultiIndex.from_product(
+        [year_range, zones], names=['year', 'zone']
+    )
+    stats = pd.DataFrame(index=index)
+
+    if values.shape[0] == 0:
+        peak_row = np.full((0, len(zones)), -1)
+        peak_value = np.full((0, len(zones)), np.nan)
+        melt_out_row = onset_row = peak_row
+    else:
+        missing = np.isnan(values)
+        filled = np.where(missing, -np.inf, values)
+
+        peak_value = np.maximum.reduceat(filled, starts, axis=0)
+        block = np.repeat(
+            np.arange(len(starts)), np.diff(np.append(starts, len(values)))
+        )
+
+        peak_row = _first_row(
+            (filled == peak_value[block]) & ~missing, starts
+        )
+        melt_out_row = _first_row(
+            (values <= snow_free)
+            & (np.arange(len(values))[:, np.newaxis] > peak_row[block]),
+            starts
         )
+        onset_row = _first_row(values > snow_free, starts)
+
+        peak_value = np.where(peak_row < 0, np.nan, peak_value)
+
+    # Map water years with data onto the full year range
+    position = np.searchsorted(year_range, years)
+
+    def _to_dates(rows: np.ndarray) -> pd.Series:
+        full = np.full((len(year_range), len(zones)), -1)
+        full[position] = rows
+        full = full.ravel()
+        found = np.flatnonzero(full >= 0)
+
+        result = pd.Series(pd.NaT, index=index, dtype=dates.dtype)
+        result.iloc[found] = dates[full[found]]
+
+        if modify_date:
+            return uniform_year(result)
+
+        return result
+
+    full_value = np.full((len(year_range), len(zones)), np.nan)
+    full_value[position] = peak_value
+
+    stats[PEAK_DATE] = _to_dates(peak_row)
+    stats[PEAK_SWE] = full_value.ravel()
+    stats[MELT_OUT_DATE] = _to_dates(melt_out_row)
+    stats[ONSET_DATE] = _to_dates(onset_row)
+
+    return stats
+
+
+def peak_swe_for_pd(
+        swe_data: pd.DataFrame, modify_date: bool = True
+) -> pd.DataFrame:
+    """
+    Get the date of peak SWE for each zone in the Dataframe.
+
+    Each column is assumed to hold the SWE data and the column label being the
+    zone name. Uses :meth:`peak_swe_stats` to process all zones at once.
+
+    Parameters
+    ----------
+    swe_data : pd.DataFrame
+        Data to search through
+    modify_date : bool
+        Wether to create a uniform year in all dates to easier compare the dates
+        (Default: True)
+
+    Returns
+    -------
+    pd.DataFrame
+        Peak SWE date for each year and zone
+    """
+    peak_swe = peak_swe_stats(
+        swe_data, modify_date
+    )[PEAK_DATE].unstack('zone')
 
-    peak_swe = peak_swe.set_index('year')
+    peak_swe = peak_swe.reindex(columns=swe_data.columns)
+    peak_swe.columns.name = None
 
     return peak_swe
 
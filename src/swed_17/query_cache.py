@@ -0,0 +1,383 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+
+class QueryCache:
+    """
+    Local on-disk Parquet cache for query results.
+
+    Results are stored in one directory per query name and hashed
+    parameters. Each directory holds one or more Parquet part files and a
+    metadata file tracking the creation and last access time, the size on
+    disk and the date range of each part.
+
+    Entries older than the TTL are refreshed. When a function to fetch newer
+    rows is given, only rows after the cached most recent date minus an
+    overlap are fetched. Cached rows within the overlap are replaced, which
+    picks up rows that arrived late or were revised. Every given number of
+    refreshes, the entry is fetched in full instead. The least recently used
+    entries are evicted when the cache grows above the size limit.
+
+    Each entry has a lock file, so only one thread or process fetches an
+    entry at a time and others wait for its result. Different entries are
+    fetched concurrently.
+    """
+
+    META_FILE = "_meta.json"
+    PART_FILE = "part-{}.parquet"
+    LOCK_FILE = "{}.lock"
+
+    def __init__(
+        self,
+        cache_dir: str,
+        ttl: float = None,
+        max_bytes: int = None,
+        overlap_days: float = 0,
+        full_refresh: int = None,
+    ):
+        """
+        Parameters
+        ----------
+        cache_dir : str
+            Directory to store cached results in
+        ttl : float
+            Seconds after which an entry is refreshed. (Default: Never)
+        max_bytes : int
+            Size limit of the cache on disk. (Default: Unlimited)
+        overlap_days : float
+            Days before the cached most recent date to fetch again with a
+            refresh
+        full_refresh : int
+            Number of refreshes after which an entry is fetched in full.
+            (Default: Never)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.overlap = pd.Timedelta(days=overlap_days)
+        self.full_refresh = full_refresh
+
+        self._lock = threading.Lock()
+        self._stats = dict(warm=0, cold=0, refreshed=0, evicted=0)
+
+    @staticmethod
+    def key(name: str, params: dict) -> str:
+        """
+        Hash of the query name and parameters.
+        """
+        value = json.dumps([name, params], sort_keys=True, default=str)
+        return hashlib.sha1(value.encode()).hexdigest()
+
+    def get(
+        self,
+        name: str,
+        params: dict,
+        fetch: Callable[[], pd.DataFrame],
+        fetch_newer: Callable[[pd.Timestamp], pd.DataFrame] = None,
+        date_column: str = None,
+    ) -> pd.DataFrame:
+        """
+        Return cached result or run the query and cache the result.
+
+        Parameters
+        ----------
+        name : str
+            Query name, used as top level directory
+        params : dict
+            Query parameters
+        fetch : Callable
+            Run the query and return all rows
+        fetch_newer : Callable, optional
+            Run the query for rows after the given date. Enables incremental
+            refreshes of stale entries.
+        date_column : str, optional
+            Column with the row dates. Uses the index when not given.
+
+        Returns
+        -------
+        pd.DataFrame
+            Query result
+        """
+        entry = self.cache_dir / name / self.key(name, params)
+
+        with self._entry_lock(entry):
+            meta = self._read_meta(entry)
+
+            if meta is None or (
+                self._is_stale(meta) and not self._refresh_newer(
+                    meta, fetch_newer
+                )
+            ):
+                self._count('cold')
+                data = fetch()
+                shutil.rmtree(entry, ignore_errors=True)
+                self._write(entry, data, params, date_column)
+            elif self._is_stale(meta):
+                self._count('refreshed')
+                since = None
+                if meta['max_date'] is not None:
+                    since = pd.Timestamp(meta['max_date']) - self.overlap
+                newer = fetch_newer(since)
+                self._replace_newer(entry, meta, since, date_column)
+                self._append(entry, meta, newer, date_column)
+                meta['refreshes'] += 1
+                self._write_meta(entry, meta)
+                data = self._read(entry, meta)
+            else:
+                self._count('warm')
+                meta['accessed'] = time.time()
+                self._write_meta(entry, meta)
+                data = self._read(entry, meta)
+
+        self._evict()
+
+        return data
+
+    def invalidate(self, name: str = None, params: dict = None) -> None:
+        """
+        Remove cached entries, e.g. after new data was imported.
+
+        Parameters
+        ----------
+        name : str, optional
+            Remove entries for this query only. (Default: All)
+        params : dict, optional
+            Remove the entry for these parameters only. (Default: All)
+        """
+        if params is not None:
+            entries = [self.cache_dir / name / self.key(name, params)]
+        else:
+            entries = [
+                entry for entry, _ in self._entries()
+                if name is None or entry.parent.name == name
+            ]
+
+        for entry in entries:
+            with self._entry_lock(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def stats(self) -> dict:
+        """
+        Cache counters.
+
+        * warm: Results served from the cache
+        * cold: Results that required the full query
+        * refreshed: Results served from the cache after fetching new rows
+        * evicted: Entries removed to stay below the size limit
+        * hit_rate: Share of results served from the cache
+        * bytes: Current size on disk
+
+        Returns
+        -------
+        dict
+            Counters
+        """
+        with self._lock:
+            stats = dict(self._stats)
+
+        requests = stats['warm'] + stats['cold'] + stats['refreshed']
+        stats['hit_rate'] = (
+            (stats['warm'] + stats['refreshed']) / requests
+            if requests else 0.0
+        )
+        stats['bytes'] = sum(meta['bytes'] for _, meta in self._entries())
+
+        return stats
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._stats[counter] += 1
+
+    @contextmanager
+    def _entry_lock(self, entry: Path, blocking: bool = True):
+        """
+        Exclusive lock of an entry between threads and processes.
+
+        Yields whether the lock was acquired, which is always the case when
+        blocking.
+        """
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = entry.parent / self.LOCK_FILE.format(entry.name)
+
+        with open(lock_file, 'a') as lock:
+            flags = fcntl.LOCK_EX if blocking \
+                else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock, flags)
+            except BlockingIOError:
+                yield False
+                return
+
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _is_stale(self, meta: dict) -> bool:
+        return self.ttl is not None and \
+            time.time() - meta['created'] > self.ttl
+
+    def _refresh_newer(self, meta: dict, fetch_newer: Callable) -> bool:
+        """
+        Whether a stale entry is refreshed with only the newer rows.
+        """
+        return fetch_newer is not None and (
+            self.full_refresh is None
+            or meta['refreshes'] < self.full_refresh
+        )
+
+    @staticmethod
+    def _dates(data: pd.DataFrame, date_column: str) -> pd.Index:
+        return data.index if date_column is None \
+            else pd.Index(data[date_column])
+
+    def _write(
+        self, entry: Path, data: pd.DataFrame, params: dict, date_column: str
+    ) -> None:
+        entry.mkdir(parents=True, exist_ok=True)
+        meta = dict(
+            params=json.loads(json.dumps(params, default=str)),
+            created=time.time(),
+            refreshes=0,
+            parts=[],
+            bytes=0,
+            max_date=None,
+        )
+        self._append(entry, meta, data, date_column)
+        self._write_meta(entry, meta)
+
+    def _append(
+        self, entry: Path, meta: dict, data: pd.DataFrame, date_column: str
+    ) -> None:
+        if len(data) > 0 or len(meta['parts']) == 0:
+            self._write_part(entry, meta, data, date_column)
+
+        meta['max_date'] = max(
+            (part['max_date'] for part in meta['parts']
+             if part['max_date'] is not None),
+            key=pd.Timestamp,
+            default=None,
+        )
+        meta['created'] = time.time()
+        meta['accessed'] = meta['created']
+
+    def _write_part(
+        self, entry: Path, meta: dict, data: pd.DataFrame, date_column: str
+    ) -> None:
+        part = entry / self.PART_FILE.format(uuid.uuid4().hex)
+        temporary = part.with_suffix('.tmp')
+        data.to_parquet(temporary)
+        os.replace(temporary, part)
+
+        dates = self._dates(data, date_column)
+        part_bytes = part.stat().st_size
+        meta['parts'].append(dict(
+            file=part.name,
+            min_date=pd.Timestamp(dates.min()).isoformat()
+            if len(dates) else None,
+            max_date=pd.Timestamp(dates.max()).isoformat()
+            if len(dates) else None,
+            bytes=part_bytes,
+        ))
+        meta['bytes'] += part_bytes
+
+    def _replace_newer(
+        self,
+        entry: Path,
+        meta: dict,
+        since: pd.Timestamp | None,
+        date_column: str,
+    ) -> None:
+        """
+        Remove the cached rows after the given date, which are fetched
+        again. Parts with rows on both sides are rewritten.
+        """
+        parts = meta['parts']
+        meta['parts'] = []
+
+        for part in parts:
+            keep = part['max_date'] is None or (
+                since is not None and pd.Timestamp(part['max_date']) <= since
+            )
+            if keep:
+                meta['parts'].append(part)
+                continue
+
+            meta['bytes'] -= part['bytes']
+            if since is not None and pd.Timestamp(part['min_date']) <= since:
+                data = pd.read_parquet(entry / part['file'])
+                self._write_part(
+                    entry,
+                    meta,
+                    data[self._dates(data, date_column) <= since],
+                    date_column,
+                )
+            (entry / part['file']).unlink(missing_ok=True)
+
+    def _read(self, entry: Path, meta: dict) -> pd.DataFrame:
+        data = [
+            pd.read_parquet(entry / part['file']) for part in meta['parts']
+        ]
+
+        if len(data) == 1:
+            return data[0]
+
+        return pd.concat(data)
+
+    def _read_meta(self, entry: Path) -> dict | None:
+        try:
+            with open(entry / self.META_FILE) as meta_file:
+                meta = json.load(meta_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        # Entries of previous versions are fetched again
+        if not isinstance(meta.get('parts'), list):
+            return None
+
+        return meta
+
+    def _write_meta(self, entry: Path, meta: dict) -> None:
+        temporary = entry / (self.META_FILE + '.tmp')
+        with open(temporary, 'w') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(temporary, entry / self.META_FILE)
+
+    def _entries(self) -> list[tuple[Path, dict]]:
+        entries = []
+        for meta_file in self.cache_dir.glob(f'*/*/{self.META_FILE}'):
+            meta = self._read_meta(meta_file.parent)
+            if meta is not None:
+                entries.append((meta_file.parent, meta))
+        return entries
+
+    def _evict(self) -> None:
+        if self.max_bytes is None:
+            return
+
+        entries = sorted(self._entries(), key=lambda entry: entry[1]['accessed'])
+        total = sum(meta['bytes'] for _, meta in entries)
+
+        # Keep the most recently used entry even if it is above the limit.
+        # Entries that are in use are skipped.
+        for entry, meta in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            with self._entry_lock(entry, blocking=False) as locked:
+                if not locked or self._read_meta(entry) is None:
+                    continue
+                shutil.rmtree(entry, ignore_errors=True)
+            total -= meta['bytes']
+            self._count('evicted')
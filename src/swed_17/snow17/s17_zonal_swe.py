@@ -1,5 +1,9 @@
+import numpy as np
+import numpy.typing as npt
 import pandas as pd
 
+from pandas.api.types import union_categoricals
+
 
 class S17ZonalSWE:
     """
@@ -11,9 +15,11 @@ class S17ZonalSWE:
     INCH_TO_MM = 25.4
     SWE_COLUMN = 'SWE (in)'
     SWE_COLUMN_MM = 'SWE (mm)'
+    SEGMENT = "Segment"
+    ZONE_NAME = "Zone Name"
     COLUMN_MAPPING = [
-        "Segment",
-        "Zone Name",
+        SEGMENT,
+        ZONE_NAME,
         "Year",
         "Month",
         "Day",
@@ -21,11 +27,105 @@ class S17ZonalSWE:
     ]
 
     @classmethod
-    def as_df(cls, df: pd.DataFrame):
-        df.columns = cls.COLUMN_MAPPING
-        df = cls.create_time_index(df)
-        df = cls.swe_to_mm(df)
-        return df
+    def as_df(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Transform a query result into a dataframe with a date index, the
+        segment and zone name as categories and SWE in mm.
+
+        The columns are read by position in the order of
+        :attr:`COLUMN_MAPPING`. The given dataframe is not modified and only
+        the SWE values are copied once.
+        """
+        columns = {name: i for i, name in enumerate(cls.COLUMN_MAPPING)}
+
+        dates = cls.to_dates(
+            df.iloc[:, columns['Year']].to_numpy(),
+            df.iloc[:, columns['Month']].to_numpy(),
+            df.iloc[:, columns['Day']].to_numpy(),
+        )
+
+        swe = df.iloc[:, columns[cls.SWE_COLUMN]].to_numpy()
+        # Single copy into a float buffer that is converted in place
+        swe = np.array(
+            swe, dtype=swe.dtype if swe.dtype.kind == 'f' else np.float64
+        )
+        swe *= cls.INCH_TO_MM
+
+        return pd.DataFrame(
+            {
+                cls.SEGMENT: pd.Categorical(df.iloc[:, columns[cls.SEGMENT]]),
+                cls.ZONE_NAME: pd.Categorical(
+                    df.iloc[:, columns[cls.ZONE_NAME]]
+                ),
+                cls.SWE_COLUMN_MM: swe,
+            },
+            index=pd.DatetimeIndex(dates, name='Date'),
+            copy=False,
+        )
+
+    @classmethod
+    def concat(cls, chunks: list[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Concatenate dataframes returned by :meth:`as_df`.
+
+        The segment and zone name stay categories with the union of the
+        categories of all chunks, which would be objects otherwise.
+        """
+        dtypes = {
+            column: pd.CategoricalDtype(
+                union_categoricals(
+                    [chunk[column] for chunk in chunks]
+                ).categories
+            )
+            for column in [cls.SEGMENT, cls.ZONE_NAME]
+        }
+
+        return pd.concat([chunk.astype(dtypes) for chunk in chunks])
+
+    @classmethod
+    def meta(cls) -> pd.DataFrame:
+        """
+        Empty dataframe in the format returned by :meth:`as_df`.
+        """
+        return cls.as_df(
+            pd.DataFrame(
+                {
+                    column: pd.Series(dtype=dtype)
+                    for column, dtype in zip(
+                        cls.COLUMN_MAPPING,
+                        [object, object, int, int, int, float],
+                    )
+                }
+            )
+        )
+
+    @classmethod
+    def to_dates(
+        cls,
+        year: npt.ArrayLike,
+        month: npt.ArrayLike,
+        day: npt.ArrayLike,
+    ) -> npt.NDArray:
+        """
+        Build dates from integer year, month and day arrays.
+
+        Raises
+        ------
+        ValueError
+            When a month or day is out of range
+        """
+        year = np.asarray(year, dtype=np.int64)
+        month = np.asarray(month, dtype=np.int64)
+        day = np.asarray(day, dtype=np.int64)
+
+        months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+        dates = months.astype('datetime64[D]') + (day - 1)
+
+        if np.any((month < 1) | (month > 12) | (day < 1)) or \
+                not np.array_equal(dates.astype('datetime64[M]'), months):
+            raise ValueError("Month or day is out of range")
+
+        return dates.astype('datetime64[ns]')
 
     @classmethod
     def create_time_index(cls, df: pd.DataFrame) -> pd.DataFrame:
@@ -33,7 +133,7 @@ class S17ZonalSWE:
         Concatenate the date columns (year, month, day) and set as index on
         the dataframe.
         """
-        df['Date'] = pd.to_datetime(df[['Year', 'Month', 'Day']])
+        df['Date'] = cls.to_dates(df['Year'], df['Month'], df['Day'])
         df = df.drop(columns=['Year', 'Month', 'Day'])
         return df.set_index('Date')
 
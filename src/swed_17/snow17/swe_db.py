@@ -1,7 +1,12 @@
-from sqlalchemy import create_engine, text
+from collections.abc import Iterator
+
+from sqlalchemy import bindparam, text
 import pandas as pd
 
 from .s17_zonal_swe import S17ZonalSWE
+from .. import arrow_fetch
+from ..connection_pool import ConnectionPool
+from ..query_cache import QueryCache
 
 
 class SweDB:
@@ -12,6 +17,12 @@ class SweDB:
     # SUFFIX in the segment names indiciate the type of record
     CALIBRATED = "_C"
     FORECASTED = "_F"
+    KINDS = {
+        "calibrated": CALIBRATED,
+        "forecasted": FORECASTED,
+    }
+    # Number of rows per chunk when streaming results
+    CHUNK_SIZE = 100_000
 
     class Query:
         ZONE_QUERY = (
@@ -19,40 +30,111 @@ class SweDB:
             "FROM states_snow17 "
             "WHERE segid = :segid"
         )
+        ZONES_QUERY = (
+            "SELECT segid, opid, cal_yr, mon, zday, swe "
+            "FROM states_snow17 "
+            "WHERE segid IN :segids"
+        )
 
-    def __init__(self, connection_info: str) -> None:
+    def __init__(
+        self, connection_info: str, cache: QueryCache = None
+    ) -> None:
+        """
+        Parameters
+        ----------
+        connection_info : str
+            SQLAlchemy connection URL
+        cache : QueryCache, optional
+            Cache zone queries on disk
+        """
         self._connection_info = connection_info
+        self._cache = cache
 
     def query(
-        self, query: str, dataframe=True, **kwargs
+        self, query: str, dataframe=True, arrow=False, **kwargs
     ) -> list | pd.DataFrame:
         """
         Execute a query for initialized connection string
 
+        The connection is taken from the shared :class:`ConnectionPool`.
+
         Parameters
         ----------
         query : str
-            SQL query with optional parameters given via the kwargs
+            SQL query with optional parameters given via the kwargs. List
+            parameters are expanded for use with `IN`.
         dataframe: bool
             Return results as pandas dataframe (Default: True)
+        arrow: bool
+            Read the results in columnar batches into Arrow memory. Returns
+            a pyarrow Table or, with `dataframe`, a dataframe backed by the
+            Arrow memory. The DB2 driver still returns row tuples, so this
+            is not faster per row than the dataframe path and only limits
+            the tuples held in memory to one batch. (Default: False)
 
         Returns
         -------
-        list or DataFrame
+        list, DataFrame or pyarrow.Table
             Query result
         """
-        engine = create_engine(self._connection_info)
-        with engine.connect() as connection:
-            if dataframe:
+        statement = self._statement(query, kwargs)
+
+        with ConnectionPool.connect(self._connection_info) as connection:
+            if arrow:
+                cursor = connection.execute(statement, kwargs).cursor
+                result = arrow_fetch.fetch_cursor(cursor, self.CHUNK_SIZE)
+                if dataframe:
+                    result = arrow_fetch.to_pandas(result)
+            elif dataframe:
                 result = pd.read_sql_query(
-                    text(query), engine, params=kwargs
+                    statement, connection, params=kwargs
                 )
             else:
-                cursor = connection.execute(text(query), kwargs)
+                cursor = connection.execute(statement, kwargs)
                 result = cursor.fetchall()
 
         return result
 
+    def iter_query(
+        self, query: str, chunksize: int = CHUNK_SIZE, **kwargs
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Execute a query and stream the result in chunks
+
+        Uses a server-side cursor, holding at most one chunk of rows in
+        memory at a time. The connection is returned to the pool once the
+        generator is exhausted or closed.
+
+        Parameters
+        ----------
+        query : str
+            SQL query with optional parameters given via the kwargs
+        chunksize: int
+            Number of rows per chunk
+
+        Returns
+        -------
+        Iterator[pd.DataFrame]
+            Query result chunks
+        """
+        statement = self._statement(query, kwargs)
+
+        with ConnectionPool.connect(self._connection_info) as connection:
+            connection = connection.execution_options(
+                stream_results=True, max_row_buffer=chunksize
+            )
+            yield from pd.read_sql_query(
+                statement, connection, params=kwargs, chunksize=chunksize
+            )
+
+    @staticmethod
+    def _statement(query: str, kwargs: dict):
+        return text(query).bindparams(*[
+            bindparam(name, expanding=True)
+            for name, value in kwargs.items()
+            if isinstance(value, (list, tuple))
+        ])
+
     def for_zone_calibrated(
         self, segid: str, opid: str = None, from_year: int = None
     ) -> pd.DataFrame:
@@ -109,6 +191,8 @@ class SweDB:
         """
         Get SWE zone data
 
+        Results are kept in the cache when one was given to this instance.
+
         Parameters
         ----------
         segid : str
@@ -123,7 +207,25 @@ class SweDB:
         pd.DataFrame
             Zone data for all available years.
         """
+        if self._cache is None:
+            return self._query_zone(segid, opid, from_year)
+
+        def fetch_newer(since: pd.Timestamp) -> pd.DataFrame:
+            if since is None:
+                return self._query_zone(segid, opid, from_year)
+            data = self._query_zone(segid, opid, since.year)
+            return data[data.index > since]
 
+        return self._cache.get(
+            'states_snow17',
+            dict(segid=segid, opid=opid, from_year=from_year),
+            lambda: self._query_zone(segid, opid, from_year),
+            fetch_newer,
+        )
+
+    def _query_zone(
+        self, segid: str, opid: str, from_year: int
+    ) -> pd.DataFrame:
         query = self.Query.ZONE_QUERY
         query_args = {'segid': segid}
 
@@ -140,3 +242,171 @@ class SweDB:
         )
 
         return data
+
+    def for_zones(
+        self,
+        segids: list[str],
+        opids: list[str] = None,
+        from_year: int = None,
+        kind: str = "forecasted",
+        as_dict: bool = False,
+    ) -> pd.DataFrame | dict:
+        """
+        Get SWE zone data for multiple segments with one query
+
+        Parameters
+        ----------
+        segids : list[str]
+            Snow-17 model segment names
+        opids : list[str]
+            CBRFC zone names (Optional)
+        from_year : int
+            First year to start returning data for up to present
+        kind : str
+            Type of records, either 'forecasted' or 'calibrated'
+            (Default: 'forecasted')
+        as_dict : bool
+            Return a dictionary with one dataframe per zone name instead
+            (Default: False)
+
+        Returns
+        -------
+        pd.DataFrame or dict
+            Zone data for all available years indexed by segment, zone name
+            and date. Or one dataframe for each zone name in the same format
+            as :meth:`for_zone`.
+        """
+        query, query_args = self._zones_query(segids, opids, from_year, kind)
+
+        data = S17ZonalSWE.as_df(
+            self.query(query, **query_args)
+        )
+
+        if as_dict:
+            return dict(iter(
+                data.groupby(S17ZonalSWE.ZONE_NAME, observed=True)
+            ))
+
+        return data.set_index(
+            [S17ZonalSWE.SEGMENT, S17ZonalSWE.ZONE_NAME], append=True
+        ).reorder_levels(
+            [S17ZonalSWE.SEGMENT, S17ZonalSWE.ZONE_NAME, 'Date']
+        ).sort_index()
+
+    def iter_zone_chunks(
+        self,
+        segids: list[str],
+        opids: list[str] = None,
+        from_year: int = None,
+        kind: str = "forecasted",
+        chunksize: int = CHUNK_SIZE,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Stream SWE zone data for multiple segments in chunks
+
+        Each chunk is transformed on its own into the same format as
+        :meth:`for_zone`, keeping memory bounded by the chunk size.
+
+        Parameters
+        ----------
+        segids : list[str]
+            Snow-17 model segment names
+        opids : list[str]
+            CBRFC zone names (Optional)
+        from_year : int
+            First year to start returning data for up to present
+        kind : str
+            Type of records, either 'forecasted' or 'calibrated'
+            (Default: 'forecasted')
+        chunksize : int
+            Number of rows per chunk
+
+        Returns
+        -------
+        Iterator[pd.DataFrame]
+            Zone data chunks
+        """
+        query, query_args = self._zones_query(segids, opids, from_year, kind)
+
+        for chunk in self.iter_query(query, chunksize, **query_args):
+            yield S17ZonalSWE.as_df(chunk)
+
+    def to_dask(
+        self,
+        segids: list[str],
+        opids: list[str] = None,
+        from_year: int = None,
+        kind: str = "forecasted",
+    ):
+        """
+        Create a dask dataframe with one partition per segment
+
+        Partitions are loaded lazily with :meth:`iter_zone_chunks` on the
+        workers. The segment and zone name are categories with unknown
+        categories, as each partition has its own.
+
+        Parameters
+        ----------
+        segids : list[str]
+            Snow-17 model segment names
+        opids : list[str]
+            CBRFC zone names (Optional)
+        from_year : int
+            First year to start returning data for up to present
+        kind : str
+            Type of records, either 'forecasted' or 'calibrated'
+            (Default: 'forecasted')
+
+        Returns
+        -------
+        dask.dataframe.DataFrame
+            Zone data for all segments
+        """
+        import dask.dataframe as dd
+        from dask.dataframe.utils import clear_known_categories
+
+        return dd.from_map(
+            self._segment_partition,
+            segids,
+            opids=opids,
+            from_year=from_year,
+            kind=kind,
+            meta=clear_known_categories(S17ZonalSWE.meta()),
+        )
+
+    def _segment_partition(
+        self, segid: str, opids: list[str], from_year: int, kind: str
+    ) -> pd.DataFrame:
+        chunks = list(self.iter_zone_chunks([segid], opids, from_year, kind))
+
+        if len(chunks) == 0:
+            return S17ZonalSWE.meta()
+
+        return S17ZonalSWE.concat(chunks)
+
+    def _zones_query(
+        self,
+        segids: list[str],
+        opids: list[str],
+        from_year: int,
+        kind: str,
+    ) -> tuple[str, dict]:
+        if kind not in self.KINDS:
+            raise ValueError(
+                f"Unknown kind: {kind}, expected one of {list(self.KINDS)}"
+            )
+
+        query = self.Query.ZONES_QUERY
+        query_args = {
+            'segids': [segid + self.KINDS[kind] for segid in segids]
+        }
+
+        if opids is not None:
+            query = query + " AND opid IN :opids"
+            query_args['opids'] = list(opids)
+
+        if from_year is not None:
+            query = query + " AND cal_yr >= :cal_yr"
+            query_args["cal_yr"] = from_year
+
+        return query, query_args
@@ -0,0 +1,408 @@
+import json
+import os
+import uuid
+
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+from .zone_db.binary_copy import read_binary_copy
+
+
+class SWECube:
+    """
+    Local store of the daily zonal SWE of all products as one float32 array
+    with the dimensions (product, zone, day).
+
+    The array is a raw file read with :class:`numpy.memmap`, so the full
+    history of a zone is a view into the file without reading or copying
+    other zones. Zones map to rows with the zone id index, and dates map to
+    the day offset from the first date. Days without a value are NaN.
+
+    The index names the current array file. Days after the last day of the
+    cube are appended in place, as readers do not read past it. Updates of
+    existing days and growing the day dimension write a new array file and
+    only then replace the index, so readers keep a consistent mapping until
+    they reload.
+
+    Example
+    -------
+    >>> cube = SWECube.export("cache/swe_cube", SWE_DB, "2020-10-01")
+    >>> cube.zone(1234, "snodas_swe")
+    >>> cube.append(SWE_DB)
+    """
+
+    DATA_FILE = "swe.{}.f32"
+    INDEX_FILE = "index.json"
+    DTYPE = np.float32
+    # Days of room added to the day dimension when it is full
+    GROW_DAYS = 366
+    # Product columns of the zonal_swe view
+    PRODUCTS = [
+        "isnobal_swe", "snodas_swe", "ua_swe", "cu_boulder_swe", "aso_swe",
+    ]
+    # Fetched with binary COPY, which requires values for all columns
+    QUERY = """
+SELECT date, cbrfc_zone_id, {products}
+ FROM public.zonal_swe
+ WHERE date >= to_date(%(start)s, 'YYYY-MM-DD')
+"""
+
+    def __init__(self, path: str):
+        """
+        Parameters
+        ----------
+        path : str
+            Directory of an exported cube, see :meth:`export`
+        """
+        self.path = Path(path)
+        self._index_mtime = None
+        self.reload()
+
+    @property
+    def products(self) -> list[str]:
+        return self._index["products"]
+
+    @property
+    def zone_ids(self) -> npt.NDArray:
+        """
+        Zone ids in row order, sorted ascending.
+        """
+        return self._zone_ids
+
+    @property
+    def start(self) -> pd.Timestamp:
+        return pd.Timestamp(self._index["start"], tz="UTC")
+
+    @property
+    def days(self) -> int:
+        return self._index["days"]
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        return pd.date_range(self.start, periods=self.days, freq="D")
+
+    def reload(self) -> bool:
+        """
+        Read the index and map the array again when the cube changed since
+        the last read.
+
+        Returns
+        -------
+        bool
+            Whether the cube changed
+        """
+        mtime = (self.path / self.INDEX_FILE).stat().st_mtime_ns
+        if mtime == self._index_mtime:
+            return False
+
+        with open(self.path / self.INDEX_FILE) as index_file:
+            index = json.load(index_file)
+
+        try:
+            values = np.memmap(
+                self.path / index["data_file"],
+                dtype=self.DTYPE,
+                mode="r",
+                shape=(
+                    len(index["products"]),
+                    len(index["zone_ids"]),
+                    index["capacity"],
+                ),
+            )
+        except FileNotFoundError:
+            # Replaced by an update after reading the index
+            return self.reload()
+
+        self._index = index
+        self._index_mtime = mtime
+        self._zone_ids = np.array(index["zone_ids"], dtype=np.int64)
+        self.values = values
+
+        return True
+
+    def offset(self, date) -> int:
+        """
+        Day offset of a date.
+        """
+        date = pd.Timestamp(date)
+        if date.tzinfo is None:
+            date = date.tz_localize("UTC")
+
+        return (date.normalize() - self.start).days
+
+    def row(self, zone_id: int) -> int:
+        """
+        Row of a zone id.
+
+        Raises
+        ------
+        KeyError
+            When the zone is not in the cube
+        """
+        row = np.searchsorted(self._zone_ids, zone_id)
+        if row == len(self._zone_ids) or self._zone_ids[row] != zone_id:
+            raise KeyError(f"Zone {zone_id} is not in the SWE cube")
+
+        return int(row)
+
+    def zone(
+        self, zone_id: int, product: str = None, start_date=None
+    ) -> npt.NDArray:
+        """
+        SWE of one zone as a view into the cube file.
+
+        Parameters
+        ----------
+        zone_id : int
+            CBRFC zone id
+        product : str, optional
+            Product to get. (Default: All products)
+        start_date : optional
+            First date. (Default: First date of the cube)
+
+        Returns
+        -------
+        npt.NDArray
+            SWE per day with the shape (day,) for one product or
+            (product, day) for all products
+        """
+        start = 0 if start_date is None else max(self.offset(start_date), 0)
+        days = slice(start, self.days)
+        row = self.row(zone_id)
+
+        if product is None:
+            return self.values[:, row, days]
+
+        return self.values[self.products.index(product), row, days]
+
+    def frame(self, zone_ids: list, start_date=None) -> pd.DataFrame:
+        """
+        SWE of multiple zones in the layout of the zonal_swe view.
+
+        Parameters
+        ----------
+        zone_ids : list
+            CBRFC zone ids, zones that are not in the cube are skipped
+        start_date : optional
+            First date. (Default: First date of the cube)
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per zone and day with a value for any product, with the
+            columns date, cbrfc_zone_id and the products
+        """
+        zone_ids = np.asarray(zone_ids, dtype=np.int64)
+        rows = np.searchsorted(self._zone_ids, zone_ids)
+        found = rows < len(self._zone_ids)
+        found[found] = self._zone_ids[rows[found]] == zone_ids[found]
+        zone_ids, rows = zone_ids[found], rows[found]
+
+        start = 0 if start_date is None else max(self.offset(start_date), 0)
+        # (product, zone, day)
+        values = self.values[:, rows, start:self.days]
+        dates = self.dates[start:]
+
+        frame = pd.DataFrame({
+            "date": pd.DatetimeIndex(
+                np.tile(dates.tz_convert(None).values, len(zone_ids))
+            ).tz_localize("UTC").as_unit("ns"),
+            "cbrfc_zone_id": np.repeat(zone_ids, len(dates)),
+            **{
+                product: values[index].ravel()
+                for index, product in enumerate(self.products)
+            },
+        })
+
+        return frame[
+            frame[self.products].notna().any(axis=1)
+        ].reset_index(drop=True)
+
+    @classmethod
+    def export(
+        cls, path: str, db, start_date: str, products: list = None
+    ) -> "SWECube":
+        """
+        Create a new cube with all zones of the zonal_swe view.
+
+        Parameters
+        ----------
+        path : str
+            Directory to store the cube in, an existing cube is replaced
+        db : Base
+            Database with the zonal_swe view
+        start_date : str
+            First date in the format YYYY-MM-DD
+        products : list, optional
+            Product columns of the zonal_swe view. (Default: :data:`PRODUCTS`)
+
+        Returns
+        -------
+        SWECube
+            The new cube
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        products = products or cls.PRODUCTS
+
+        rows = cls._fetch(db, products, start_date)
+        zone_ids = np.unique(rows["cbrfc_zone_id"])
+        start = pd.Timestamp(start_date, tz="UTC")
+        offsets = cls._offsets(rows["date"], start)
+        days = int(offsets.max()) + 1 if len(offsets) > 0 else 0
+
+        index = dict(
+            products=products,
+            zone_ids=zone_ids.tolist(),
+            start=start.strftime("%Y-%m-%d"),
+            days=days,
+            capacity=days + cls.GROW_DAYS,
+        )
+
+        values = cls._create_data(path, index)
+        values[:] = np.nan
+        cls._scatter(values, rows, products, zone_ids, offsets)
+        values.flush()
+        del values
+
+        cls._write_index(path, index)
+
+        return cls(path)
+
+    def append(self, db, overlap: int = 0) -> int:
+        """
+        Add the days after the last day of the cube.
+
+        Only zones that are in the cube are updated. Use :meth:`export` to
+        add new zones.
+
+        Parameters
+        ----------
+        db : Base
+            Database with the zonal_swe view
+        overlap : int
+            Number of last days to fetch again, for products that add values
+            to days after they were first written
+
+        Returns
+        -------
+        int
+            Number of added days
+        """
+        self.reload()
+
+        first = max(self.days - overlap, 0)
+        rows = self._fetch(
+            db,
+            self.products,
+            (self.start + pd.Timedelta(days=first)).strftime("%Y-%m-%d"),
+        )
+        offsets = self._offsets(rows["date"], self.start)
+        days = max(int(offsets.max()) + 1 if len(offsets) > 0 else 0, self.days)
+
+        index = dict(self._index, days=days)
+
+        if first >= self.days and days <= self._index["capacity"]:
+            # Only days readers do not read yet
+            values = np.memmap(
+                self.path / self._index["data_file"],
+                dtype=self.DTYPE,
+                mode="r+",
+                shape=self._shape(self._index["capacity"]),
+            )
+        else:
+            index["capacity"] = max(
+                self._index["capacity"], days + self.GROW_DAYS
+            )
+            values = self._create_data(self.path, index)
+            values[:, :, :first] = self.values[:, :, :first]
+
+        values[:, :, first:] = np.nan
+        self._scatter(values, rows, self.products, self._zone_ids, offsets)
+        values.flush()
+        del values
+
+        self._write_index(self.path, index)
+        added = days - self.days
+        self.reload()
+
+        return added
+
+    def _shape(self, capacity: int) -> tuple:
+        return len(self.products), len(self._zone_ids), capacity
+
+    @classmethod
+    def _fetch(cls, db, products: list, start_date: str) -> dict:
+        query = cls.QUERY.format(products=", ".join(
+            f"COALESCE({product}, 'NaN')" for product in products
+        ))
+        columns = dict(
+            date="timestamptz",
+            cbrfc_zone_id="int4",
+            **{product: "float8" for product in products},
+        )
+
+        return read_binary_copy(
+            db.copy_out(query, dict(start=start_date)), columns
+        )
+
+    @staticmethod
+    def _offsets(dates: npt.NDArray, start: pd.Timestamp) -> npt.NDArray:
+        start = np.datetime64(start.tz_convert(None), "D")
+        return (dates.astype("datetime64[D]") - start).astype(np.int64)
+
+    @staticmethod
+    def _scatter(
+        values: npt.NDArray,
+        rows: dict,
+        products: list,
+        zone_ids: npt.NDArray,
+        offsets: npt.NDArray,
+    ) -> None:
+        zone_rows = np.searchsorted(zone_ids, rows["cbrfc_zone_id"])
+        found = zone_rows < len(zone_ids)
+        found[found] = zone_ids[zone_rows[found]] == \
+            rows["cbrfc_zone_id"][found]
+        found &= offsets >= 0
+
+        for index, product in enumerate(products):
+            values[index, zone_rows[found], offsets[found]] = \
+                rows[product][found]
+
+    @classmethod
+    def _create_data(cls, path: Path, index: dict) -> np.memmap:
+        """
+        Create a new array file and name it in the index.
+        """
+        index["data_file"] = cls.DATA_FILE.format(uuid.uuid4().hex)
+
+        return np.memmap(
+            path / index["data_file"],
+            dtype=cls.DTYPE,
+            mode="w+",
+            shape=(
+                len(index["products"]),
+                len(index["zone_ids"]),
+                index["capacity"],
+            ),
+        )
+
+    @classmethod
+    def _write_index(cls, path: Path, index: dict) -> None:
+        """
+        Replace the index and remove array files it no longer names.
+
+        Readers that mapped a removed file keep reading it until they
+        reload.
+        """
+        temporary = path / (cls.INDEX_FILE + ".tmp")
+        with open(temporary, "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(temporary, path / cls.INDEX_FILE)
+
+        for data_file in path.glob(cls.DATA_FILE.format("*")):
+            if data_file.name != index["data_file"]:
+                data_file.unlink(missing_ok=True)
@@ -0,0 +1,423 @@
+"""
+Ingest gridded SWE product files into time chunked, compressed zarr stores.
+
+Each store holds the product SWE as `SWE` variable and optionally the CBRFC
+zone raster as `cbrfc_zone_gid` on the same grid. The zone raster is resampled
+to the product grid with the nearest pixel once at ingest. Runs are incremental and
+only append dates that are not in the store yet.
+
+Requires zarr 3.
+
+Usage:
+    python -m swed_17.zarr_ingest PRODUCT SOURCE_DIR STORE \
+        [--zone-raster FILE --zone-variable NAME]
+"""
+
+import argparse
+import re
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import rasterio
+import xarray as xr
+
+from zarr.codecs import BloscCodec, BloscShuffle
+
+from .zonal_statistics import ZonalStatistics
+
+SWE = "SWE"
+ZONE_RASTER = "cbrfc_zone_gid"
+TIME = "time"
+
+
+@dataclass(frozen=True)
+class ProductSource:
+    """
+    Description of the source files for a product.
+    """
+    # Glob pattern of the source files, relative to the source directory
+    pattern: str
+    # Name of the SWE variable in the source files
+    variable: str = SWE
+    # Regular expression with the file date (YYYYMMDD) as first group.
+    # Files without time dimension require this.
+    date_pattern: str = None
+    # Regular expression with the water year (YYYY) as first group, for
+    # files with a time dimension that hold one water year
+    water_year_pattern: str = None
+    # Spatial dimension names (y, x)
+    dims: tuple = ("lat", "lon")
+    # Zarr chunks along the (time, y, x) dimensions
+    chunks: tuple = (30, 512, 512)
+    # Extra attributes for the SWE variable
+    attrs: dict = field(default_factory=dict)
+
+
+PRODUCTS = {
+    "swann": ProductSource(
+        "*_SWE_Depth_WY*.nc", water_year_pattern=r"_WY(\d{4})",
+    ),
+    "ua": ProductSource(
+        "UA_SWE_Depth_800m_v1_*.nc", date_pattern=r"_(\d{8})",
+    ),
+    "snodas": ProductSource(
+        "SWE_*.nc", variable="Band1", date_pattern=r"SWE_(\d{8})",
+        attrs={"units": "mm"},
+    ),
+    "cu_boulder": ProductSource(
+        "*.tif", date_pattern=r"(\d{8})", attrs={"units": "meters"},
+    ),
+    "isnobal": ProductSource(
+        "wy*/*/run*/snow.nc", variable="specific_mass",
+        date_pattern=r"run(\d{8})", dims=("y", "x"),
+    ),
+}
+
+
+class ZarrIngest:
+    """
+    Incremental ingestion of a product into a zarr store.
+
+    The store can be used directly with :class:`ZonalStatistics`, using the
+    `cbrfc_zone_gid` raster as zones and reading the SWE one time chunk at a
+    time.
+    """
+
+    COMPRESSOR = BloscCodec(
+        cname="zlib", clevel=4, shuffle=BloscShuffle.bitshuffle
+    )
+
+    def __init__(
+        self,
+        product: ProductSource,
+        store: str,
+        zone_raster: xr.DataArray = None,
+    ):
+        """
+        Parameters
+        ----------
+        product : ProductSource
+            Product to ingest
+        store : str
+            Path to the zarr store
+        zone_raster : xr.DataArray, optional
+            CBRFC zone raster in the product CRS, with the product spatial
+            dimensions. It is resampled to the product grid with the first
+            written data, see :meth:`align_zone_raster`.
+
+        Raises
+        ------
+        ValueError
+            When the zone raster does not have the product dimensions
+        """
+        self.product = product
+        self.store = Path(store)
+        self.zone_raster = zone_raster
+        self._zones_aligned = False
+
+        if zone_raster is not None:
+            if set(zone_raster.dims) != set(product.dims):
+                raise ValueError(
+                    f"Zone raster dimensions {zone_raster.dims} do not match "
+                    f"the product dimensions {product.dims}"
+                )
+            self.zone_raster = zone_raster.transpose(*product.dims)
+
+    def ingested_dates(self) -> pd.DatetimeIndex:
+        """
+        Dates already in the store.
+        """
+        if not self.store.exists():
+            return pd.DatetimeIndex([])
+
+        with xr.open_zarr(self.store) as archive:
+            return pd.DatetimeIndex(archive[TIME].values)
+
+    def file_date(self, file: Path) -> pd.Timestamp | None:
+        """
+        Date of a source file from the file path.
+        """
+        if self.product.date_pattern is None:
+            return None
+
+        match = re.search(self.product.date_pattern, file.as_posix())
+        if match is None:
+            return None
+
+        return pd.to_datetime(match.group(1), format="%Y%m%d")
+
+    def file_end_date(self, file: Path) -> pd.Timestamp | None:
+        """
+        Last date in a source file from the file path, which is the file
+        date or the end of the water year.
+        """
+        if self.product.water_year_pattern is None:
+            return self.file_date(file)
+
+        match = re.search(self.product.water_year_pattern, file.as_posix())
+        if match is None:
+            return None
+
+        return pd.Timestamp(int(match.group(1)), 9, 30)
+
+    def open_file(
+        self, file: Path, after: pd.Timestamp = None
+    ) -> xr.DataArray:
+        """
+        Read SWE from a source file.
+
+        Parameters
+        ----------
+        file : Path
+            Source file
+        after : pd.Timestamp, optional
+            Only read dates after this date. (Default: All)
+        """
+        if file.suffix == ".tif":
+            data = self._open_tif(file)
+        else:
+            with xr.open_dataset(file) as source:
+                data = source[self.product.variable]
+                # Select the dates before reading the values
+                if after is not None and TIME in data.dims:
+                    data = data.sel({TIME: data[TIME] > after})
+                data = data.load()
+
+        data.name = SWE
+        data.attrs.update(self.product.attrs)
+
+        if TIME not in data.dims:
+            data = data.expand_dims({TIME: [self.file_date(file)]})
+
+        return data.transpose(TIME, *self.product.dims)
+
+    def _open_tif(self, file: Path) -> xr.DataArray:
+        with rasterio.open(file) as source:
+            values = source.read(1, masked=True).filled(np.nan)
+            transform = source.transform
+
+        y_dim, x_dim = self.product.dims
+        rows, columns = values.shape
+
+        return xr.DataArray(
+            values,
+            dims=self.product.dims,
+            coords={
+                y_dim: transform.f + (np.arange(rows) + 0.5) * transform.e,
+                x_dim: transform.c + (np.arange(columns) + 0.5) * transform.a,
+            },
+        )
+
+    def run(self, source_dir: str, max_days: int = None) -> int:
+        """
+        Append all dates from the source directory that are not in the
+        store yet, in chronological order.
+
+        Data is read and written one zarr time chunk at a time.
+
+        Parameters
+        ----------
+        source_dir : str
+            Directory with the source files
+        max_days : int, optional
+            Stop after appending this many days. (Default: All)
+
+        Returns
+        -------
+        int
+            Number of appended days
+        """
+        ingested = self.ingested_dates()
+        last_date = ingested.max() if len(ingested) else None
+
+        files = sorted(Path(source_dir).glob(self.product.pattern))
+        files = [
+            file for file in files
+            if last_date is None or self.file_end_date(file) is None
+            or self.file_end_date(file) > last_date
+        ]
+        files.sort(
+            key=lambda file: self.file_end_date(file) or pd.Timestamp.min
+        )
+
+        appended = 0
+        batch = []
+        time_chunk = self.product.chunks[0]
+
+        for file in files:
+            data = self.open_file(file, last_date)
+            if last_date is not None:
+                data = data.sel({TIME: data[TIME] > last_date})
+
+            if max_days is not None:
+                data = data.isel({TIME: slice(0, max_days - appended)})
+            if data.sizes[TIME] == 0:
+                continue
+
+            batch.append(data)
+            appended += data.sizes[TIME]
+            last_date = pd.Timestamp(data[TIME].values.max())
+
+            if sum(part.sizes[TIME] for part in batch) >= time_chunk:
+                self._write(batch)
+                batch = []
+
+            if max_days is not None and appended >= max_days:
+                break
+
+        if batch:
+            self._write(batch)
+
+        return appended
+
+    def _write(self, batch: list[xr.DataArray]) -> None:
+        data = xr.concat(batch, dim=TIME)
+
+        if self.zone_raster is not None:
+            if not self._zones_aligned:
+                self.zone_raster = self.align_zone_raster(data)
+                self._zones_aligned = True
+            self.check_grid(data)
+            zones = self.zone_raster.rename(ZONE_RASTER)
+            data = data.assign_coords(
+                {dim: zones[dim] for dim in self.product.dims}
+            )
+
+        dataset = data.to_dataset()
+
+        if self.store.exists():
+            dataset.to_zarr(self.store, append_dim=TIME, consolidated=True)
+            return
+
+        encoding = {
+            SWE: {
+                "chunks": self._chunks(data.shape[1:]),
+                "compressors": self.COMPRESSOR,
+            },
+        }
+
+        if self.zone_raster is not None:
+            dataset[ZONE_RASTER] = zones
+            encoding[ZONE_RASTER] = {"compressors": self.COMPRESSOR}
+        dataset.to_zarr(
+            self.store,
+            mode="w",
+            encoding=encoding,
+            zarr_format=3,
+            consolidated=True,
+        )
+
+    def align_zone_raster(self, data: xr.DataArray) -> xr.DataArray:
+        """
+        Zone raster resampled to the grid of the product data.
+
+        Each product pixel gets the zone of the nearest zone raster pixel
+        within half a zone raster pixel. Pixels outside the zone raster get
+        no zone (:attr:`ZonalStatistics.NO_ZONE`).
+        """
+        zones = self.zone_raster
+
+        for dim in self.product.dims:
+            spacing = np.abs(np.diff(zones[dim].values[:2])).max(initial=0)
+            zones = zones.reindex(
+                {dim: data[dim].values},
+                method="nearest",
+                tolerance=0.5 * spacing,
+                fill_value=ZonalStatistics.NO_ZONE,
+            )
+
+        return zones
+
+    def check_grid(self, data: xr.DataArray) -> None:
+        """
+        Check that the resampled zone raster is on the grid of the product
+        data.
+
+        Coordinates have to match within 1% of a pixel. When both have a
+        CRS (spatial_ref or crs coordinate), it has to be the same.
+
+        Raises
+        ------
+        ValueError
+            When the grids differ
+        """
+        for dim in self.product.dims:
+            coords = data[dim].values
+            zone_coords = self.zone_raster[dim].values
+            tolerance = 0.01 * np.abs(np.diff(coords[:2])).max(initial=0)
+
+            if coords.shape != zone_coords.shape or not np.allclose(
+                coords, zone_coords, rtol=0, atol=tolerance
+            ):
+                raise ValueError(
+                    f"Zone raster {dim} coordinates do not match the product "
+                    "grid"
+                )
+
+        crs, zone_crs = grid_crs(data), grid_crs(self.zone_raster)
+        if crs is not None and zone_crs is not None and crs != zone_crs:
+            raise ValueError(
+                "Zone raster CRS differs from the product CRS, reproject "
+                "the zone raster to the product CRS first"
+            )
+
+    def _chunks(self, grid_shape: tuple) -> tuple:
+        time_chunk, *grid_chunks = self.product.chunks
+        return (time_chunk, *[
+            min(chunk, size) for chunk, size in zip(grid_chunks, grid_shape)
+        ])
+
+
+def grid_crs(data: xr.DataArray) -> str | None:
+    """
+    CRS as WKT from the spatial_ref or crs coordinate, if any.
+    """
+    for name in ("spatial_ref", "crs"):
+        if name in data.coords:
+            attrs = data[name].attrs
+            return attrs.get("crs_wkt", attrs.get("spatial_ref"))
+
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Append new product dates to a zarr store"
+    )
+    parser.add_argument("product", choices=PRODUCTS.keys())
+    parser.add_argument("source_dir", help="Directory with source files")
+    parser.add_argument("store", help="Path to the zarr store")
+    parser.add_argument(
+        "--zone-raster",
+        help="NetCDF file with the CBRFC zone raster in the product CRS",
+    )
+    parser.add_argument(
+        "--zone-variable",
+        help="Name of the zone raster variable, e.g. cbrfc_zone",
+    )
+    parser.add_argument(
+        "--max-days", type=int, help="Number of days to append at most"
+    )
+    arguments = parser.parse_args()
+
+    if (arguments.zone_raster is None) != (arguments.zone_variable is None):
+        parser.error("--zone-raster requires --zone-variable and vice versa")
+
+    zone_raster = None
+    if arguments.zone_raster is not None:
+        with xr.open_dataset(arguments.zone_raster) as zone_file:
+            zone_raster = zone_file[arguments.zone_variable].load()
+
+    ingest = ZarrIngest(
+        PRODUCTS[arguments.product], arguments.store, zone_raster
+    )
+    appended = ingest.run(arguments.source_dir, arguments.max_days)
+
+    print(f"Appended {appended} days to {arguments.store}")
+
+
+if __name__ == "__main__":
+    main()
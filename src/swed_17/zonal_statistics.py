@@ -0,0 +1,154 @@
+import numpy as np
+import numpy.typing as npt
+import xarray as xr
+
+
+class ZonalStatistics:
+    """
+    Per zone mean, count and coverage of gridded data for all zones at once.
+
+    The zone raster labels each grid cell with a zone ID. The labels are
+    flattened once and each time step is reduced for all zones with a single
+    bincount, instead of masking and averaging the grid once per zone.
+    """
+
+    # Matches the no zone fill value of the rasterized CBRFC zones
+    NO_ZONE = -999
+
+    def __init__(
+        self,
+        zone_raster: npt.ArrayLike,
+        zones: npt.ArrayLike = None,
+        no_zone: int = NO_ZONE,
+    ):
+        """
+        Parameters
+        ----------
+        zone_raster : npt.ArrayLike
+            Grid with zone IDs. Cells with the no zone value or NaN are
+            ignored.
+        zones : npt.ArrayLike, optional
+            Zone IDs to calculate statistics for. (Default: All in raster)
+        no_zone : int
+            Value of cells without a zone
+        """
+        labels = np.asarray(zone_raster)
+        self.shape = labels.shape
+
+        labels = labels.ravel()
+        valid = np.isfinite(labels) & (labels != no_zone)
+        labels = labels[valid].astype(np.int64)
+
+        if zones is None:
+            zones = np.unique(labels)
+        self.zones = np.sort(np.asarray(zones, dtype=np.int64))
+
+        in_zones = np.isin(labels, self.zones)
+        self._pixels = np.flatnonzero(valid)[in_zones]
+        self._codes = np.searchsorted(self.zones, labels[in_zones])
+        self.pixel_count = np.bincount(
+            self._codes, minlength=len(self.zones)
+        )
+
+    def reduce(self, values: npt.NDArray) -> tuple[npt.NDArray, npt.NDArray]:
+        """
+        Sum and count of valid values per zone for a block of time steps.
+
+        Parameters
+        ----------
+        values : npt.NDArray
+            Data with time as first dimension and the zone raster grid as
+            remaining dimensions
+
+        Returns
+        -------
+        tuple[npt.NDArray, npt.NDArray]
+            Sum and count with shape (time, zone)
+        """
+        steps = values.shape[0]
+        zone_count = len(self.zones)
+
+        values = values.reshape(steps, -1)[:, self._pixels]
+        valid = np.isfinite(values)
+
+        bins = (
+            np.arange(steps)[:, np.newaxis] * zone_count
+            + self._codes[np.newaxis, :]
+        )[valid]
+
+        sums = np.bincount(
+            bins, weights=values[valid], minlength=steps * zone_count
+        )
+        counts = np.bincount(bins, minlength=steps * zone_count)
+
+        return (
+            sums.reshape(steps, zone_count),
+            counts.reshape(steps, zone_count),
+        )
+
+    def compute(
+        self,
+        data: xr.DataArray,
+        time_dim: str = 'time',
+        chunk_size: int = 32,
+    ) -> xr.Dataset:
+        """
+        Zonal statistics for all zones and time steps in one pass.
+
+        The data is read in blocks of time steps, which keeps only one block
+        in memory when the data is backed by dask or files.
+
+        Parameters
+        ----------
+        data : xr.DataArray
+            Data on the same grid as the zone raster
+        time_dim : str
+            Name of the time dimension
+        chunk_size : int
+            Number of time steps to read at once
+
+        Returns
+        -------
+        xr.Dataset
+            Mean, count and coverage with dimensions (time, zone). The
+            coverage is the share of zone cells with a valid value.
+        """
+        data = data.transpose(time_dim, ...)
+
+        if data.shape[1:] != self.shape:
+            raise ValueError(
+                f"Data grid {data.shape[1:]} does not match the zone "
+                f"raster {self.shape}"
+            )
+
+        sums = []
+        counts = []
+        for start in range(0, data.sizes[time_dim], chunk_size):
+            block_sum, block_count = self.reduce(
+                data.isel({time_dim: slice(start, start + chunk_size)}).values
+            )
+            sums.append(block_sum)
+            counts.append(block_count)
+
+        if sums:
+            sums = np.concatenate(sums)
+            counts = np.concatenate(counts)
+        else:
+            sums = np.zeros((0, len(self.zones)))
+            counts = np.zeros((0, len(self.zones)), dtype=np.int64)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(counts > 0, sums / counts, np.nan)
+            coverage = counts / self.pixel_count
+
+        dims = (time_dim, 'zone')
+        coords = {time_dim: data[time_dim].values, 'zone': self.zones}
+
+        return xr.Dataset(
+            {
+                'mean': (dims, mean),
+                'count': (dims, counts),
+                'coverage': (dims, coverage),
+            },
+            coords=coords,
+        )
@@ -1,9 +1,12 @@
 from .base import Base
 from .cbrfc_zone import CBRFCZone
 from .swann_zonal_swe import SWANNZonalSWE
+from .zone_mask import ZoneMask, ZoneMaskCache
 
 __all__ = [
     "Base",
     "CBRFCZone",
-    "SWANNZonalSWE"
+    "SWANNZonalSWE",
+    "ZoneMask",
+    "ZoneMaskCache",
 ]
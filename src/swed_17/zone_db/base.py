@@ -1,11 +1,19 @@
-import psycopg
+import time
+
 import pandas as pd
 
+from collections.abc import Iterable
 from contextlib import contextmanager
 
-from psycopg import Cursor
+from psycopg import Cursor, sql
+from psycopg.conninfo import conninfo_to_dict
 from psycopg.rows import TupleRow
-from sqlalchemy import create_engine
+from sqlalchemy import URL
+
+from . import binary_copy
+from .. import arrow_fetch
+from ..connection_pool import ConnectionPool
+from ..query_cache import QueryCache
 
 
 class Base:
@@ -13,11 +21,22 @@ class Base:
     Base database query class.
     """
 
+    # Engine options for connections from the shared pool
     CONNECTION_OPTIONS = dict(
-        autocommit=True,
+        isolation_level="AUTOCOMMIT",
     )
 
     PSYCOPG_PROTOCOL = "postgresql+psycopg://"
+    # Column with the load order of rows in the upsert staging table
+    STAGING_ORDER = "_staging_order"
+    # Column types by dtype kind for tables created by write, as to_sql did
+    CREATE_TYPES = dict(
+        b="BOOLEAN",
+        i="BIGINT",
+        u="BIGINT",
+        f="DOUBLE PRECISION",
+        M="TIMESTAMP",
+    )
 
     class Query:
         """
@@ -25,17 +44,43 @@ class Base:
         """
         ZONE_AS_RASTER = "SELECT ST_AsGDALRaster(ST_Union(zone_mask.rast), 'GTiff') " \
                          "FROM zone_mask_as_raster(%(zone_name)s) AS zone_mask"
+        ZONES_AS_RASTER = "SELECT zone_name, " \
+                          "ST_AsGDALRaster(ST_Union(zone_mask.rast), 'GTiff') " \
+                          "FROM unnest(%(zone_names)s::text[]) AS zone_name, " \
+                          "LATERAL zone_mask_as_raster(zone_name) AS zone_mask " \
+                          "GROUP BY zone_name"
+        TABLE_COLUMNS = "SELECT a.attname, a.atttypid, t.typname " \
+                        "FROM pg_attribute a " \
+                        "JOIN pg_type t ON t.oid = a.atttypid " \
+                        "WHERE a.attrelid = to_regclass(%(table)s) " \
+                        "AND a.attnum > 0 AND NOT a.attisdropped"
+        PRIMARY_KEY = "SELECT a.attname FROM pg_index i " \
+                      "JOIN pg_attribute a ON a.attrelid = i.indrelid " \
+                      "AND a.attnum = ANY(i.indkey) " \
+                      "WHERE i.indrelid = to_regclass(%(table)s) " \
+                      "AND i.indisprimary"
 
-    def __init__(self, connection_info: str):
+    def __init__(self, connection_info: str, cache: QueryCache = None):
+        """
+        Parameters
+        ----------
+        connection_info : str
+            Connection string
+        cache : QueryCache, optional
+            Cache query results on disk
+        """
         self._connection_info = connection_info
+        self._cache = cache
 
     @contextmanager
-    def query(self, query: str, params: dict = {}, row_factory={}) -> Cursor[TupleRow]:
+    def query(
+        self, query: str, params: dict = {}, row_factory={}, prepare=None
+    ) -> Cursor[TupleRow]:
         """
         Execute given query by passing in requested parameters.
 
-        This uses a conextmanager to manage the DB connection and to yield
-        the results as DB cursor.
+        This uses a conextmanager to check out a connection from the shared
+        :class:`ConnectionPool` and to yield the results as DB cursor.
 
         Parameters
         ----------
@@ -45,51 +90,364 @@ class Base:
             Pass in query parameters if the query contains any, by default {}
         row_factory: dict, optional
             Specify the class to use to parse each result row
+        prepare: bool, optional
+            Use a server-side prepared statement, which is reused by later
+            calls with the same query on the same pooled connection.
+            (Default: After repeated execution, see psycopg)
 
         Returns
         -------
         Cursor
             Cursor with result from psycopg execute().
         """
-        with psycopg.connect(
-            self._connection_info, **self.CONNECTION_OPTIONS
+        with ConnectionPool.raw_connection(
+            self.pd_connection_info(), **self.CONNECTION_OPTIONS
         ) as connection:
-            with connection.cursor() as cursor:
+            with connection.driver_connection.cursor() as cursor:
                 if row_factory:
                     cursor.row_factory = row_factory
 
-                cursor.execute(query, params)
+                cursor.execute(query, params, prepare=prepare)
                 yield cursor
 
-    def write(self, dataframe: pd.DataFrame, table_name: str) -> None:
+    @contextmanager
+    def transaction(self) -> Cursor[TupleRow]:
+        """
+        Cursor of one transaction on a connection from the shared
+        :class:`ConnectionPool`.
+
+        The transaction is committed when the block exits and rolled back
+        on an error. Pass the cursor to :meth:`write` to write within the
+        transaction.
+
+        Returns
+        -------
+        Cursor
+            Cursor within the transaction
+        """
+        with ConnectionPool.raw_connection(
+            self.pd_connection_info(), **self.CONNECTION_OPTIONS
+        ) as connection:
+            connection = connection.driver_connection
+
+            with connection.transaction(), connection.cursor() as cursor:
+                yield cursor
+
+    def query_arrow(
+        self, query: str, params: dict = {}, dataframe: bool = False
+    ):
+        """
+        Execute given query and return the result in columnar form.
+
+        The result is transferred with the ADBC Postgres driver, which
+        decodes it straight into Arrow memory without creating Python
+        objects per value. Connections are reused from the ADBC pool of the
+        :class:`ConnectionPool`. Parameters are bound on the client side.
+
+        Parameters
+        ----------
+        query : str
+            SQL query
+        params : dict, optional
+            Pass in query parameters if the query contains any, by default {}
+        dataframe : bool, optional
+            Return a dataframe backed by the Arrow memory. (Default: False)
+
+        Returns
+        -------
+        pyarrow.Table or pd.DataFrame
+            Query result
+        """
+        if params:
+            query = query % {
+                name: sql.Literal(value).as_string()
+                for name, value in params.items()
+            }
+
+        table = arrow_fetch.fetch_postgres(self._connection_info, query)
+
+        if dataframe:
+            return arrow_fetch.to_pandas(table)
+
+        return table
+
+    def copy_out(self, query: str, params: dict = {}) -> bytes:
+        """
+        Run query with binary COPY and return the raw output.
+
+        Decode the output with :func:`binary_copy.read_binary_copy`.
+
+        Parameters
+        ----------
+        query : str
+            SQL query without trailing semicolon
+        params : dict, optional
+            Query parameters, bound on the client side
+
+        Returns
+        -------
+        bytes
+            Output in the Postgres binary COPY format
         """
-        Write datafrme to the database
+        with ConnectionPool.raw_connection(
+            self.pd_connection_info(), **self.CONNECTION_OPTIONS
+        ) as connection:
+            with connection.driver_connection.cursor() as cursor:
+                with cursor.copy(
+                    f"COPY ({query}) TO STDOUT (FORMAT BINARY)", params
+                ) as copy:
+                    return b"".join(copy)
+
+    def write(
+        self,
+        data: pd.DataFrame | Iterable[pd.DataFrame],
+        table_name: str,
+        upsert: bool = False,
+        cursor: Cursor = None,
+    ) -> dict:
+        """
+        Write dataframes to the database with binary COPY
+
+        All chunks are written in one transaction. A missing table is
+        created from the columns of the first chunk, except with upsert.
+        With upsert, the rows are copied into a temporary staging table
+        first and then inserted, updating existing rows with the same
+        primary key. Of rows in the data with the same primary key, the
+        last one is written.
 
         Parameters
         ----------
-        dataframe : pd.DataFrame
-            Dataframe with the data. The column names have to match the table
-            columns
+        data : pd.DataFrame or Iterable[pd.DataFrame]
+            Dataframe or chunks of dataframes with the data. The column names
+            have to match the table columns. Missing values are written as
+            NULL.
         table_name : str
-            Table name to write to
+            Table to write to, optionally with schema
+        upsert : bool
+            Update rows with existing primary keys. All primary key columns
+            have to be in the data. (Default: False)
+        cursor : Cursor, optional
+            Cursor from :meth:`transaction` to write within that transaction.
+            (Default: Write in a new transaction)
+
+        Returns
+        -------
+        dict
+            Written rows, seconds and rows per second
         """
+        if isinstance(data, pd.DataFrame):
+            data = [data]
+
+        start = time.perf_counter()
+
+        if cursor is None:
+            with self.transaction() as cursor:
+                rows = self._write(cursor, data, table_name, upsert)
+        else:
+            rows = self._write(cursor, data, table_name, upsert)
+
+        seconds = time.perf_counter() - start
+
+        return dict(
+            rows=rows,
+            seconds=seconds,
+            rows_per_second=rows / seconds if seconds > 0 else 0.0,
+        )
+
+    def _write(
+        self,
+        cursor: Cursor,
+        data: Iterable[pd.DataFrame],
+        table_name: str,
+        upsert: bool,
+    ) -> int:
+        rows = 0
+        table = sql.Identifier(*table_name.split("."))
+        target = table
+        columns = None
+
+        for chunk in data:
+            if columns is None:
+                columns = list(chunk.columns)
+                table_types = self._table_types(cursor, table_name)
+                if not table_types and not upsert:
+                    self._create_table(cursor, table, chunk)
+                    table_types = self._table_types(cursor, table_name)
+                types = self._column_types(table_name, table_types, columns)
+                if upsert:
+                    keys = self._primary_key(cursor, table_name, columns)
+                    target = sql.Identifier(
+                        f"{table_name.split('.')[-1]}_staging"
+                    )
+                    cursor.execute(sql.SQL(
+                        "CREATE TEMPORARY TABLE {} (LIKE {} "
+                        "INCLUDING DEFAULTS) ON COMMIT DROP"
+                    ).format(target, table))
+                    cursor.execute(sql.SQL(
+                        "ALTER TABLE {} ADD COLUMN {} BIGINT "
+                        "GENERATED ALWAYS AS IDENTITY"
+                    ).format(target, sql.Identifier(self.STAGING_ORDER)))
+
+            rows += self._copy_chunk(cursor, target, chunk[columns], types)
+
+        if upsert and columns is not None:
+            cursor.execute(self._upsert_query(table, target, columns, keys))
+            # Allows another upsert to the table within the transaction
+            cursor.execute(sql.SQL("DROP TABLE {}").format(target))
+
+        return rows
 
-        engine = create_engine(self.pd_connection_info())
-        with engine.connect() as connection:
-            dataframe.to_sql(
-                table_name, con=connection, if_exists="append", index=False
+    def _create_table(
+        self, cursor: Cursor, table: sql.Identifier, chunk: pd.DataFrame
+    ) -> None:
+        columns = []
+        for name, dtype in chunk.dtypes.items():
+            column_type = self.CREATE_TYPES.get(dtype.kind, "TEXT")
+            if isinstance(dtype, pd.DatetimeTZDtype):
+                column_type = "TIMESTAMP WITH TIME ZONE"
+            columns.append(sql.SQL("{} {}").format(
+                sql.Identifier(name), sql.SQL(column_type)
+            ))
+
+        cursor.execute(sql.SQL("CREATE TABLE {} ({})").format(
+            table, sql.SQL(", ").join(columns)
+        ))
+
+    def _table_types(self, cursor: Cursor, table_name: str) -> dict:
+        cursor.execute(self.Query.TABLE_COLUMNS, dict(table=table_name))
+        return {
+            name: (type_id, type_name)
+            for name, type_id, type_name in cursor.fetchall()
+        }
+
+    @staticmethod
+    def _column_types(
+        table_name: str, table_types: dict, columns: list
+    ) -> list:
+        if not table_types:
+            raise ValueError(f"Table {table_name} does not exist")
+
+        missing = set(columns) - set(table_types)
+        if missing:
+            raise ValueError(
+                f"Columns {sorted(missing)} are not in table {table_name}"
             )
 
+        return [table_types[column] for column in columns]
+
+    @staticmethod
+    def _copy_chunk(
+        cursor: Cursor,
+        target: sql.Identifier,
+        chunk: pd.DataFrame,
+        types: list,
+    ) -> int:
+        statement = sql.SQL("COPY {} ({}) FROM STDIN (FORMAT BINARY)").format(
+            target, sql.SQL(", ").join(map(sql.Identifier, chunk.columns))
+        )
+        data = binary_copy.write_binary_copy(
+            chunk, [type_name for _, type_name in types]
+        )
+
+        with cursor.copy(statement) as copy:
+            if data is not None:
+                copy.write(data)
+                return len(chunk)
+
+            # Types without a numpy encoding are adapted per value
+            copy.set_types([type_id for type_id, _ in types])
+            values = chunk.astype(object).where(chunk.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                copy.write_row(row)
+
+        return len(chunk)
+
+    def _primary_key(
+        self, cursor: Cursor, table_name: str, columns: list
+    ) -> list:
+        cursor.execute(self.Query.PRIMARY_KEY, dict(table=table_name))
+        keys = [row[0] for row in cursor.fetchall()]
+
+        if not keys:
+            raise ValueError(f"Table {table_name} has no primary key")
+
+        # Keys filled from defaults, e.g. a serial id, never conflict
+        missing = [key for key in keys if key not in columns]
+        if missing:
+            raise ValueError(
+                f"Primary key columns {missing} of table {table_name} are "
+                f"not in the data, write without upsert instead"
+            )
+
+        return keys
+
+    def _upsert_query(
+        self,
+        table: sql.Identifier,
+        staging: sql.Identifier,
+        columns: list,
+        keys: list,
+    ) -> sql.Composed:
+        column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+        updates = [column for column in columns if column not in keys]
+
+        if updates:
+            action = sql.SQL("DO UPDATE SET {}").format(
+                sql.SQL(", ").join(
+                    sql.SQL("{0} = EXCLUDED.{0}").format(
+                        sql.Identifier(column)
+                    )
+                    for column in updates
+                )
+            )
+        else:
+            action = sql.SQL("DO NOTHING")
+
+        key_list = sql.SQL(", ").join(map(sql.Identifier, keys))
+
+        # ON CONFLICT can not affect a row twice, keep the last loaded row
+        return sql.SQL(
+            "INSERT INTO {table} ({columns}) "
+            "SELECT DISTINCT ON ({keys}) {columns} FROM {staging} "
+            "ORDER BY {keys}, {order} DESC "
+            "ON CONFLICT ({keys}) {action}"
+        ).format(
+            table=table,
+            columns=column_list,
+            staging=staging,
+            keys=key_list,
+            order=sql.Identifier(self.STAGING_ORDER),
+            action=action,
+        )
+
     def pd_connection_info(self):
         """
         Return the connection info for use with pandas.
 
         Pandas needs an explicit defintion in the string to indicate psycopg
-        use.
+        use. A libpq keyword string, e.g. "host=x dbname=y", is converted
+        to the matching URL.
         """
         if "://" in self._connection_info:
             connection_info = self._connection_info.split("://")[1]
+            return self.PSYCOPG_PROTOCOL + connection_info
+
+        params = conninfo_to_dict(self._connection_info)
+        host = params.get("host")
+        port = params.get("port")
+        # Lists of hosts and ports stay libpq query parameters
+        if "," in (host or "") or "," in (port or ""):
+            host = port = None
         else:
-            connection_info = "?" + self._connection_info
+            params.pop("host", None)
+            params.pop("port", None)
 
-        return self.PSYCOPG_PROTOCOL + connection_info
+        return URL.create(
+            self.PSYCOPG_PROTOCOL.split("://")[0],
+            username=params.pop("user", None),
+            password=params.pop("password", None),
+            host=host,
+            port=int(port) if port else None,
+            database=params.pop("dbname", None),
+            query=params,
+        ).render_as_string(hide_password=False)
@@ -0,0 +1,235 @@
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+# Postgres binary COPY file header signature
+SIGNATURE = b"PGCOPY\n\377\r\n\0"
+# Header with the signature, no flags and no extension
+HEADER = SIGNATURE + bytes(8)
+# End of data marker
+TRAILER = b"\xff\xff"
+# Postgres timestamps are microseconds since 2000-01-01
+POSTGRES_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+
+# Binary layout of the supported fixed width Postgres types
+TYPES = {
+    "int4": ">i4",
+    "int8": ">i8",
+    "float4": ">f4",
+    "float8": ">f8",
+    "timestamp": ">i8",
+    "timestamptz": ">i8",
+}
+# Additional types supported by write_binary_copy
+WRITE_TYPES = {
+    **TYPES,
+    "int2": ">i2",
+    "bool": "?",
+}
+TEXT_TYPES = {"text", "varchar"}
+
+
+def row_dtype(columns: dict) -> np.dtype:
+    """
+    Numpy dtype of one binary COPY row.
+
+    Parameters
+    ----------
+    columns : dict
+        Column names with their Postgres types. See :data:`TYPES` for
+        supported types.
+
+    Returns
+    -------
+    np.dtype
+        Structured dtype with the field count, and the length and value of
+        each column
+    """
+    fields = [("field_count", ">i2")]
+    for name, column_type in columns.items():
+        if column_type not in TYPES:
+            raise ValueError(f"Unsupported column type: {column_type}")
+        fields.append((f"{name}_length", ">i4"))
+        fields.append((name, TYPES[column_type]))
+
+    return np.dtype(fields)
+
+
+def read_binary_copy(data: bytes, columns: dict) -> dict[str, npt.NDArray]:
+    """
+    Decode the output of `COPY ... TO STDOUT (FORMAT BINARY)` into numpy
+    arrays without creating Python objects per value.
+
+    All columns have to be fixed width types without NULL values, which
+    makes every row the same size. Use COALESCE in the query to replace
+    NULL values, e.g. with 'NaN' for floats.
+
+    Parameters
+    ----------
+    data : bytes
+        Binary COPY output
+    columns : dict
+        Column names with their Postgres types in query order
+
+    Returns
+    -------
+    dict[str, npt.NDArray]
+        Values per column. Timestamps are returned as datetime64[us] in UTC.
+    """
+    data = memoryview(data)
+    if bytes(data[:len(SIGNATURE)]) != SIGNATURE:
+        raise ValueError("Data is not in the binary COPY format")
+
+    header_end = len(SIGNATURE) + 8
+    extension = int.from_bytes(data[header_end - 4:header_end], "big")
+    body = data[header_end + extension:-2]
+
+    dtype = row_dtype(columns)
+    if len(body) % dtype.itemsize != 0:
+        raise ValueError("Rows differ in size, check for NULL values")
+
+    rows = np.frombuffer(body, dtype=dtype)
+    if np.any(rows["field_count"] != len(columns)):
+        raise ValueError("Unexpected number of columns")
+
+    values = {}
+    for name, column_type in columns.items():
+        if np.any(rows[f"{name}_length"] != dtype[name].itemsize):
+            raise ValueError(f"Column {name} has NULL values")
+
+        column = rows[name].astype(dtype[name].newbyteorder("="))
+        if column_type.startswith("timestamp"):
+            column = POSTGRES_EPOCH + column.astype("timedelta64[us]")
+        values[name] = column
+
+    return values
+
+
+def write_binary_copy(data: pd.DataFrame, types: list) -> bytes | None:
+    """
+    Encode a dataframe in the format of `COPY ... FROM STDIN (FORMAT BINARY)`
+    with numpy operations per column instead of Python objects per value.
+
+    Missing values are encoded as NULL.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Values to encode
+    types : list
+        Postgres type name of each column. See :data:`WRITE_TYPES` and
+        :data:`TEXT_TYPES` for supported types.
+
+    Returns
+    -------
+    bytes or None
+        Binary COPY data including header and trailer. None if a column
+        type or the values of a column are not supported.
+    """
+    columns = []
+    for name, column_type in zip(data.columns, types):
+        column = _encode_column(data[name], column_type)
+        if column is None:
+            return None
+        columns.append(column)
+
+    rows = len(data)
+    # Each field is the value length followed by the value, NULL has no value
+    field_sizes = [4 + np.maximum(lengths, 0) for _, lengths in columns]
+    row_sizes = 2 + np.sum(field_sizes, axis=0, dtype=np.int64)
+    row_starts = len(HEADER) + np.cumsum(row_sizes) - row_sizes
+
+    output = np.empty(
+        len(HEADER) + int(row_sizes.sum()) + len(TRAILER), dtype=np.uint8
+    )
+    output[:len(HEADER)] = np.frombuffer(HEADER, dtype=np.uint8)
+    output[-len(TRAILER):] = np.frombuffer(TRAILER, dtype=np.uint8)
+
+    _scatter(output, row_starts, np.full(rows, len(columns), dtype=">i2"))
+    position = row_starts + 2
+
+    for (values, lengths), field_size in zip(columns, field_sizes):
+        _scatter(output, position, lengths.astype(">i4"))
+
+        valid = lengths > 0
+        value_lengths = lengths[valid]
+        value_offsets = np.cumsum(value_lengths) - value_lengths
+        targets = np.repeat(position[valid] + 4 - value_offsets, value_lengths)
+        output[targets + np.arange(len(targets))] = values
+
+        position += field_size
+
+    return output.tobytes()
+
+
+def _scatter(output: npt.NDArray, starts: npt.NDArray, values: npt.NDArray):
+    # Copy fixed width values to the given start positions
+    width = values.dtype.itemsize
+    output[starts[:, np.newaxis] + np.arange(width)] = values.view(
+        np.uint8
+    ).reshape(-1, width)
+
+
+def _encode_column(
+    column: pd.Series, column_type: str
+) -> tuple[npt.NDArray, npt.NDArray] | None:
+    # Concatenated bytes of all non-NULL values and the byte length of each
+    # value, with -1 for NULL
+    nulls = column.isna().to_numpy()
+
+    if column_type in TEXT_TYPES:
+        if not all(isinstance(value, str) for value in column[~nulls]):
+            return None
+        encoded = [value.encode() for value in column[~nulls]]
+        lengths = np.full(len(column), -1, dtype=np.int64)
+        lengths[~nulls] = [len(value) for value in encoded]
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), lengths
+
+    if column_type not in WRITE_TYPES:
+        return None
+
+    dtype = np.dtype(WRITE_TYPES[column_type])
+
+    if column_type.startswith("timestamp"):
+        if column.dtype.kind != "M":
+            return None
+        # timestamptz values are UTC, timestamp values have no time zone
+        aware = isinstance(column.dtype, pd.DatetimeTZDtype)
+        if aware != (column_type == "timestamptz"):
+            return None
+        if aware:
+            column = column.dt.tz_convert("UTC").dt.tz_localize(None)
+        values = (
+            column.to_numpy("datetime64[us]", na_value=POSTGRES_EPOCH)
+            - POSTGRES_EPOCH
+        ).astype(dtype)
+    elif column.dtype.kind in "biuf":
+        if dtype.kind == "i" and not _fits_integer(column[~nulls], dtype):
+            return None
+        values = column.to_numpy(dtype=dtype.newbyteorder("="), na_value=0)
+        values = values.astype(dtype)
+    else:
+        return None
+
+    values = values[~nulls]
+    lengths = np.where(nulls, -1, dtype.itemsize)
+    return values.view(np.uint8), lengths
+
+
+def _fits_integer(column: pd.Series, dtype: np.dtype) -> bool:
+    # Whether all values convert to the integer type without rounding or
+    # overflow
+    values = column.to_numpy()
+    if len(values) == 0:
+        return True
+
+    info = np.iinfo(dtype)
+    if values.dtype.kind == "f":
+        # The upper bound is exact as float, unlike info.max
+        return bool(
+            np.all(values == np.trunc(values))
+            and values.min() >= info.min
+            and values.max() < -float(info.min)
+        )
+
+    return bool(values.min() >= info.min and values.max() <= info.max)
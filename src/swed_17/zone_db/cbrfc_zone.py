@@ -4,6 +4,8 @@ from psycopg.rows import class_row
 from rasterio.io import MemoryFile
 
 from .base import Base
+from .zone_mask import ZoneMask, ZoneMaskCache
+from ..query_cache import QueryCache
 
 
 @dataclass
@@ -22,6 +24,26 @@ class CBRFCZone(Base):
         "WHERE cc.CH5_ID = ANY(%s) AND cz.ch5_id = cc.id"
     )
 
+    def __init__(
+        self,
+        connection_info: str,
+        cache: QueryCache = None,
+        mask_cache: ZoneMaskCache = None,
+    ):
+        """
+        Parameters
+        ----------
+        connection_info : str
+            Connection string
+        cache : QueryCache, optional
+            Cache query results on disk
+        mask_cache : ZoneMaskCache, optional
+            Cache for decoded zone masks. (Default: In-memory only)
+        """
+        super().__init__(connection_info, cache)
+        self.mask_cache = mask_cache if mask_cache is not None \
+            else ZoneMaskCache()
+
     def as_rio(self, zone_name: str) -> MemoryFile:
         """
         Query for a zone mask and return as a rasterio MemoryFile.
@@ -42,6 +64,79 @@ class CBRFCZone(Base):
             result = db_result.fetchone()
         return MemoryFile(bytes(result[0]))
 
+    def as_rio_many(self, zone_names: list[str]) -> dict[str, MemoryFile]:
+        """
+        Query for multiple zone masks with one query.
+
+        Parameters
+        ----------
+        zone_names : list[str]
+            Zone names
+
+        Returns
+        -------
+        dict[str, MemoryFile]
+            Zone masks as rasterio MemoryFile by zone name
+        """
+        with self.query(
+            self.Query.ZONES_AS_RASTER, {'zone_names': list(zone_names)}
+        ) as db_result:
+            return {
+                zone_name: MemoryFile(bytes(raster))
+                for zone_name, raster in db_result.fetchall()
+            }
+
+    def masks(self, zone_names: list[str]) -> dict[str, ZoneMask]:
+        """
+        Decoded masks for given zones.
+
+        Masks are served from the mask cache and only missing ones are
+        queried, all in one query.
+
+        Parameters
+        ----------
+        zone_names : list[str]
+            Zone names
+
+        Returns
+        -------
+        dict[str, ZoneMask]
+            Zone masks by zone name
+        """
+        masks = {}
+        missing = []
+
+        for zone_name in zone_names:
+            mask = self.mask_cache.get(zone_name)
+            if mask is None:
+                missing.append(zone_name)
+            else:
+                masks[zone_name] = mask
+
+        if missing:
+            for zone_name, file in self.as_rio_many(missing).items():
+                with file:
+                    mask = ZoneMask.from_rio(file)
+                self.mask_cache.put(zone_name, mask)
+                masks[zone_name] = mask
+
+        return masks
+
+    def mask(self, zone_name: str) -> ZoneMask:
+        """
+        Decoded mask for given zone. See :meth:`masks`.
+
+        Parameters
+        ----------
+        zone_name : str
+            Zone name
+
+        Returns
+        -------
+        ZoneMask
+        """
+        return self.masks([zone_name])[zone_name]
+
     def from_ch5_ids(self, ch5_ids: list) -> list[str]:
         """
         Return list of zone names for given CH5 IDs
@@ -1,10 +1,11 @@
 import datetime
 import pandas as pd
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from dataclasses import dataclass
 
 from .base import Base
+from ..connection_pool import ConnectionPool
 
 
 @dataclass
@@ -17,14 +18,51 @@ class SWANNZonalSWE(Base):
     QUERY = "SELECT szs.z_date, szs.swe " \
             "FROM swann_zonal_swe szs " \
             "WHERE szs.cbrfc_zone_id = :zone_id"
+    NEWER_THAN = " AND szs.z_date > :since"
 
     def for_zone(self, zone_id: int) -> pd.DataFrame:
-        engine = create_engine(self.pd_connection_info())
-        with engine.connect() as connection:
+        """
+        Get SWANN SWE for a zone
+
+        Results are kept in the cache when one was given to this instance.
+
+        Parameters
+        ----------
+        zone_id : int
+            CBRFC zone ID
+
+        Returns
+        -------
+        pd.DataFrame
+            SWE indexed by date
+        """
+        if self._cache is None:
+            return self._query_zone(zone_id)
+
+        return self._cache.get(
+            'swann_zonal_swe',
+            dict(zone_id=zone_id),
+            lambda: self._query_zone(zone_id),
+            lambda since: self._query_zone(zone_id, since),
+        )
+
+    def _query_zone(
+        self, zone_id: int, since: pd.Timestamp = None
+    ) -> pd.DataFrame:
+        query = self.QUERY
+        params = {'zone_id': zone_id}
+
+        if since is not None:
+            query = query + self.NEWER_THAN
+            params['since'] = since.to_pydatetime()
+
+        with ConnectionPool.connect(
+            self.pd_connection_info(), **self.CONNECTION_OPTIONS
+        ) as connection:
             return pd.read_sql_query(
-                text(self.QUERY),
+                text(query),
                 connection,
-                params={'zone_id': zone_id},
+                params=params,
                 index_col='z_date',
                 parse_dates=['z_date']
             )
@@ -0,0 +1,145 @@
+import threading
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from rasterio import Affine, transform
+from rasterio.io import MemoryFile
+
+
+@dataclass(frozen=True)
+class ZoneMask:
+    """
+    Decoded zone mask raster.
+    """
+    data: npt.NDArray
+    transform: Affine
+
+    @classmethod
+    def from_rio(cls, file: MemoryFile) -> "ZoneMask":
+        """
+        Decode first band and transform from a raster file.
+
+        Parameters
+        ----------
+        file : MemoryFile
+            Raster to decode
+
+        Returns
+        -------
+        ZoneMask
+        """
+        with file.open() as data:
+            return cls(data.read(1), data.transform)
+
+    @property
+    def bounding_box(self) -> dict:
+        """
+        Bounding box for selection with Xarray.
+
+        Returns
+        -------
+        dict
+            Dictionary with keys:
+            * lat(minLat, maxLat)
+            * lon(minLon, maxLon)
+        """
+        height, width = self.data.shape
+
+        ul = transform.xy(self.transform, 0, 0, offset='ul')
+        lr = transform.xy(self.transform, height - 1, width - 1, offset='lr')
+
+        return dict(lat=slice(lr[1], ul[1]), lon=slice(ul[0], lr[0]))
+
+    def data_as_xr(self) -> npt.NDArray:
+        """
+        Mask data with mirrored 0 axis to add as Xarray mask.
+        """
+        return np.flip(self.data, axis=0)
+
+
+class ZoneMaskCache:
+    """
+    Least recently used cache of decoded zone masks.
+
+    Masks can optionally be persisted as one .npz file per zone in a local
+    directory, which is used as a second level before querying the DB.
+    """
+
+    def __init__(self, maxsize: int = 512, store_dir: str = None):
+        """
+        Parameters
+        ----------
+        maxsize : int
+            Number of masks to keep in memory
+        store_dir : str, optional
+            Directory to persist masks in
+        """
+        self.maxsize = maxsize
+        self.store_dir = None if store_dir is None else Path(store_dir)
+
+        self._masks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, zone_name: str) -> ZoneMask | None:
+        """
+        Return cached mask for zone or None if not cached.
+        """
+        with self._lock:
+            mask = self._masks.get(zone_name)
+            if mask is not None:
+                self._masks.move_to_end(zone_name)
+                return mask
+
+        mask = self._load(zone_name)
+        if mask is not None:
+            self._add(zone_name, mask)
+
+        return mask
+
+    def put(self, zone_name: str, mask: ZoneMask) -> None:
+        """
+        Add mask to the cache and the store directory, if set.
+        """
+        self._add(zone_name, mask)
+
+        if self.store_dir is not None:
+            self.store_dir.mkdir(parents=True, exist_ok=True)
+            np.savez_compressed(
+                self._store_file(zone_name),
+                data=mask.data,
+                transform=np.array(mask.transform)[:6],
+            )
+
+    def clear(self) -> None:
+        """
+        Remove all masks from memory.
+        """
+        with self._lock:
+            self._masks.clear()
+
+    def _add(self, zone_name: str, mask: ZoneMask) -> None:
+        with self._lock:
+            self._masks[zone_name] = mask
+            self._masks.move_to_end(zone_name)
+            while len(self._masks) > self.maxsize:
+                self._masks.popitem(last=False)
+
+    def _store_file(self, zone_name: str) -> Path:
+        return self.store_dir / f"{zone_name}.npz"
+
+    def _load(self, zone_name: str) -> ZoneMask | None:
+        if self.store_dir is None:
+            return None
+
+        try:
+            with np.load(self._store_file(zone_name)) as stored:
+                return ZoneMask(
+                    stored['data'], Affine(*stored['transform'])
+                )
+        except FileNotFoundError:
+            return None
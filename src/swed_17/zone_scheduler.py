@@ -0,0 +1,326 @@
+"""
+Parallel zonal SWE extraction on a dask cluster.
+
+Zones are grouped by their location on the product grid, so each task only
+reads the compact window around a few neighbouring zones. Extraction and
+database writes run as dask tasks with retries.
+"""
+
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import xarray as xr
+
+from dask.distributed import Client, as_completed
+
+from .nb_helpers import start_cluster
+from .zonal_statistics import ZonalStatistics
+from .zone_db import Base
+
+# Zone raster variable in the product archives, see zarr_ingest
+ZONE_RASTER = "cbrfc_zone_gid"
+TIME = "time"
+# Metric type of SWE in the zonal tables
+SWE_METRIC = 1
+
+
+@dataclass(frozen=True)
+class ZoneProduct:
+    """
+    Product archive and zonal table to extract into.
+    """
+    # Path or glob of the archive files with the SWE and zone raster
+    archive: str
+    # Zonal SWE table
+    table: str
+    # Name of the SWE variable
+    variable: str = "SWE"
+    # Xarray engine to open the archive with
+    engine: str = "zarr"
+    # Spatial dimension names (y, x)
+    dims: tuple = ("lat", "lon")
+    # Factor to convert the values to mm
+    scale: float = 1.0
+    # Additional columns with a constant value for all rows
+    columns: dict = field(default_factory=dict)
+    # Update existing rows based on the table primary key. The key columns
+    # have to be in the rows, disable for tables with a serial id such as
+    # isnobal_zonal_swe.
+    upsert: bool = True
+
+    def open(self) -> xr.Dataset:
+        """
+        Open the archive lazily.
+        """
+        return xr.open_mfdataset(
+            self.archive,
+            engine=self.engine,
+            preprocess=lambda dataset: dataset[[self.variable, ZONE_RASTER]],
+            data_vars="minimal",
+            coords="minimal",
+            compat="override",
+            chunks={TIME: 30},
+        )
+
+
+class ZoneScheduler:
+    """
+    Schedule the zonal SWE extraction of many zones on a dask cluster.
+
+    Example
+    -------
+    >>> scheduler = ZoneScheduler(connection_info="service=swe_db")
+    >>> for result in scheduler.run(zone_ids, product):
+    ...     print(result)
+    """
+
+    ZONE_IDS_QUERY = "SELECT zone, gid FROM cbrfc_zones " \
+                     "WHERE zone = ANY(%(zones)s)"
+
+    def __init__(
+        self,
+        client: Client = None,
+        connection_info: str = None,
+        partition_size: int = 8,
+        retries: int = 3,
+        **cluster_options,
+    ):
+        """
+        Parameters
+        ----------
+        client : Client, optional
+            Dask client. (Default: New cluster from :func:`start_cluster`)
+        connection_info : str
+            Connection string of the zonal SWE database
+        partition_size : int
+            Number of neighbouring zones per extraction task
+        retries : int
+            Number of retries of failed tasks
+        cluster_options
+            Passed to :func:`start_cluster` when no client is given
+        """
+        self.client = client if client is not None \
+            else start_cluster(**cluster_options)
+        self.connection_info = connection_info
+        self.partition_size = partition_size
+        self.retries = retries
+
+    def zone_ids(self, zones: list) -> list[int]:
+        """
+        Zone ids for a list of zone names or ids.
+
+        Raises a ValueError for zone names that are not in the database.
+        """
+        names = [zone for zone in zones if isinstance(zone, str)]
+        ids = [int(zone) for zone in zones if not isinstance(zone, str)]
+
+        if names:
+            with Base(self.connection_info).query(
+                self.ZONE_IDS_QUERY, dict(zones=names)
+            ) as results:
+                zone_ids = dict(results.fetchall())
+
+            unknown = sorted(set(names) - set(zone_ids))
+            if unknown:
+                raise ValueError(f"Unknown zones: {', '.join(unknown)}")
+
+            ids.extend(zone_ids[name] for name in names)
+
+        return ids
+
+    @staticmethod
+    def zone_extents(
+        zone_raster: npt.NDArray, zone_ids: list[int]
+    ) -> pd.DataFrame:
+        """
+        Pixel window of each zone on the product grid.
+
+        Parameters
+        ----------
+        zone_raster : npt.NDArray
+            Zone ids on the product grid
+        zone_ids : list[int]
+            Zones to get the windows for
+
+        Returns
+        -------
+        pd.DataFrame
+            Window with the columns row_min, row_max, column_min and
+            column_max per zone. Zones outside the grid are not included.
+        """
+        rows, columns = np.nonzero(np.isin(zone_raster, zone_ids))
+        pixels = pd.DataFrame({
+            "zone": zone_raster[rows, columns].astype(np.int64),
+            "row": rows,
+            "column": columns,
+        })
+        extents = pixels.groupby("zone").agg(["min", "max"])
+        extents.columns = [f"{name}_{stat}" for name, stat in extents.columns]
+
+        return extents
+
+    def partition(self, extents: pd.DataFrame) -> list[dict]:
+        """
+        Group neighbouring zones by the Z-order curve of their window
+        centers.
+
+        Parameters
+        ----------
+        extents : pd.DataFrame
+            Zone windows from :meth:`zone_extents`
+
+        Returns
+        -------
+        list[dict]
+            Partitions with the zone ids and the combined window as slices
+        """
+        order = np.argsort(morton_code(
+            (extents.row_min + extents.row_max).to_numpy() // 2,
+            (extents.column_min + extents.column_max).to_numpy() // 2,
+        ))
+        extents = extents.iloc[order]
+
+        partitions = []
+        for start in range(0, len(extents), self.partition_size):
+            group = extents.iloc[start:start + self.partition_size]
+            partitions.append(dict(
+                zone_ids=group.index.tolist(),
+                rows=slice(
+                    int(group.row_min.min()), int(group.row_max.max()) + 1
+                ),
+                columns=slice(
+                    int(group.column_min.min()),
+                    int(group.column_max.max()) + 1,
+                ),
+            ))
+
+        return partitions
+
+    def run(self, zones: list, product: ZoneProduct) -> Iterator[dict]:
+        """
+        Extract and write the zonal SWE for all zones.
+
+        Parameters
+        ----------
+        zones : list
+            Zone names or ids
+        product : ZoneProduct
+            Product to extract
+
+        Returns
+        -------
+        Iterator[dict]
+            Write result for each zone as it finishes, with the zone id, the
+            written rows and the rows per second. Failed zones have an error
+            instead.
+        """
+        zone_ids = self.zone_ids(zones)
+        with product.open() as archive:
+            zone_raster = archive[ZONE_RASTER].values
+
+        write_futures = {}
+        for partition in self.partition(
+            self.zone_extents(zone_raster, zone_ids)
+        ):
+            extracted = self.client.submit(
+                extract_partition, product, partition,
+                retries=self.retries,
+            )
+            for zone_id in partition["zone_ids"]:
+                future = self.client.submit(
+                    write_zone, product, self.connection_info,
+                    extracted, zone_id,
+                    retries=self.retries, pure=False,
+                )
+                write_futures[future] = zone_id
+
+        for future in as_completed(write_futures):
+            if future.status == "error":
+                yield dict(
+                    zone_id=write_futures[future], error=future.exception()
+                )
+            else:
+                yield future.result()
+
+
+def morton_code(rows: npt.NDArray, columns: npt.NDArray) -> npt.NDArray:
+    """
+    Interleave the bits of the row and column indices (Z-order curve).
+    """
+    code = np.zeros(len(rows), dtype=np.uint64)
+    rows = rows.astype(np.uint64)
+    columns = columns.astype(np.uint64)
+
+    one = np.uint64(1)
+
+    for bit in range(32):
+        shift = np.uint64(bit)
+        code |= ((rows >> shift) & one) << np.uint64(2 * bit + 1)
+        code |= ((columns >> shift) & one) << np.uint64(2 * bit)
+
+    return code
+
+
+def extract_partition(
+    product: ZoneProduct, partition: dict
+) -> dict[int, pd.DataFrame]:
+    """
+    Zonal means for all zones of a partition, reading only its window.
+
+    Parameters
+    ----------
+    product : ZoneProduct
+        Product to extract
+    partition : dict
+        Partition from :meth:`ZoneScheduler.partition`
+
+    Returns
+    -------
+    dict[int, pd.DataFrame]
+        Table rows for each zone
+    """
+    y_dim, x_dim = product.dims
+
+    with product.open() as archive:
+        window = archive.isel({
+            y_dim: partition["rows"], x_dim: partition["columns"]
+        })
+        statistics = ZonalStatistics(
+            window[ZONE_RASTER].values, zones=partition["zone_ids"]
+        ).compute(window[product.variable].transpose(TIME, y_dim, x_dim))
+
+    dates = pd.DatetimeIndex(statistics[TIME].values).tz_localize("UTC")
+    frames = {}
+
+    for zone_id in partition["zone_ids"]:
+        frame = pd.DataFrame({
+            "datetime": dates,
+            "value": statistics["mean"].sel(zone=zone_id).values
+            * product.scale,
+            "metric_type_id": SWE_METRIC,
+            "cbrfc_zone_id": zone_id,
+        })
+        for column, value in product.columns.items():
+            frame[column] = value
+        frames[zone_id] = frame
+
+    return frames
+
+
+def write_zone(
+    product: ZoneProduct,
+    connection_info: str,
+    frames: dict[int, pd.DataFrame],
+    zone_id: int,
+) -> dict:
+    """
+    Write the extracted rows of one zone to the product table.
+    """
+    result = Base(connection_info).write(
+        frames[zone_id], product.table, upsert=product.upsert
+    )
+
+    return dict(zone_id=zone_id, **result)
@@ -0,0 +1,311 @@
+"""
+Area weights of product grid pixels for each CBRFC zone.
+
+The weights are built once per product grid and stored as a sparse
+(zone x pixel) matrix in a scipy.sparse compatible .npz file.
+
+Build from the command line with:
+    python -m swed_17.zone_weights ZONE_FILE ID_COLUMN GRID_FILE OUTPUT
+"""
+
+import argparse
+
+import numpy as np
+import numpy.typing as npt
+import shapely
+import xarray as xr
+
+from rasterio import Affine
+from scipy import sparse
+
+
+class ZoneWeights:
+    """
+    Sparse matrix with the fraction of each pixel covered by each zone.
+
+    Zonal means are area weighted and account for pixels that are only
+    partially within a zone. Calculating them for all zones is one sparse
+    matrix-vector product per time step.
+    """
+
+    def __init__(
+        self,
+        matrix: sparse.csr_array,
+        zones: npt.ArrayLike,
+        grid_shape: tuple,
+    ):
+        """
+        Parameters
+        ----------
+        matrix : sparse.csr_array
+            Pixel coverage with shape (zone, pixel)
+        zones : npt.ArrayLike
+            Zone ID for each matrix row
+        grid_shape : tuple
+            Shape of the product grid (rows, columns)
+        """
+        self.matrix = sparse.csr_array(matrix)
+        self.zones = np.asarray(zones)
+        self.grid_shape = tuple(grid_shape)
+        self.zone_pixels = self.matrix.sum(axis=1)
+
+    @classmethod
+    def from_geometries(
+        cls,
+        geometries: list,
+        zones: npt.ArrayLike,
+        transform: Affine,
+        grid_shape: tuple,
+    ) -> "ZoneWeights":
+        """
+        Calculate the pixel coverage for each zone geometry.
+
+        Parameters
+        ----------
+        geometries : list
+            Shapely zone geometries in the CRS of the product grid
+        zones : npt.ArrayLike
+            Zone ID for each geometry
+        transform : Affine
+            Product grid transform
+        grid_shape : tuple
+            Shape of the product grid (rows, columns)
+
+        Returns
+        -------
+        ZoneWeights
+        """
+        rows, columns = grid_shape
+        inverse = ~transform
+        pixel_area = abs(transform.a * transform.e - transform.b * transform.d)
+
+        matrix_rows = []
+        matrix_columns = []
+        matrix_values = []
+
+        for index, geometry in enumerate(geometries):
+            min_x, min_y, max_x, max_y = geometry.bounds
+            corner_columns, corner_rows = inverse * (
+                np.array([min_x, max_x, min_x, max_x]),
+                np.array([min_y, min_y, max_y, max_y]),
+            )
+
+            row_range = np.arange(
+                max(int(np.floor(corner_rows.min())), 0),
+                min(int(np.ceil(corner_rows.max())), rows),
+            )
+            column_range = np.arange(
+                max(int(np.floor(corner_columns.min())), 0),
+                min(int(np.ceil(corner_columns.max())), columns),
+            )
+            if len(row_range) == 0 or len(column_range) == 0:
+                continue
+
+            pixel_rows, pixel_columns = (
+                grid.ravel() for grid in np.meshgrid(row_range, column_range)
+            )
+            pixels = cls._pixel_boxes(transform, pixel_rows, pixel_columns)
+
+            shapely.prepare(geometry)
+            coverage = np.where(
+                shapely.contains(geometry, pixels), 1.0, 0.0
+            )
+            edge = shapely.intersects(geometry, pixels) & (coverage == 0)
+            coverage[edge] = shapely.area(
+                shapely.intersection(geometry, pixels[edge])
+            ) / pixel_area
+
+            covered = coverage > 0
+            matrix_rows.append(np.full(covered.sum(), index))
+            matrix_columns.append(
+                pixel_rows[covered] * columns + pixel_columns[covered]
+            )
+            matrix_values.append(coverage[covered])
+
+        matrix = sparse.coo_array(
+            (
+                np.concatenate(matrix_values or [np.zeros(0)]),
+                (
+                    np.concatenate(matrix_rows or [np.zeros(0, int)]),
+                    np.concatenate(matrix_columns or [np.zeros(0, int)]),
+                ),
+            ),
+            shape=(len(zones), rows * columns),
+        )
+
+        return cls(matrix.tocsr(), zones, grid_shape)
+
+    @staticmethod
+    def _pixel_boxes(
+        transform: Affine, rows: npt.NDArray, columns: npt.NDArray
+    ) -> npt.NDArray:
+        x_0, y_0 = transform * (columns, rows)
+        x_1, y_1 = transform * (columns + 1, rows + 1)
+
+        return shapely.box(
+            np.minimum(x_0, x_1), np.minimum(y_0, y_1),
+            np.maximum(x_0, x_1), np.maximum(y_0, y_1),
+        )
+
+    def save(self, file_path: str) -> None:
+        """
+        Save as .npz file, which can also be read with
+        :func:`scipy.sparse.load_npz`.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to save to
+        """
+        np.savez_compressed(
+            file_path,
+            format=np.array(b'csr'),
+            shape=np.array(self.matrix.shape),
+            data=self.matrix.data,
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+            zones=self.zones,
+            grid_shape=np.array(self.grid_shape),
+        )
+
+    @classmethod
+    def load(cls, file_path: str) -> "ZoneWeights":
+        """
+        Load from file created with :meth:`save`.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to the .npz file
+
+        Returns
+        -------
+        ZoneWeights
+        """
+        with np.load(file_path) as stored:
+            return cls(
+                sparse.csr_array(
+                    (stored['data'], stored['indices'], stored['indptr']),
+                    shape=tuple(stored['shape']),
+                ),
+                stored['zones'],
+                tuple(int(size) for size in stored['grid_shape']),
+            )
+
+    def reduce(self, values: npt.NDArray) -> tuple[npt.NDArray, npt.NDArray]:
+        """
+        Weighted sum and covered pixel area per zone for a block of time
+        steps.
+
+        Parameters
+        ----------
+        values : npt.NDArray
+            Data with time as first dimension and the product grid as
+            remaining dimensions
+
+        Returns
+        -------
+        tuple[npt.NDArray, npt.NDArray]
+            Weighted sum and valid weight with shape (time, zone)
+        """
+        values = values.reshape(values.shape[0], -1).T
+        valid = np.isfinite(values)
+
+        sums = self.matrix @ np.where(valid, values, 0)
+        weights = self.matrix @ valid.astype(np.float64)
+
+        return sums.T, weights.T
+
+    def compute(
+        self,
+        data: xr.DataArray,
+        time_dim: str = 'time',
+        chunk_size: int = 32,
+    ) -> xr.Dataset:
+        """
+        Area weighted zonal means for all zones and time steps.
+
+        Parameters
+        ----------
+        data : xr.DataArray
+            Data on the product grid the weights were built for
+        time_dim : str
+            Name of the time dimension
+        chunk_size : int
+            Number of time steps to read at once
+
+        Returns
+        -------
+        xr.Dataset
+            Mean and coverage with dimensions (time, zone). The coverage is
+            the share of the zone area with a valid value.
+        """
+        data = data.transpose(time_dim, ...)
+
+        if data.shape[1:] != self.grid_shape:
+            raise ValueError(
+                f"Data grid {data.shape[1:]} does not match the weights "
+                f"grid {self.grid_shape}"
+            )
+
+        sums = []
+        weights = []
+        for start in range(0, data.sizes[time_dim], chunk_size):
+            block_sum, block_weight = self.reduce(
+                data.isel({time_dim: slice(start, start + chunk_size)}).values
+            )
+            sums.append(block_sum)
+            weights.append(block_weight)
+
+        if sums:
+            sums = np.concatenate(sums)
+            weights = np.concatenate(weights)
+        else:
+            sums = weights = np.zeros((0, len(self.zones)))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(weights > 0, sums / weights, np.nan)
+            coverage = weights / self.zone_pixels
+
+        dims = (time_dim, 'zone')
+        coords = {time_dim: data[time_dim].values, 'zone': self.zones}
+
+        return xr.Dataset(
+            {
+                'mean': (dims, mean),
+                'coverage': (dims, coverage),
+            },
+            coords=coords,
+        )
+
+
+def main():
+    import geopandas as gpd
+    import rasterio
+
+    parser = argparse.ArgumentParser(
+        description="Build zone weights for a product grid"
+    )
+    parser.add_argument("zone_file", help="File with the zone geometries")
+    parser.add_argument("id_column", help="Column holding the zone IDs")
+    parser.add_argument("grid_file", help="Raster file of the product grid")
+    parser.add_argument("output", help="Path of the .npz output file")
+    arguments = parser.parse_args()
+
+    with rasterio.open(arguments.grid_file) as grid:
+        transform = grid.transform
+        grid_shape = grid.shape
+        crs = grid.crs
+
+    zones = gpd.read_file(arguments.zone_file).to_crs(crs)
+
+    ZoneWeights.from_geometries(
+        zones.geometry.values,
+        zones[arguments.id_column].values,
+        transform,
+        grid_shape,
+    ).save(arguments.output)
+
+
+if __name__ == "__main__":
+    main()